@@ -0,0 +1,197 @@
+"""
+Headless HTTP/JSON API on top of XploreService, served next to (or instead of) the Gradio UI.
+
+POST /chat            {"session_id"?, "message", "stream"}  -> server-sent events (queue, delta, done | error),
+                                                                or JSON with "stream": false
+POST /predict         {"session_id"? | "text"?, "sector"?, "major"?} -> career probabilities
+POST /predict/batch   {"texts": [...], "sector"?, "major"?}  -> one result per text, gzip if accepted
+GET /professions/{name}/similar?k=&sector=&major=            -> professions with the closest ability profile
+POST /analyze         {"major", "interests", "mbti", "challenges"} -> ability weights and fired rules
+DELETE /sessions/{id}                                         -> forget a session
+GET /metrics                                                  -> Prometheus text exposition
+"""
+import asyncio
+import gzip
+import json
+import logging
+import uuid
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from executor import Overloaded
+from llm_scheduler import QueuePosition
+from metrics import ERRORS, REGISTRY
+from service import WarmingUp, XploreService
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_CHARS = 4000
+MAX_BATCH_TEXTS = 1000
+MAX_SIMILAR = 100
+GZIP_MIN_BYTES = 1024
+
+
+class ChatRequest(BaseModel):
+    session_id: Optional[str] = Field(None, max_length=64,
+                                      description="omit to start a new session, the id is returned in the reply")
+    message: str = Field(..., min_length=1, max_length=MAX_MESSAGE_CHARS)
+    stream: bool = True
+
+
+class ChatResponse(BaseModel):
+    session_id: str
+    reply: str
+
+
+class PredictRequest(BaseModel):
+    session_id: Optional[str] = Field(None, max_length=64, description="predict from the session's transcript")
+    text: Optional[str] = Field(None, max_length=100 * MAX_MESSAGE_CHARS, description="predict from this text")
+    sector: Optional[str] = Field(None, max_length=100, description="only rank professions of this sector")
+    major: Optional[str] = Field(None, max_length=100, description="only rank professions accepting this major")
+
+
+class PredictResponse(BaseModel):
+    probabilities: Dict[str, float]
+
+
+class BatchPredictRequest(BaseModel):
+    texts: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_TEXTS)
+    sector: Optional[str] = Field(None, max_length=100)
+    major: Optional[str] = Field(None, max_length=100)
+
+
+class BatchPredictResponse(BaseModel):
+    results: List[Dict[str, float]]
+
+
+class SimilarResponse(BaseModel):
+    similar: Dict[str, float]
+
+
+class AnalyzeRequest(BaseModel):
+    major: str = ""
+    interests: List[str] = []
+    mbti: str = ""
+    challenges: List[str] = []
+
+
+class AnalyzeResponse(BaseModel):
+    abilities: Dict[str, float]
+    fired_rules: List[str]
+    timings_ms: Dict[str, float]
+
+
+def new_session_id(prefix: str = "api-") -> str:
+    # Prefixed so API sessions never collide with Gradio session hashes
+    return f"{prefix}{uuid.uuid4().hex}"
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _guarded(job):
+    """
+    Map pool back-pressure and warm-up to HTTP status codes
+    """
+    try:
+        return await job
+    except WarmingUp as e:
+        raise HTTPException(503, str(e), headers={"Retry-After": "5"})
+    except Overloaded as e:
+        raise HTTPException(503, str(e), headers={"Retry-After": "1"})
+    except asyncio.TimeoutError:
+        raise HTTPException(504, "The job did not finish in time.")
+
+
+def create_api(service: XploreService, session_prefix: str = "api-") -> FastAPI:
+    """
+    session_prefix: start of the session ids handed out by /chat, see prefork.SESSION_PREFIX
+    """
+    api = FastAPI(title="Xplore Career Chatbot API")
+
+    @api.get("/health")
+    async def health():
+        return {"status": "ok", "sessions": len(service.sessions), "versions": service.versions()}
+
+    @api.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+    @api.post("/chat", response_model=ChatResponse)
+    async def chat(body: ChatRequest):
+        session_id = body.session_id or new_session_id(session_prefix)
+        session = service.sessions.get(session_id)
+
+        if not body.stream:
+            reply = "".join([chunk async for chunk in service.chat(session, body.message)
+                             if not isinstance(chunk, QueuePosition)])
+            return ChatResponse(session_id=session_id, reply=reply)
+
+        async def events():
+            parts = []
+            try:
+                async for chunk in service.chat(session, body.message):
+                    if isinstance(chunk, QueuePosition):
+                        yield sse_event("queue", {"position": int(chunk)})
+                        continue
+                    parts.append(chunk)
+                    yield sse_event("delta", {"text": chunk})
+            except Exception as e:
+                ERRORS.inc("chat")
+                logger.error("chat stream for %s failed. %s", session_id, e)
+                yield sse_event("error", {"detail": str(e)})
+                return
+            yield sse_event("done", {"session_id": session_id, "reply": "".join(parts)})
+
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Session-Id": session_id})
+
+    @api.post("/predict", response_model=PredictResponse)
+    async def predict(body: PredictRequest):
+        if body.text is not None:
+            results = await _guarded(service.predict([body.text], body.sector, body.major))
+            return PredictResponse(probabilities=results[0])
+        if body.session_id is None or body.session_id not in service.sessions:
+            raise HTTPException(404, "Unknown session, send either an existing session_id or a text.")
+        session = service.sessions.get(body.session_id)
+        if (body.sector or body.major) and session.transcript.strip():
+            # Filtered rankings are not cached on the session
+            results = await _guarded(service.predict([session.transcript], body.sector, body.major))
+            return PredictResponse(probabilities=results[0])
+        result = await _guarded(service.predict_session(session))
+        return PredictResponse(probabilities=result[0] if result else {})
+
+    @api.post("/predict/batch", response_model=BatchPredictResponse)
+    async def predict_batch(body: BatchPredictRequest, request: Request):
+        results = await _guarded(service.predict(body.texts, body.sector, body.major))
+        content = json.dumps({"results": results}).encode("utf-8")
+        headers = {"Vary": "Accept-Encoding"}
+        if len(content) >= GZIP_MIN_BYTES and "gzip" in request.headers.get("accept-encoding", ""):
+            content = gzip.compress(content, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        return Response(content, media_type="application/json", headers=headers)
+
+    @api.get("/professions/{profession}/similar", response_model=SimilarResponse)
+    async def similar(profession: str, k: int = Query(10, ge=1, le=MAX_SIMILAR), sector: Optional[str] = None,
+                      major: Optional[str] = None):
+        try:
+            result = await _guarded(service.similar_careers(profession, k, sector, major))
+        except ValueError as e:
+            raise HTTPException(404, str(e))
+        return SimilarResponse(similar=result)
+
+    @api.post("/analyze", response_model=AnalyzeResponse)
+    async def analyze(body: AnalyzeRequest):
+        result = await _guarded(service.analyze(body.major, body.interests, body.mbti, body.challenges))
+        return AnalyzeResponse(**result)
+
+    @api.delete("/sessions/{session_id}", status_code=204)
+    async def delete_session(session_id: str):
+        service.sessions.discard(session_id)
+        return Response(status_code=204)
+
+    return api
@@ -0,0 +1,102 @@
+"""
+Score whole cohorts of survey responses with CareerPredictor.
+
+    python batch_predict.py responses.csv --text-column answer --id-column student_id -o results.jsonl
+    python batch_predict.py responses.jsonl --format csv > results.csv
+
+Input is read lazily and processed in chunks, so files of any size run in bounded memory.
+"""
+import argparse
+import csv
+import json
+import sys
+from contextlib import redirect_stdout
+from typing import Iterable, Iterator, List, Tuple
+
+from career_predictor import AGGREGATIONS, CareerPredictor
+
+
+def read_records(path: str, text_column: str, id_column: str) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (id, text) pairs from a CSV or JSONL file ('-' reads JSONL from stdin)
+    """
+    is_csv = path.lower().endswith(".csv")
+    stream = sys.stdin if path == "-" else open(path, newline="" if is_csv else None, encoding="utf-8")
+    try:
+        if is_csv:
+            rows = csv.DictReader(stream)
+        else:
+            rows = (json.loads(line) for line in stream if line.strip())
+
+        for line_no, row in enumerate(rows, start=1):
+            record_id = row.get(id_column, line_no) if id_column else line_no
+            yield str(record_id), str(row.get(text_column) or "")
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def chunked(records: Iterable[Tuple[str, str]], size: int) -> Iterator[List[Tuple[str, str]]]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_results(out, fmt: str, ids: List[str], results: List[dict], csv_writer=None):
+    for record_id, result in zip(ids, results):
+        if fmt == "csv":
+            for rank, (career, probability) in enumerate(result.items(), start=1):
+                csv_writer.writerow([record_id, rank, career, f"{probability:.6f}"])
+        else:
+            out.write(json.dumps({"id": record_id, "predictions": result}, ensure_ascii=False) + "\n")
+    out.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch career prediction over CSV/JSONL survey responses")
+    parser.add_argument("input", help="CSV or JSONL file, '-' for JSONL on stdin")
+    parser.add_argument("-o", "--output", default="-", help="output file (default: stdout)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--id-column", default="id")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="records held in memory at once")
+    parser.add_argument("--encode-batch-size", type=int, default=256, help="SentenceTransformer batch size")
+    parser.add_argument("--aggregation", choices=AGGREGATIONS, default="recency",
+                        help="how the sentences of a response are combined")
+    parser.add_argument("--sector", default=None, help="only rank professions of this sector")
+    parser.add_argument("--major", default=None, help="only rank professions accepting this major")
+    parser.add_argument("--index-chunk-size", type=int, default=0,
+                        help="professions scored per block, bounds memory for large catalogs (0: all at once)")
+    args = parser.parse_args()
+
+    # Keep start-up messages out of the results when writing to stdout
+    with redirect_stdout(sys.stderr):
+        predictor = CareerPredictor(aggregation=args.aggregation, index_chunk_size=args.index_chunk_size)
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    csv_writer = None
+    if args.format == "csv":
+        csv_writer = csv.writer(out)
+        csv_writer.writerow(["id", "rank", "career", "probability"])
+
+    total = 0
+    try:
+        for chunk in chunked(read_records(args.input, args.text_column, args.id_column), args.chunk_size):
+            ids = [record_id for record_id, _ in chunk]
+            results = predictor.predict_batch([text for _, text in chunk], batch_size=args.encode_batch_size,
+                                              sector=args.sector, major=args.major)
+            write_results(out, args.format, ids, results, csv_writer)
+            total += len(chunk)
+            print(f"INFO: {total} records scored", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+"""
+Reproducible benchmarks for the predictor, the expert system, the AIML bot and the chat streaming path.
+
+    python -m benchmarks.run                                   # all components
+    python -m benchmarks.run --components expert_system bot --save-baseline
+    python -m benchmarks.run --compare benchmarks/baselines/baseline.json
+
+Run from the repository root. Every component runs in a fresh process, so its peak RSS is its own.
+"""
@@ -0,0 +1,115 @@
+"""
+Timing, memory and baseline helpers shared by the benchmark components
+"""
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from time import perf_counter
+from typing import Callable, Dict, Iterable, List
+
+import numpy as np
+
+
+def summarize(latencies: List[float], wall: float, items: int = None) -> dict:
+    """
+    Latency percentiles in milliseconds and throughput in items per second.
+    `items` is the number of processed items when one call handles several (e.g. a batch)
+    """
+    lat = np.asarray(latencies, dtype=float) * 1000
+    return {
+        "calls": len(latencies),
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p95_ms": float(np.percentile(lat, 95)),
+        "p99_ms": float(np.percentile(lat, 99)),
+        "mean_ms": float(lat.mean()),
+        "max_ms": float(lat.max()),
+        "throughput_per_s": (items if items is not None else len(latencies)) / wall if wall > 0 else 0.0,
+    }
+
+
+def measure(fn: Callable, inputs: Iterable, warmup: int = 3, items_per_call: int = 1) -> dict:
+    """
+    Call fn(x) for every input after `warmup` untimed calls on the first inputs
+    """
+    inputs = list(inputs)
+    for x in inputs[:warmup]:
+        fn(x)
+    latencies = []
+    start = perf_counter()
+    for x in inputs:
+        t = perf_counter()
+        fn(x)
+        latencies.append(perf_counter() - t)
+    return summarize(latencies, perf_counter() - start, len(inputs) * items_per_call)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def environment(seed: int) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                timeout=5).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "seed": seed,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def save(path: str, report: dict):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(baseline: dict, current: dict, tolerance: float = 0.2,
+            metrics=("p50_ms", "p95_ms")) -> List[str]:
+    """
+    Cases whose latency grew by more than `tolerance` (relative) against the baseline.
+    Prints a comparison table to stderr
+    """
+    regressions = []
+    print(f"{'case':<45} {'metric':<8} {'baseline':>10} {'current':>10} {'change':>8}", file=sys.stderr)
+    for case, stats in sorted(current["results"].items()):
+        old = baseline.get("results", {}).get(case)
+        if old is None or "error" in stats or "error" in old:
+            continue
+        for metric in metrics:
+            before, after = old[metric], stats[metric]
+            change = (after - before) / before if before > 0 else 0.0
+            flag = " !" if change > tolerance else ""
+            print(f"{case:<45} {metric:<8} {before:>10.3f} {after:>10.3f} {change:>+7.1%}{flag}", file=sys.stderr)
+            if change > tolerance:
+                regressions.append(f"{case} {metric}")
+    return regressions
+
+
+def format_results(results: Dict[str, dict]) -> str:
+    lines = [f"{'case':<45} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'items/s':>10} {'peak MB':>8}"]
+    for case, stats in results.items():
+        if "error" in stats:
+            lines.append(f"{case:<45} error: {stats['error']}")
+            continue
+        peak = f"{stats['peak_rss_mb']:.1f}" if "peak_rss_mb" in stats else "-"
+        lines.append(f"{case:<45} {stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f} {stats['p99_ms']:>9.3f} "
+                     f"{stats['throughput_per_s']:>10.1f} {peak:>8}")
+    return "\n".join(lines)
@@ -0,0 +1,81 @@
+"""
+Synthetic, seeded benchmark inputs: student transcripts, expert-system profiles, planning dialogues
+and large profession catalogs
+"""
+import random
+from typing import List
+
+import numpy as np
+
+from expert_system import RULE_BASE, UserProfile
+
+SUBJECTS = ["programming", "data analysis", "drawing", "public speaking", "teamwork", "math", "marketing",
+            "writing stories", "leading a team", "solving puzzles", "helping customers", "designing websites",
+            "statistics", "video editing", "negotiation", "machine learning"]
+OPENERS = ["I really enjoy", "I like", "I am good at", "I hate", "I am not confident with", "I love",
+           "I struggle with", "I am interested in", "I get bored by", "I am curious about"]
+CLOSERS = ["", " a lot", " in my free time", " during group projects", " at university", " since high school"]
+
+GENERAL_QUESTIONS = ["hello", "careers for ait", "cv help", "ask general", "what is a data scientist",
+                     "how do i prepare for interviews", "careers for finance", "thank you"]
+
+MBTI_TYPES = [a + b + c + d for a in "EI" for b in "SN" for c in "TF" for d in "JP"]
+
+MAJORS = [rule["conditions"][0] for rule in RULE_BASE if rule["type"] == "Major"]
+INTERESTS = [condition for rule in RULE_BASE if rule["type"] == "Interest" for condition in rule["conditions"]]
+CHALLENGES = [rule["condition"] for rule in RULE_BASE if rule["type"] == "Challenge"]
+
+
+def sentence(rng: random.Random) -> str:
+    return f"{rng.choice(OPENERS)} {rng.choice(SUBJECTS)}{rng.choice(CLOSERS)}."
+
+
+def transcripts(n_sentences: int, count: int, seed: int = 0) -> List[str]:
+    """
+    `count` transcripts of `n_sentences` sentences each
+    """
+    rng = random.Random(seed * 1000 + n_sentences)
+    return [" ".join(sentence(rng) for _ in range(n_sentences)) for _ in range(count)]
+
+
+def profiles(count: int, seed: int = 0) -> List[UserProfile]:
+    rng = random.Random(seed)
+    return [
+        UserProfile(major=rng.choice(MAJORS),
+                    interests=rng.sample(INTERESTS, rng.randint(1, 4)),
+                    mbti=rng.choice(MBTI_TYPES + [""]),
+                    challenges=rng.sample(CHALLENGES, rng.randint(0, 4)))
+        for _ in range(count)
+    ]
+
+
+def planning_dialogue(rng: random.Random) -> List[str]:
+    """
+    One complete 'start planning' conversation as the user types it, with a few general questions around it
+    """
+    challenges = ", ".join(str(n) for n in sorted(rng.sample(range(1, 20), rng.randint(1, 4))))
+    mbti = rng.choice(MBTI_TYPES + ["i don't know"])
+    return ([rng.choice(GENERAL_QUESTIONS)] +
+            ["start planning", rng.choice(MAJORS), ", ".join(rng.sample(INTERESTS, rng.randint(1, 3))),
+             mbti, challenges, "confirm"] +
+            [rng.choice(GENERAL_QUESTIONS)])
+
+
+def planning_dialogues(count: int, seed: int = 0) -> List[List[str]]:
+    rng = random.Random(seed)
+    return [planning_dialogue(rng) for _ in range(count)]
+
+
+SECTORS = ["Technology", "Finance", "Healthcare", "Education", "Arts", "Engineering", "Public Sector", "Retail"]
+
+
+def catalog(count: int, n_dim: int = 10, seed: int = 0):
+    """
+    A profession catalog of `count` rows: (names, ability matrix, sectors, majors) for a ProfessionIndex
+    """
+    rng = np.random.default_rng(seed)
+    names = [f"Profession {i}" for i in range(count)]
+    matrix = rng.uniform(-1.0, 1.0, (count, n_dim)).astype(np.float32)
+    sectors = rng.choice(SECTORS, count)
+    majors = [";".join(rng.choice(MAJORS, 2, replace=False)) for _ in range(count)]
+    return names, matrix, sectors, majors
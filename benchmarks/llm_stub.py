@@ -0,0 +1,55 @@
+"""
+In-process stand-in for the OpenAI-compatible LLM backend, so the chat path can be benchmarked offline.
+It plugs into LLMClient as an httpx transport and streams the same `data:` / `[DONE]` SSE lines as Ollama.
+"""
+import asyncio
+import json
+import random
+
+import httpx
+
+from llm import LLMClient
+
+WORDS = ("career", "skills", "data", "team", "project", "growth", "role", "industry", "experience", "learn")
+
+
+def stub_reply(seed: int, n_tokens: int) -> list:
+    rng = random.Random(seed)
+    return [rng.choice(WORDS) + " " for _ in range(n_tokens)]
+
+
+def stub_transport(n_tokens: int = 60, ttft: float = 0.0, tokens_per_second: float = 0.0) -> httpx.MockTransport:
+    """
+    Reply to every chat completion with `n_tokens` chunks.
+    `ttft` delays the first chunk, `tokens_per_second` paces the rest (0 streams as fast as possible)
+    """
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        tokens = stub_reply(len(body["messages"]), n_tokens)
+
+        if not body.get("stream"):
+            return httpx.Response(200, json={"choices": [{"message": {"role": "assistant", "content": "".join(tokens)}}]})
+
+        async def events():
+            if ttft:
+                await asyncio.sleep(ttft)
+            for i, token in enumerate(tokens):
+                if i and tokens_per_second:
+                    await asyncio.sleep(1.0 / tokens_per_second)
+                chunk = {"choices": [{"index": 0, "delta": {"content": token}}]}
+                yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+            yield b"data: [DONE]\n\n"
+
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=events())
+
+    return httpx.MockTransport(handler)
+
+
+def attach_stub(llm_client: LLMClient, **kwargs) -> LLMClient:
+    """
+    Route all requests of `llm_client` to the stub instead of the network
+    """
+    llm_client._client = httpx.AsyncClient(base_url=llm_client.base_url, timeout=llm_client.timeout,
+                                           transport=stub_transport(**kwargs))
+    return llm_client
@@ -0,0 +1,163 @@
+"""
+Load generator: replays concurrent multi-user chat sessions through XploreService.chat (the path behind
+the UI's `respond` and the API's /chat), against the mock LLM server or any OpenAI-compatible backend.
+
+    python -m benchmarks.loadgen --users 32 --turns 12 --ttft 0.3 --tps 40
+    python -m benchmarks.loadgen --users 32 --no-keepalive --history-turns 2
+    python -m benchmarks.loadgen --server http://127.0.0.1:11434 --users 8
+
+Without --server a mock server is started in-process with the given --ttft/--tps/... settings.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+from time import perf_counter
+
+import httpx
+
+from benchmarks import harness, inputs
+from benchmarks.mock_llm_server import MockLLMServer, add_server_arguments
+
+
+def user_script(rng: random.Random, turns: int) -> list:
+    """
+    A planning dialogue, padded with general questions up to `turns` messages
+    """
+    script = inputs.planning_dialogue(rng)
+    while len(script) < turns:
+        script.append(rng.choice(inputs.GENERAL_QUESTIONS))
+    return script[:turns]
+
+
+async def run(options) -> dict:
+    from chatbot import Bot
+    from embedding_cache import EmbeddingCache
+    from executor import WorkerPools
+    from llm import LLMClient
+    from llm_scheduler import LLMScheduler, QueuePosition
+    from rewrite_cache import RewriteCache
+    from service import XploreService
+    from session_manager import SessionManager
+    from startup import LazyObject
+
+    server = None
+    base_url = options.server
+    if base_url is None:
+        server = await MockLLMServer(n_tokens=options.tokens, ttft=options.ttft, tokens_per_second=options.tps,
+                                     error_rate=options.error_rate,
+                                     midstream_error_rate=options.midstream_error_rate,
+                                     max_concurrency=options.max_concurrency,
+                                     reject_overflow=options.reject_overflow, seed=options.seed).start()
+        base_url = f"http://127.0.0.1:{server.port}"
+
+    llm_client = LLMClient("You are a career bot.", base_url=base_url, model=options.model,
+                           max_connections=options.max_connections,
+                           max_keepalive_connections=0 if options.no_keepalive else options.max_connections,
+                           max_history_turns=options.history_turns, max_history_chars=options.history_chars)
+    pools = WorkerPools(thread_workers=8, process_workers=0, max_thread_pending=4 * options.users)
+    rewrite_cache = RewriteCache(max_entries=2000 if options.rewrite_cache else 0)
+    service = XploreService(SessionManager(llm_client.new_history, Bot, max_sessions=options.users + 1),
+                            pools, llm_client, rewrite_cache, LazyObject(lambda: None, "unused"), EmbeddingCache(),
+                            scheduler=LLMScheduler(max_in_flight=options.llm_concurrency, max_queue=options.llm_queue,
+                                                   max_wait=options.llm_queue_timeout))
+
+    totals, first_chunks, errors = [], [], []
+    history_messages = []
+    rng = random.Random(options.seed)
+    scripts = [user_script(rng, options.turns) for _ in range(options.users)]
+
+    async def user(index: int, script: list):
+        session = service.sessions.get(f"load-{index}")
+        # Users do not all arrive at the same instant
+        await asyncio.sleep(index * options.ramp_up / max(1, options.users))
+        for message in script:
+            t = perf_counter()
+            first = None
+            try:
+                async for chunk in service.chat(session, message):
+                    if first is None and not isinstance(chunk, QueuePosition):
+                        first = perf_counter() - t
+            except (httpx.HTTPError, KeyError, ValueError) as e:
+                errors.append(type(e).__name__)
+                continue
+            totals.append(perf_counter() - t)
+            first_chunks.append(first if first is not None else totals[-1])
+            history_messages.append(len(session.llm_history))
+            if options.think_time:
+                await asyncio.sleep(options.think_time)
+
+    start = perf_counter()
+    await asyncio.gather(*[user(i, script) for i, script in enumerate(scripts)])
+    wall = perf_counter() - start
+
+    report = {
+        "options": vars(options),
+        "wall_s": wall,
+        "turns": len(totals),
+        "errors": {name: errors.count(name) for name in sorted(set(errors))},
+        "mean_history_messages": sum(history_messages) / len(history_messages) if history_messages else 0,
+        "scheduler": {"coalesced": service.scheduler.coalesced, "rejected": service.scheduler.rejected,
+                      "expired": service.scheduler.expired, "degraded": service.degraded},
+        "results": {},
+    }
+    if totals:
+        report["results"] = {"turn.total": harness.summarize(totals, wall),
+                             "turn.first_chunk": harness.summarize(first_chunks, wall)}
+    if server is not None:
+        report["server"] = dict(server.stats)
+    else:
+        try:
+            response = await llm_client.client.get("/stats")
+            report["server"] = response.json() if response.status_code == 200 else {}
+        except httpx.HTTPError:
+            report["server"] = {}
+
+    await llm_client.aclose()
+    pools.shutdown()
+    if server is not None:
+        await server.stop()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay concurrent chat sessions against an LLM backend")
+    parser.add_argument("--server", default=None, help="OpenAI-compatible backend, default: in-process mock")
+    parser.add_argument("--model", default="phi4-mini")
+    parser.add_argument("--users", type=int, default=16, help="concurrent chat sessions")
+    parser.add_argument("--turns", type=int, default=10, help="messages per session")
+    parser.add_argument("--ramp-up", type=float, default=1.0, help="seconds over which the users arrive")
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds between a reply and the next message")
+    parser.add_argument("--max-connections", type=int, default=20, help="LLMClient connection pool size")
+    parser.add_argument("--no-keepalive", action="store_true", help="open a new connection for every request")
+    parser.add_argument("--history-turns", type=int, default=8, help="LLMClient max_history_turns")
+    parser.add_argument("--history-chars", type=int, default=12000, help="LLMClient max_history_chars")
+    parser.add_argument("--llm-concurrency", type=int, default=2, help="scheduler: generations running at once")
+    parser.add_argument("--llm-queue", type=int, default=32, help="scheduler: waiting requests before degrading")
+    parser.add_argument("--llm-queue-timeout", type=float, default=20.0, help="scheduler: seconds before degrading")
+    parser.add_argument("--rewrite-cache", action="store_true", help="serve repeated turns from the rewrite cache")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default=None, help="write the report as JSON")
+    add_server_arguments(parser)
+    options = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(run(options))
+
+    print(harness.format_results(report["results"]))
+    print(f"turns={report['turns']} errors={report['errors']} wall={report['wall_s']:.2f}s "
+          f"mean history={report['mean_history_messages']:.1f} messages scheduler={report['scheduler']}",
+          file=sys.stderr)
+    server = report.get("server", {})
+    if server:
+        print(f"server: connections={server.get('connections')} requests={server.get('requests')} "
+              f"peak in flight={server.get('peak_in_flight')} prompt chars={server.get('prompt_chars')}",
+              file=sys.stderr)
+    if options.output:
+        harness.save(options.output, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Stand-in for the OpenAI-compatible chat completions endpoint of Ollama, for offline load testing of LLMClient.
+
+    python -m benchmarks.mock_llm_server --port 11434 --ttft 0.3 --tps 40 --error-rate 0.02 --max-concurrency 4
+
+Speaks HTTP/1.1 with keep-alive and streams `data:` / `data: [DONE]` server-sent events with chunked encoding,
+like the real backend. Only the standard library is used.
+GET /stats returns the request, connection and error counters as JSON.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Optional
+
+from benchmarks.llm_stub import stub_reply
+
+
+class MockLLMServer:
+    """
+    ttft: seconds before the first token, tokens_per_second: pacing of the rest (0 is unthrottled).
+    error_rate: share of requests answered with a 503 before anything is streamed,
+    midstream_error_rate: share of streams cut off after half of the tokens.
+    max_concurrency: generations running at once; further requests wait, or get a 429 with `reject_overflow`
+    """
+
+    def __init__(self, n_tokens: int = 60, ttft: float = 0.2, tokens_per_second: float = 50.0,
+                 error_rate: float = 0.0, midstream_error_rate: float = 0.0,
+                 max_concurrency: int = 4, reject_overflow: bool = False, seed: int = 0):
+        self.n_tokens = n_tokens
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.midstream_error_rate = midstream_error_rate
+        self.max_concurrency = max_concurrency
+        self.reject_overflow = reject_overflow
+        self.rng = random.Random(seed)
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.stats = {"connections": 0, "requests": 0, "completions": 0, "in_flight": 0, "peak_in_flight": 0,
+                      "rejected": 0, "injected_errors": 0, "cut_streams": 0, "prompt_chars": 0}
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1]
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> "MockLLMServer":
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.stats["connections"] += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                self.stats["requests"] += 1
+                keep_open = await self._route(method, path, body, writer)
+                if not keep_open or headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter) -> bool:
+        if method == "GET" and path == "/stats":
+            return await self._send_json(writer, 200, self.stats)
+        if method != "POST" or path != "/v1/chat/completions":
+            return await self._send_json(writer, 404, {"error": "not found"})
+
+        payload = json.loads(body or b"{}")
+        self.stats["prompt_chars"] += sum(len(m.get("content", "")) for m in payload.get("messages", []))
+        if self.rng.random() < self.error_rate:
+            self.stats["injected_errors"] += 1
+            return await self._send_json(writer, 503, {"error": "injected failure"})
+        if self.reject_overflow and self._slots.locked():
+            self.stats["rejected"] += 1
+            return await self._send_json(writer, 429, {"error": "too many requests"})
+
+        async with self._slots:
+            self.stats["in_flight"] += 1
+            self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.stats["in_flight"])
+            try:
+                tokens = stub_reply(len(payload.get("messages", [])), self.n_tokens)
+                if payload.get("stream"):
+                    return await self._stream(writer, tokens, payload.get("model", "mock"))
+                await asyncio.sleep(self.ttft + self._token_delay() * len(tokens))
+                message = {"role": "assistant", "content": "".join(tokens)}
+                return await self._send_json(writer, 200, {"choices": [{"index": 0, "message": message}]})
+            finally:
+                self.stats["in_flight"] -= 1
+                self.stats["completions"] += 1
+
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    async def _stream(self, writer: asyncio.StreamWriter, tokens: list, model: str) -> bool:
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\nTransfer-Encoding: chunked\r\n\r\n")
+        cut_at = len(tokens) // 2 if self.rng.random() < self.midstream_error_rate else None
+        created = int(time.time())
+
+        await asyncio.sleep(self.ttft)
+        for i, token in enumerate(tokens):
+            if i == cut_at:
+                # Drop the connection mid-stream, as a crashed backend would
+                self.stats["cut_streams"] += 1
+                writer.transport.abort()
+                return False
+            if i:
+                await asyncio.sleep(self._token_delay())
+            chunk = {"model": model, "created": created, "choices": [{"index": 0, "delta": {"content": token}}]}
+            self._write_chunk(writer, f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            await writer.drain()
+        self._write_chunk(writer, b"data: [DONE]\n\n")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+        return True
+
+    @staticmethod
+    def _write_chunk(writer: asyncio.StreamWriter, data: bytes):
+        writer.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+
+    @staticmethod
+    async def _send_json(writer: asyncio.StreamWriter, status: int, data: dict) -> bool:
+        body = json.dumps(data).encode("utf-8")
+        reason = {200: "OK", 404: "Not Found", 429: "Too Many Requests", 503: "Service Unavailable"}[status]
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
+        return True
+
+
+async def serve(options):
+    server = await MockLLMServer(n_tokens=options.tokens, ttft=options.ttft, tokens_per_second=options.tps,
+                                 error_rate=options.error_rate, midstream_error_rate=options.midstream_error_rate,
+                                 max_concurrency=options.max_concurrency, reject_overflow=options.reject_overflow,
+                                 seed=options.seed).start(options.host, options.port)
+    print(f"Mock LLM server listening on http://{options.host}:{server.port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        print(json.dumps(server.stats))
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--tokens", type=int, default=60, help="chunks per reply")
+    parser.add_argument("--ttft", type=float, default=0.2, help="seconds before the first chunk")
+    parser.add_argument("--tps", type=float, default=50.0, help="chunks per second, 0 is unthrottled")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failing with 503")
+    parser.add_argument("--midstream-error-rate", type=float, default=0.0, help="share of streams cut off halfway")
+    parser.add_argument("--max-concurrency", type=int, default=4, help="generations running at once")
+    parser.add_argument("--reject-overflow", action="store_true", help="answer 429 instead of queueing when full")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible streaming LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--seed", type=int, default=0)
+    add_server_arguments(parser)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Benchmark runner, see benchmarks/__init__.py for usage.
+Exits with status 1 when --compare finds a latency regression above the tolerance.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+from benchmarks import harness, inputs
+from encoders import ENCODER_BACKENDS
+
+COMPONENTS = ("predictor", "expert_system", "bot", "respond")
+RESULTS_DIR = os.path.join("benchmarks", "results")
+BASELINE_PATH = os.path.join("benchmarks", "baselines", "baseline.json")
+
+
+def bench_predictor(options) -> dict:
+    from career_predictor import CareerPredictor
+    from embedding_cache import EmbeddingCache, IncrementalPredictor
+
+    predictor = CareerPredictor(seed=options.seed, encoder_backend=options.encoder,
+                                encoder_options={"threads": options.encoder_threads})
+    encode_batch = inputs.transcripts(1, 256, options.seed + 2)
+    results = {f"predictor.encode[{options.encoder},batch=256]": harness.measure(
+        predictor.encode, [encode_batch] * max(3, options.iterations // 20), warmup=1,
+        items_per_call=len(encode_batch))}
+    for n_sentences in (1, 4, 16, 64):
+        texts = inputs.transcripts(n_sentences, options.iterations, options.seed)
+        results[f"predictor.predict[sentences={n_sentences}]"] = harness.measure(predictor.predict, texts)
+
+    batch = inputs.transcripts(4, 256, options.seed)
+    results["predictor.predict_batch[texts=256,sentences=4]"] = harness.measure(
+        predictor.predict_batch, [batch] * max(3, options.iterations // 20), warmup=1, items_per_call=len(batch))
+
+    # A growing transcript, as the UI sends it: only the newest sentence is not cached yet
+    sentences = inputs.transcripts(1, options.iterations, options.seed + 1)
+    growing = [" ".join(sentences[:i + 1]) for i in range(len(sentences))]
+    incremental = IncrementalPredictor(predictor, EmbeddingCache())
+    results["predictor.incremental[growing transcript]"] = harness.measure(incremental.predict, growing, warmup=0)
+    results.update(bench_profession_index(options))
+    return results
+
+
+def bench_profession_index(options) -> dict:
+    import numpy as np
+    from profession_index import ProfessionIndex
+
+    names, matrix, sectors, majors = inputs.catalog(50000, seed=options.seed)
+    index = ProfessionIndex(names, matrix, sectors, majors)
+    posteriors = np.random.default_rng(options.seed).normal(size=(options.iterations, matrix.shape[1]))
+    queried = [names[i] for i in range(0, len(names), max(1, len(names) // options.iterations))]
+    technology = index.mask(sector="Technology")
+    return {
+        "index.search[professions=50000]": harness.measure(index.search, posteriors),
+        "index.search[professions=50000,sector]": harness.measure(
+            lambda posterior: index.search(posterior, mask=technology), posteriors),
+        "index.similar[professions=50000]": harness.measure(index.similar, queried),
+    }
+
+
+def bench_expert_system(options) -> dict:
+    from expert_system import RULE_BASE, infer_batch, inference_engine
+
+    profiles = inputs.profiles(options.iterations, options.seed)
+    results = {"expert_system.inference_engine": harness.measure(lambda p: inference_engine(p, RULE_BASE), profiles)}
+    batch = inputs.profiles(1000, options.seed + 1)
+    results["expert_system.infer_batch[profiles=1000]"] = harness.measure(
+        infer_batch, [batch] * max(3, options.iterations // 20), warmup=1, items_per_call=len(batch))
+    return results
+
+
+def bench_bot(options) -> dict:
+    from chatbot import Bot
+
+    dialogues = inputs.planning_dialogues(max(1, options.iterations // 8), options.seed)
+    Bot().get_response("hello")  # load the brain outside of the timings
+
+    turns = []
+    start = perf_counter()
+    for dialogue in dialogues:
+        bot = Bot()
+        for message in dialogue:
+            t = perf_counter()
+            bot.get_response(message)
+            turns.append(perf_counter() - t)
+    return {"bot.get_response[planning dialogue turn]": harness.summarize(turns, perf_counter() - start)}
+
+
+async def _respond_sessions(options) -> dict:
+    from benchmarks.llm_stub import attach_stub
+    from chatbot import Bot
+    from embedding_cache import EmbeddingCache
+    from executor import WorkerPools
+    from llm import LLMClient
+    from llm_scheduler import LLMScheduler, QueuePosition
+    from rewrite_cache import RewriteCache
+    from service import XploreService
+    from session_manager import SessionManager
+    from startup import LazyObject
+
+    llm_client = attach_stub(LLMClient("You are a career bot."), n_tokens=options.llm_tokens,
+                             ttft=options.llm_ttft, tokens_per_second=options.llm_tps)
+    pools = WorkerPools(thread_workers=8, process_workers=0, max_thread_pending=1024)
+    # max_entries=0 disables the rewrite cache, so every turn goes through the LLM stream
+    service = XploreService(SessionManager(llm_client.new_history, Bot), pools, llm_client,
+                            RewriteCache(max_entries=0), LazyObject(lambda: None, "unused"), EmbeddingCache(),
+                            scheduler=LLMScheduler(max_in_flight=options.llm_concurrency, max_queue=1024))
+    dialogues = inputs.planning_dialogues(max(options.concurrency, options.iterations // 8), options.seed)
+
+    totals, first_chunks = [], []
+
+    async def run_session(index: int, dialogue):
+        session = service.sessions.get(f"bench-{index}")
+        for message in dialogue:
+            t = perf_counter()
+            first = None
+            async for chunk in service.chat(session, message):
+                if first is None and not isinstance(chunk, QueuePosition):
+                    first = perf_counter() - t
+            totals.append(perf_counter() - t)
+            first_chunks.append(first if first is not None else totals[-1])
+
+    semaphore = asyncio.Semaphore(options.concurrency)
+
+    async def limited(index, dialogue):
+        async with semaphore:
+            await run_session(index, dialogue)
+
+    start = perf_counter()
+    await asyncio.gather(*[limited(i, dialogue) for i, dialogue in enumerate(dialogues)])
+    wall = perf_counter() - start
+    await llm_client.aclose()
+    pools.shutdown()
+
+    case = f"concurrency={options.concurrency}"
+    return {f"respond.total[{case}]": harness.summarize(totals, wall),
+            f"respond.first_chunk[{case}]": harness.summarize(first_chunks, wall)}
+
+
+def bench_respond(options) -> dict:
+    return asyncio.run(_respond_sessions(options))
+
+
+BENCHMARKS = {
+    "predictor": bench_predictor,
+    "expert_system": bench_expert_system,
+    "bot": bench_bot,
+    "respond": bench_respond,
+}
+
+
+def run_component(name: str, options) -> dict:
+    """
+    Runs in a fresh process; the peak RSS of that process is reported with every case of the component
+    """
+    logging.basicConfig(level=logging.WARNING)
+    try:
+        results = BENCHMARKS[name](options)
+    except Exception as e:
+        traceback.print_exc()
+        return {name: {"error": f"{type(e).__name__}: {e}"}}
+    peak = harness.peak_rss_mb()
+    for stats in results.values():
+        stats["peak_rss_mb"] = peak
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Xplore Career Chatbot benchmarks")
+    parser.add_argument("--components", nargs="+", choices=COMPONENTS, default=list(COMPONENTS))
+    parser.add_argument("--iterations", type=int, default=200, help="timed calls per case")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--encoder", choices=ENCODER_BACKENDS, default="fp32",
+                        help="sentence encoder backend of 'predictor'")
+    parser.add_argument("--encoder-threads", type=int, default=0, help="intra-op threads of the encoder")
+    parser.add_argument("--concurrency", type=int, default=8, help="simultaneous chat sessions in 'respond'")
+    parser.add_argument("--llm-concurrency", type=int, default=2, help="LLM generations running at once in 'respond'")
+    parser.add_argument("--llm-tokens", type=int, default=60, help="chunks streamed by the LLM stub per reply")
+    parser.add_argument("--llm-ttft", type=float, default=0.0, help="seconds before the stub's first chunk")
+    parser.add_argument("--llm-tps", type=float, default=0.0, help="stub chunks per second, 0 is unthrottled")
+    parser.add_argument("-o", "--output", default=None, help="result file, default benchmarks/results/<time>.json")
+    parser.add_argument("--save-baseline", action="store_true", help=f"also write the results to {BASELINE_PATH}")
+    parser.add_argument("--compare", default=None, metavar="BASELINE", help="compare against a saved result file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative latency increase counted as regression")
+    options = parser.parse_args()
+
+    report = {"environment": harness.environment(options.seed), "options": vars(options), "results": {}}
+    context = multiprocessing.get_context("spawn")
+    for name in options.components:
+        print(f"Running {name} ...", file=sys.stderr)
+        with ProcessPoolExecutor(1, mp_context=context) as executor:
+            report["results"].update(executor.submit(run_component, name, options).result())
+
+    print(harness.format_results(report["results"]))
+    output = options.output or os.path.join(RESULTS_DIR, report["environment"]["timestamp"].replace(":", "") + ".json")
+    harness.save(output, report)
+    print(f"Results saved to {output}", file=sys.stderr)
+    if options.save_baseline:
+        harness.save(BASELINE_PATH, report)
+        print(f"Baseline saved to {BASELINE_PATH}", file=sys.stderr)
+
+    if options.compare:
+        regressions = harness.compare(harness.load(options.compare), report, options.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regressions above {options.tolerance:.0%}: {', '.join(regressions)}",
+                  file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,40 @@
-import pandas as pd
+import logging
 import numpy as np
 import re
-import nltk
-import math
 import os
-from typing import List
-from sentence_transformers import SentenceTransformer, util
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
+from typing import List, Optional
 from time import perf_counter
 
-DEBUG = True
+from encoders import DEFAULT_MODEL, Encoder
+from metrics import timed
+from predictor_store import DEFAULT_STORE_DIR, load_or_build
+from profession_index import ProfessionIndex
+
+logger = logging.getLogger(__name__)
+
+POSTERIOR_ENGINES = ("analytic", "sampler")
+AGGREGATIONS = ("recency", "max", "attention")
+ASPECTS = [
+    "Mathematical Skills", "Programming Ability", "Creativity", "Analytical Skills",
+    "Communication Skills", "Leadership Skills", "Business Acumen", "Problem-Solving",
+    "Teamwork", "Adaptability"
+]
 
 
 class CareerPredictor:
-    def __init__(self):
-        try:
-            file = pd.read_csv("weights.csv")
-            data = file.iloc[:, 1:].values
-            self.professions = file.iloc[:, 0].values
-            self.feature_matrix = np.array(data, dtype=float)
-        except Exception as e:
-            print(f"Error: unable to load weights.csv file. {str(e)}")
-            self.professions = np.array(["Software Engineer", "Data Scientist", "Manager", "Designer", "Analyst"])
-            self.feature_matrix = np.random.rand(5, 10)
+    def __init__(self, posterior_engine: str = "analytic", seed: int = 0, weights_path: str = "weights.csv",
+                 model_name: str = DEFAULT_MODEL, store_dir: str = DEFAULT_STORE_DIR,
+                 aggregation: str = "recency", encoder_backend: str = "fp32", encoder_options: dict = None,
+                 parity_tolerance: float = 0.0, index_chunk_size: int = 0):
+        """
+        encoder_backend: one of encoders.ENCODER_BACKENDS, encoder_options: keyword arguments of encoders.Encoder.
+        With a parity_tolerance above 0, a non-fp32 encoder is compared against the fp32 model first
+        and replaced by it when the cosine similarities differ by more than the tolerance.
+        index_chunk_size: professions scored per block when ranking, 0 scores all of them at once.
+        """
+        # Heavy imports are deferred until a predictor is actually built
+        import nltk
+        from nltk.sentiment.vader import SentimentIntensityAnalyzer
 
         try:
             nltk.data.find('vader_lexicon')
@@ -31,173 +43,410 @@ class CareerPredictor:
             os.makedirs(nltk_data_dir, exist_ok=True)
             nltk.download("vader_lexicon", download_dir=nltk_data_dir)
 
-        self.st_model = SentenceTransformer("all-MiniLM-L6-v2")
+        self.st_model = Encoder(encoder_backend, model_name, **(encoder_options or {}))
+        if encoder_backend != "fp32" and parity_tolerance > 0:
+            self.st_model = self._checked_encoder(model_name, encoder_options or {}, parity_tolerance)
         self.vader = SentimentIntensityAnalyzer()
 
-        self.aspects = [
-            "Mathematical Skills", "Programming Ability", "Creativity", "Analytical Skills",
-            "Communication Skills", "Leadership Skills", "Business Acumen", "Problem-Solving",
-            "Teamwork", "Adaptability"
-        ]
+        self.aspects = list(ASPECTS)
+        self.weights_path = weights_path
+        self.store_dir = store_dir
+        self.index_chunk_size = index_chunk_size
 
-        self.aspect_embs = self.st_model.encode(self.aspects, convert_to_tensor=True)
+        try:
+            self.aspect_embs, self.index = self._load_store()
+        except Exception as e:
+            logger.error("unable to load weights.csv file. %s", e)
+            professions = ["Software Engineer", "Data Scientist", "Manager", "Designer", "Analyst"]
+            self.index = ProfessionIndex(professions, np.random.rand(5, 10), chunk_size=index_chunk_size)
+            self.aspect_embs = self.st_model.encode(self.aspects, convert_to_numpy=True)
 
         self.gamma = 1
 
+        # How the per-sentence tendency scores of a transcript are combined, see aggregate()
+        if aggregation not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation '{aggregation}', expected one of {AGGREGATIONS}")
+        self.aggregation = aggregation
+        self.recency_decay = 0.8
+        self.attention_temperature = 0.1
+
         self.n_dim = len(self.aspects)
         self.sigma0 = 1.0
+        self.sigma = 1.0
         self.n_samples = 1000
         self.burnin = 200
         self.step_size = 0.05
         self.min_sigma = 0.01
         self.max_sigma = 2.0
 
-        print("Predictor initialized.")
+        # Sampler settings, only used by the "sampler" engine
+        self.n_chains = 8
+        self.check_every = 100
+        self.adapt_every = 50
+        self.rhat_threshold = 1.05
+
+        if posterior_engine not in POSTERIOR_ENGINES:
+            raise ValueError(f"Unknown posterior engine '{posterior_engine}', expected one of {POSTERIOR_ENGINES}")
+        self.posterior_engine = posterior_engine
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+
+        logger.info("Predictor initialized.")
+
+    def _load_store(self):
+        # Keyed by the encoder name, so every backend gets aspect embeddings from its own model
+        aspect_embs, feature_matrix, professions, sectors, majors = load_or_build(
+            self.weights_path, self.aspects, self.st_model.name,
+            lambda aspects: self.st_model.encode(aspects, convert_to_numpy=True),
+            self.store_dir)
+        return aspect_embs, ProfessionIndex(professions, feature_matrix, sectors, majors, self.index_chunk_size)
+
+    def load_index(self) -> ProfessionIndex:
+        """
+        A new ProfessionIndex of the current weights.csv, for a hot reload
+        """
+        return self._load_store()[1]
 
-    def log_posterior(self, W, data, sigma):
+    def check_index(self, index: ProfessionIndex):
         """
-        Compute the log posterior probability
+        Raise ValueError when the index cannot replace the current one
         """
+        if not len(index):
+            raise ValueError(f"{self.weights_path} has no professions")
+        if index.matrix.shape[1] != len(self.aspects):
+            raise ValueError(f"{self.weights_path} has {index.matrix.shape[1]} ability columns, "
+                             f"expected {len(self.aspects)}")
+        if not np.all(np.isfinite(index.matrix)):
+            raise ValueError(f"{self.weights_path} contains weights that are not finite numbers")
+
+    @property
+    def professions(self) -> np.ndarray:
+        return self.index.professions
+
+    @property
+    def feature_matrix(self) -> np.ndarray:
+        return self.index.matrix
+
+    def _checked_encoder(self, model_name: str, encoder_options: dict, tolerance: float) -> Encoder:
+        from encoders import parity
+
+        options = {key: value for key, value in encoder_options.items() if key != "onnx_file"}
         try:
-            log_prior = -0.5 * np.sum(W ** 2) / (self.sigma0 ** 2)
-
-            log_likelihood = 0
-            for j, w in data:
-                if 0 <= j < len(W):
-                    residual = w - W[j]
-                    log_likelihood += -0.5 * (residual ** 2) / (sigma ** 2)
+            reference = Encoder("fp32", model_name, **options)
+        except Exception as e:
+            # e.g. a directory exported before export_onnx() saved the PyTorch weights as well
+            logger.error("Unable to load the fp32 model %s to check encoder %s, using it unchecked. %s",
+                         model_name, self.st_model.name, e)
+            return self.st_model
+        diff = parity(self.st_model, reference, ASPECTS)
+        if diff > tolerance:
+            logger.error("Encoder %s differs from fp32 by %.4f (tolerance %.4f), using fp32",
+                         self.st_model.name, diff, tolerance)
+            return reference
+        logger.info("Encoder %s is within %.4f of fp32", self.st_model.name, diff)
+        return self.st_model
+
+    def posterior(self, data):
+        """
+        Posterior mean of the ability weights W given the tendency data [(aspect index, score)]
+        """
+        with timed("posterior"):
+            if self.posterior_engine == "analytic":
+                return self.analytic_posterior(data)
+            return self.mcmc(data)
 
-            result = log_prior + log_likelihood
+    def analytic_posterior(self, data):
+        """
+        Exact posterior mean: with prior W ~ N(0, sigma0^2 I) and likelihood w ~ N(W[j], sigma^2)
+        the posterior of every dimension is Gaussian with
+        precision 1/sigma0^2 + n_j/sigma^2 and mean (sum w / sigma^2) / precision
+        """
+        if not data or all(abs(w) < 1e-10 for _, w in data):
+            logger.debug("All tendency scores are zero, using direct mapping")
+            return np.array([w for _, w in data])
 
-            if np.isnan(result) or np.isinf(result):
-                return -np.inf
+        idx, values = self._data_arrays(data)
+        counts = np.bincount(idx, minlength=self.n_dim)
+        sums = np.bincount(idx, weights=values, minlength=self.n_dim)
+        precision = 1.0 / self.sigma0 ** 2 + counts / self.sigma ** 2
+        return (sums / self.sigma ** 2) / precision
 
-            return result
+    def _data_arrays(self, data):
+        idx = np.array([j for j, _ in data], dtype=int)
+        values = np.array([w for _, w in data], dtype=float)
+        valid = (idx >= 0) & (idx < self.n_dim)
+        return idx[valid], values[valid]
 
-        except Exception:
-            return -np.inf
+    def log_posterior(self, W, data, sigma):
+        """
+        Compute the log posterior probability.
+        W can be a single weight vector (n_dim,) or a stack of chains (n_chains, n_dim)
+        """
+        idx, values = data if isinstance(data, tuple) else self._data_arrays(data)
+        log_prior = -0.5 * np.sum(W ** 2, axis=-1) / (self.sigma0 ** 2)
+        residual = values - W[..., idx]
+        log_likelihood = -0.5 * np.sum(residual ** 2, axis=-1) / (sigma ** 2)
+
+        result = log_prior + log_likelihood
+        return np.where(np.isfinite(result), result, -np.inf)
+
+    def _rng(self):
+        # A fixed seed gives the same posterior for the same input on every call
+        if self.seed is not None:
+            return np.random.default_rng(self.seed)
+        return self.rng
+
+    @staticmethod
+    def _rhat(chains):
+        """
+        Gelman-Rubin potential scale reduction per dimension, chains: (n_iter, n_chains, n_dim)
+        """
+        n = chains.shape[0]
+        chain_means = chains.mean(axis=0)
+        between = n * chain_means.var(axis=0, ddof=1)
+        within = chains.var(axis=0, ddof=1).mean(axis=0)
+        var_hat = (n - 1) / n * within + between / n
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rhat = np.sqrt(var_hat / within)
+        return np.where(within > 0, rhat, 1.0)
 
     def mcmc(self, data):
+        """
+        Vectorized multi-chain Metropolis-Hastings.
+        All chains step together, and sampling stops early once the chains agree (R-hat below threshold)
+        """
         if not data or all(abs(w) < 1e-10 for _, w in data):
-            if DEBUG:
-                print("All tendency scores are zero, using direct mapping")
+            logger.debug("All tendency scores are zero, using direct mapping")
             return np.array([w for _, w in data])
 
-        W = np.zeros(self.n_dim)
-        samples = []
-        accepted_count = 0
-        sigma = 1.0
+        rng = self._rng()
+        arrays = self._data_arrays(data)
+        sigma = self.sigma
 
+        # Over-dispersed starting points so that R-hat can detect chains that have not mixed yet
+        W = rng.normal(0, self.sigma0, (self.n_chains, self.n_dim))
+        log_p = self.log_posterior(W, arrays, sigma)
+        samples = np.empty((self.n_samples - self.burnin, self.n_chains, self.n_dim))
+        n_kept = 0
+        accepted_count = 0
+        window_start = 0
         step_size = self.step_size
         target_acceptance = 0.44
 
-        for iteration in range(self.n_samples):
-            W_prop = W + np.random.normal(0, step_size, self.n_dim)
+        iteration = 0
+        for iteration in range(1, self.n_samples + 1):
+            W_prop = W + rng.normal(0, step_size, W.shape)
+            log_p_prop = self.log_posterior(W_prop, arrays, sigma)
+            log_alpha = np.clip(log_p_prop - log_p, -50, 10)
+            # Metropolis-Hastings
+            accept = np.log(rng.random(self.n_chains)) < log_alpha
+            W = np.where(accept[:, None], W_prop, W)
+            log_p = np.where(accept, log_p_prop, log_p)
+            accepted_count += int(accept.sum())
+
+            if iteration > self.burnin:
+                samples[n_kept] = W
+                n_kept += 1
+                if n_kept >= self.check_every and n_kept % self.check_every == 0:
+                    if np.max(self._rhat(samples[:n_kept])) < self.rhat_threshold:
+                        break
+
+            # Tune the proposal on the acceptance rate of the last window
+            if iteration % self.adapt_every == 0:
+                current_acceptance = (accepted_count - window_start) / (self.adapt_every * self.n_chains)
+                window_start = accepted_count
+                if current_acceptance < target_acceptance * 0.8:
+                    step_size *= 0.7
+                elif current_acceptance > target_acceptance * 1.2:
+                    step_size *= 1.5
+                step_size = np.clip(step_size, 0.001, 0.5)
 
-            try:
-                log_alpha = (
-                        self.log_posterior(W_prop, data, sigma)
-                        - self.log_posterior(W, data, sigma)
-                )
-                log_alpha = np.clip(log_alpha, -50, 10)
-                # Metropolis-Hastings
-                if log_alpha > 0 or np.random.rand() < np.exp(log_alpha):
-                    W = W_prop
-                    accepted_count += 1
+        if n_kept == 0:
+            logger.warning("No valid MCMC samples, using direct tendency scores")
+            return np.array([w for _, w in data])
 
-            except Exception:
-                pass
+        posterior_mean = samples[:n_kept].reshape(-1, self.n_dim).mean(axis=0)
 
-            if iteration >= self.burnin:
-                samples.append(W.copy())
+        if logger.isEnabledFor(logging.DEBUG):
+            acceptance_rate = accepted_count / (iteration * self.n_chains)
+            logger.debug("MCMC completed: iterations=%d, mean=%.3f, acceptance_rate=%.3f, final_step_size=%.4f",
+                         iteration, posterior_mean.mean(), acceptance_rate, step_size)
 
-            if iteration > 0 and iteration % 100 == 0:
-                current_acceptance = accepted_count / iteration
-                if current_acceptance < target_acceptance * 0.8:
-                    step_size *= 0.9
-                elif current_acceptance > target_acceptance * 1.2:
-                    step_size *= 1.1
-                step_size = np.clip(step_size, 0.001, 0.5)
+        return posterior_mean
+
+    def default_result(self, value: float) -> dict:
+        return {profession: value for profession in self.professions[:min(10, len(self.professions))]}
 
-        if samples:
-            samples = np.array(samples)
-            posterior_mean = samples.mean(axis=0)
-            if len(data) > 0:
-                residuals = np.array([w - posterior_mean[i] for i, w in data if 0 <= i < len(posterior_mean)])
-                if len(residuals) > 0:
-                    empirical_std = np.std(residuals)
-                    shrinkage = max(0.1, 0.8 / np.sqrt(len(data)))
-                    sigma = np.clip(max(empirical_std, shrinkage), self.min_sigma, self.max_sigma)
-
-            if DEBUG:
-                acceptance_rate = accepted_count / self.n_samples
-                print(f"MCMC completed: sigma={sigma:.3f}, mean={posterior_mean.mean():.3f}, "
-                      f"acceptance_rate={acceptance_rate:.3f}, final_step_size={step_size:.4f}")
-
-            return posterior_mean
+    def encode(self, sents: List[str], batch_size: int = 32) -> np.ndarray:
+        """
+        Encode sentences and return their cosine similarity to every aspect, shape (len(sents), n_dim)
+        """
+        with timed("encode"):
+            sent_embs = self.st_model.encode(sents, batch_size=batch_size, convert_to_numpy=True)
+            return cos_sim(sent_embs, self.aspect_embs)
+
+    def sentiment(self, sents: List[str]) -> np.ndarray:
+        """
+        VADER compound score of every sentence
+        """
+        with timed("vader"):
+            return np.array([self.vader.polarity_scores(s)["compound"] for s in sents], dtype=float)
+
+    def score(self, posterior: np.ndarray, sector: Optional[str] = None, major: Optional[str] = None) -> dict:
+        """
+        Top 10 professions for a posterior mean of the ability weights
+        """
+        with timed("scoring"):
+            return self.top(posterior, sector, major)[0]
+
+    def tendency_scores(self, cos_rows: np.ndarray, senti: np.ndarray) -> np.ndarray:
+        """
+        Tendency score of every aspect for every sentence from its aspect similarity and sentiment.
+        cos_rows: (n_sents, n_dim), senti: (n_sents,)
+        """
+        w = np.maximum(0, cos_rows)
+        raw_score = w * senti[:, None]
+        score = np.clip(raw_score, -1.0, 1.0)
+        score = np.sign(raw_score) * np.power(np.abs(score), self.gamma) * 2
+        return np.clip(score, -2.0, 2.0)
+
+    def aggregate(self, scores: np.ndarray, sims: np.ndarray, starts: np.ndarray) -> np.ndarray:
+        """
+        Combine the per-sentence tendency scores (n_sents, n_dim) into one row per text, shape (len(starts), n_dim).
+        The sentences of text k are rows starts[k]:starts[k + 1]; every text must have at least one sentence.
+        "recency": mean weighted by recency_decay ** (sentences after this one), later answers count more
+        "max": per aspect, the score with the largest magnitude
+        "attention": per aspect, softmax over the sentences of similarity / attention_temperature
+        """
+        starts = np.asarray(starts, dtype=int)
+        n_sents = len(scores)
+        if self.aggregation == "max":
+            high = np.maximum.reduceat(scores, starts, axis=0)
+            low = np.minimum.reduceat(scores, starts, axis=0)
+            return np.where(np.abs(low) > np.abs(high), low, high)
+
+        ends = np.append(starts[1:], n_sents)
+        text_of = np.repeat(np.arange(len(starts)), ends - starts)
+        if self.aggregation == "recency":
+            weights = np.power(self.recency_decay, ends[text_of] - 1 - np.arange(n_sents))[:, None]
         else:
-            if DEBUG:
-                print("Warning: No valid MCMC samples, using direct tendency scores")
-            return np.array([w for _, w in data])
+            logits = sims / self.attention_temperature
+            # Subtract the per-text maximum so that exp cannot overflow
+            weights = np.exp(logits - np.maximum.reduceat(logits, starts, axis=0)[text_of])
+        return np.add.reduceat(scores * weights, starts, axis=0) / np.add.reduceat(
+            np.broadcast_to(weights, scores.shape), starts, axis=0)
+
+    def tendency(self, sims: np.ndarray, senti: np.ndarray) -> np.ndarray:
+        """
+        Tendency row (n_dim,) of one transcript from the similarity rows and sentiment of all its sentences
+        """
+        return self.aggregate(self.tendency_scores(sims, senti), sims, np.zeros(1, dtype=int))[0]
 
-    def predict(self, text: str) -> dict:
+    def top(self, posteriors: np.ndarray, sector: Optional[str] = None, major: Optional[str] = None,
+            k: int = 10) -> List[dict]:
+        """
+        Top k professions with their min-max normalized scores for every posterior row (n, n_dim).
+        Only professions of `sector` that accept `major` are ranked, and normalized among themselves
         """
-        Make career predictions: enter the user's responses and return the top 10 predicted careers and their probabilities
+        # Read once, a hot reload may replace the index meanwhile
+        index = self.index
+        mask = index.mask(sector, major)
+        n_candidates = len(index) if mask is None else int(np.count_nonzero(mask))
+        rows, scores, low, high = index.search(posteriors, k, mask)
+
+        score_range = (high - low)[:, None]
+        if n_candidates > 1:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                scores = np.where(score_range > 1e-10, (scores - low[:, None]) / score_range, 0.5)
+        else:
+            scores = np.full(scores.shape, 0.5)  # Default value for a single occupation
+
+        return [{index.professions[row]: float(value) for row, value in zip(query_rows, query_scores)}
+                for query_rows, query_scores in zip(rows, scores)]
+
+    def similar_careers(self, profession: str, k: int = 10, sector: Optional[str] = None,
+                        major: Optional[str] = None) -> dict:
+        """
+        The k professions whose abilities are closest (cosine similarity) to those of `profession`.
+        Raises ValueError for an unknown profession
+        """
+        with timed("similar"):
+            index = self.index
+            rows, similarities = index.similar(profession, k, index.mask(sector, major))
+            return {index.professions[row]: float(value) for row, value in zip(rows, similarities)}
+
+    def predict(self, text: str, sector: Optional[str] = None, major: Optional[str] = None) -> dict:
+        """
+        Make career predictions: enter the user's responses and return the top 10 predicted careers and their probabilities.
+        sector, major: only rank the professions of this sector / accepting this major
         """
         if not text.strip():
-            return {profession: 0.0 for profession in self.professions[:min(10, len(self.professions))]}
+            return self.default_result(0.0)
 
         try:
-            sents = [s.strip() for s in re.split(r"[.;!?]\s*", text) if s.strip()]
+            sents = split_sentences(text)
             if not sents:
-                return {profession: 0.0 for profession in self.professions[:min(10, len(self.professions))]}
-
-            sent_embs = self.st_model.encode(sents, convert_to_tensor=True)
-            cos_sim = util.cos_sim(sent_embs, self.aspect_embs).cpu().numpy()
-            senti_scores = [self.vader.polarity_scores(s)["compound"] for s in sents]
-            print(f"Sentiment scores: {senti_scores}")
-
-            tendency: List[tuple] = []
-            for i in range(len(self.aspects)):
-                w = max(0, 0, cos_sim[0][i])
-                raw_score = w * senti_scores[0]
-                score = max(-1.0, min(1.0, raw_score))
-                score = math.copysign(math.pow(abs(score), self.gamma) * 2, raw_score)
-                score = max(-2.0, min(2.0, score))
-                tendency.append((i, score))
-
-            posterior = self.mcmc(tendency)
-
-            scores = self.feature_matrix.dot(posterior)
-
-            # normalize
-            if len(scores) > 1:
-                min_score = np.min(scores)
-                max_score = np.max(scores)
-                score_range = max_score - min_score
-
-                if score_range > 1e-10:
-                    scores = (scores - min_score) / score_range
-                else:
-                    scores = np.ones_like(scores) * 0.5
-            else:
-                scores = np.array([0.5])  # Default value for a single occupation
-
-            result = dict()
-            num_professions = min(10, len(self.professions))
-            top_indices = np.argsort(-scores)[:num_professions]
-
-            for idx in top_indices:
-                if idx < len(self.professions):
-                    result[self.professions[idx]] = float(scores[idx])
-
-            if DEBUG:
-                print(f"Predicted professions: {result}")
+                return self.default_result(0.0)
+
+            sims = self.encode(sents)
+            senti_scores = self.sentiment(sents)
+            logger.debug("Sentiment scores: %s", senti_scores)
+
+            tendency = list(enumerate(self.tendency(sims, senti_scores).tolist()))
+
+            posterior = self.posterior(tendency)
+            result = self.score(posterior, sector, major)
+            logger.debug("Predicted professions: %s", result)
 
             return result
 
         except Exception as e:
-            if DEBUG:
-                print(f"Error in prediction: {str(e)}")
+            logger.error("Error in prediction: %s", e)
             # Returns the default result
-            return {profession: 0.1 for profession in self.professions[:min(10, len(self.professions))]}
+            return self.default_result(0.1)
+
+    def posterior_batch(self, tendency: np.ndarray) -> np.ndarray:
+        """
+        Posterior means for a whole batch of tendency rows (n_texts, n_dim).
+        The analytic engine is a single array expression, the sampler runs row by row
+        """
+        if self.posterior_engine == "analytic":
+            # One observation per dimension, so the precision is the same for every entry
+            precision = 1.0 / self.sigma0 ** 2 + 1.0 / self.sigma ** 2
+            return (tendency / self.sigma ** 2) / precision
+        return np.array([self.mcmc(list(enumerate(row.tolist()))) for row in tendency])
+
+    def predict_batch(self, texts: List[str], batch_size: int = 256, sector: Optional[str] = None,
+                      major: Optional[str] = None) -> List[dict]:
+        """
+        Predict many independent texts at once.
+        All sentences are encoded together in large batches and the whole batch is scored with one matrix multiply
+        """
+        sents_per_text = [split_sentences(text) if text and text.strip() else [] for text in texts]
+        flat_sents = [sent for sents in sents_per_text for sent in sents]
+        if not flat_sents:
+            return [self.default_result(0.0) for _ in texts]
+
+        sims = self.encode(flat_sents, batch_size=batch_size)
+        senti = self.sentiment(flat_sents)
+
+        # Every sentence feeds the tendency stage, aggregated per text
+        starts = np.cumsum([0] + [len(sents) for sents in sents_per_text[:-1]])
+        has_sents = np.array([len(sents) > 0 for sents in sents_per_text])
+        tendency = self.aggregate(self.tendency_scores(sims, senti), sims, starts[has_sents])
+        with timed("posterior"):
+            posterior = self.posterior_batch(tendency)
+
+        with timed("scoring"):
+            ranked = iter(self.top(posterior, sector, major))
+            return [next(ranked) if present else self.default_result(0.0) for present in has_sents]
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in re.split(r"[.;!?]\s*", text) if s.strip()]
+
+
+def cos_sim(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    return a @ b.T
@@ -0,0 +1,147 @@
+import io
+import math
+from functools import lru_cache
+from typing import Tuple
+from xml.sax.saxutils import escape
+
+from metrics import timed
+from startup import LazyObject, startup_timer
+
+CHART_BACKENDS = ("svg", "matplotlib")
+
+# matplotlib's Set3 qualitative colormap
+SET3_COLORS = ("#8dd3c7", "#ffffb3", "#bebada", "#fb8072", "#80b1d3", "#fdb462",
+               "#b3de69", "#fccde5", "#d9d9d9", "#bc80bd", "#ccebc5", "#ffed6f")
+
+
+def load_matplotlib():
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.figure import Figure
+    return matplotlib
+
+
+# Only needed by the "matplotlib" chart backend
+matplotlib_module = LazyObject(load_matplotlib, "import matplotlib", startup_timer)
+
+
+def plot_svg(probs: dict, backend: str = "svg") -> str:
+    """
+    Plot the prediction results as a bar chart and return a string in SVG format
+    dict: {career : probability}
+    backend: "svg" writes the SVG directly, "matplotlib" draws it with matplotlib (slower, higher fidelity)
+    """
+    with timed("svg_render"):
+        if backend == "matplotlib":
+            return plot_svg_matplotlib(probs)
+        return render_svg(tuple((str(label), round(float(value), 3)) for label, value in probs.items()))
+
+
+def _nice_ticks(upper: float) -> list:
+    raw_step = upper / 5
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    step = next(m * magnitude for m in (1, 2, 2.5, 5, 10) if m * magnitude >= raw_step)
+    return [i * step for i in range(int(upper / step + 1e-9) + 1)]
+
+
+@lru_cache(maxsize=512)
+def render_svg(bars: Tuple[Tuple[str, float], ...]) -> str:
+    """
+    The same bar chart as plot_svg_matplotlib, written straight to SVG.
+    Cached on the (career, rounded probability) pairs, so repeated predictions are free
+    """
+    width, height = 720, 432
+    label_width = max((len(label) for label, _ in bars), default=0) * 6.2
+    left, right, top, bottom = 20 + label_width, 20, 40, 50
+    plot_w, plot_h = width - left - right, height - top - bottom
+
+    max_val = max((value for _, value in bars), default=1)
+    x_max = max_val + 0.1
+    x = lambda value: left + plot_w * value / x_max
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}pt" height="{height}pt" '
+        f'viewBox="0 0 {width} {height}" font-family="DejaVu Sans, Arial, sans-serif">',
+        f'<text x="{left + plot_w / 2:.1f}" y="24" font-size="14" font-weight="bold" text-anchor="middle">'
+        f'Career Recommendation Probabilities</text>',
+    ]
+
+    for tick in _nice_ticks(x_max):
+        tx = x(tick)
+        parts.append(f'<line x1="{tx:.1f}" y1="{top}" x2="{tx:.1f}" y2="{top + plot_h}" stroke="#b0b0b0" '
+                     f'stroke-width="0.5" stroke-dasharray="3.7,1.6" opacity="0.7"/>')
+        parts.append(f'<line x1="{tx:.1f}" y1="{top + plot_h}" x2="{tx:.1f}" y2="{top + plot_h + 3.5}" '
+                     f'stroke="#000" stroke-width="0.8"/>')
+        parts.append(f'<text x="{tx:.1f}" y="{top + plot_h + 16}" font-size="10" text-anchor="middle">'
+                     f'{tick:.1f}</text>')
+
+    # matplotlib draws the reversed list bottom-up, so the first career is on top and gets the last color
+    n = len(bars)
+    slot = plot_h / max(n, 1)
+    for i, (label, value) in enumerate(bars):
+        color = SET3_COLORS[(n - 1 - i) % len(SET3_COLORS)]
+        y = top + slot * i + slot * 0.1
+        parts.append(f'<rect x="{left:.1f}" y="{y:.1f}" width="{x(value) - left:.1f}" height="{slot * 0.8:.1f}" '
+                     f'fill="{color}" fill-opacity="0.8"/>')
+        parts.append(f'<text x="{left - 6:.1f}" y="{y + slot * 0.4 + 3.5:.1f}" font-size="10" text-anchor="end">'
+                     f'{escape(label)}</text>')
+
+    parts.append(f'<line x1="{left:.1f}" y1="{top}" x2="{left:.1f}" y2="{top + plot_h}" stroke="#000" stroke-width="0.8"/>')
+    parts.append(f'<line x1="{left:.1f}" y1="{top + plot_h}" x2="{left + plot_w:.1f}" y2="{top + plot_h}" '
+                 f'stroke="#000" stroke-width="0.8"/>')
+    parts.append(f'<text x="{left + plot_w / 2:.1f}" y="{height - 12}" font-size="12" text-anchor="middle">'
+                 f'Probability</text>')
+    parts.append('</svg>')
+    return "\n".join(parts)
+
+
+def plot_svg_matplotlib(probs: dict) -> str:
+    """
+    Plot the prediction results with matplotlib and return a string in SVG format
+    """
+    matplotlib = matplotlib_module.get()
+    labels = list(probs.keys())
+    values = list(probs.values())
+
+    # A standalone Figure keeps no pyplot global state, so charts can be drawn from several threads
+    fig = matplotlib.figure.Figure(figsize=(10, 6), facecolor='none')
+    ax = fig.subplots()
+    ax.set_facecolor('none')
+
+    colors = matplotlib.colormaps['Set3'].colors
+    bar_colors = [colors[i % len(colors)] for i in range(len(values))]
+
+    ax.barh(labels[::-1], values[::-1], color=bar_colors, alpha=0.8)
+
+    max_val = max(values) if values else 1
+    ax.set_xlim(0, max_val + 0.1)
+    ax.set_xlabel("Probability", fontsize=12)
+    ax.set_title("Career Recommendation Probabilities", fontsize=14, fontweight='bold')
+
+    ax.grid(axis='x', linestyle='--', linewidth=0.5, alpha=0.7)
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+
+    fig.tight_layout()
+
+    buf = io.StringIO()
+    fig.savefig(buf, format='svg', transparent=True, bbox_inches='tight')
+    svg_data = buf.getvalue()
+    buf.close()
+    return svg_data
+
+
+def chart_html(svg: str) -> str:
+    return f"""
+                <div style="
+                    background: linear-gradient(135deg, rgba(255,255,255,0.9), rgba(240,248,255,0.9));
+                    border-radius: 15px;
+                    padding: 25px;
+                    margin: 10px 0;
+                    box-shadow: 0 8px 32px rgba(0,0,0,0.1);
+                    border: 1px solid rgba(255,255,255,0.2);
+                    backdrop-filter: blur(10px);
+                ">
+                    {svg}
+                </div>
+                """
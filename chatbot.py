@@ -1,18 +1,129 @@
 import aiml
+import hashlib
+import itertools
 import os
-import io
-from contextlib import redirect_stdout
+import logging
+import threading
+import weakref
+from typing import Callable, Optional
 
-from expert_system import UserProfile, inference_engine, RULE_BASE
+from expert_system import UserProfile, inference_engine, render_report
+
+logger = logging.getLogger(__name__)
+
+AIML_FILES = ["career_query.aiml", "career_dialogue.aiml"]
+BRAIN_DIR = os.path.join(".cache", "aiml")
+
+# Dialogue-state prompts without wildcards, predicates or <random>, answered from a table instead of the matcher
+FIXED_PROMPTS = ("STARTPLANNING", "ASK GENERAL", "ASKINTERESTS", "ASKMBTI", "ASKCHALLENGES",
+                 "ASKCHALLENGESSKIPMBTI", "CONFIRMINFO", "FINALRESPONSE")
+
+
+class Brain:
+    """
+    A loaded AIML kernel shared by every Bot, plus the precomputed fixed prompt templates.
+    Bots keep their own AIML predicates through separate kernel session ids.
+    """
+
+    def __init__(self, kernel: aiml.Kernel, key: str):
+        self.kernel = kernel
+        self.key = key
+        self.templates = {pattern: kernel.respond(pattern) for pattern in FIXED_PROMPTS}
+        # Template of the catch-all '*' category, reached by inputs no other pattern matches
+        self.catch_all = kernel._brain.match("XPLORE CATCH ALL PROBE", "", "")
+
+    def _matches(self, sentence: str) -> bool:
+        if not self.kernel._check_contain_english(sentence):
+            sentence = " ".join(sentence)
+        template = self.kernel._brain.match(self.kernel._subbers["normal"].sub(sentence), "", "")
+        return template is not None and template is not self.catch_all
+
+    def is_miss(self, text: str) -> bool:
+        """
+        True when Kernel.respond would only answer `text` with the catch-all: the input is split into sentences
+        and run through the 'normal' substitutions the same way, and no sentence matches a category of its own
+        """
+        return not any(self._matches(sentence) for sentence in aiml.Utils.sentences(text) if sentence)
+
+
+_brains = {}
+_brains_lock = threading.Lock()
+# Set by publish_brain() on a hot reload, Bots move to it before their next message
+_published_brain: Optional[Brain] = None
+
+
+def brain_key(aiml_files) -> str:
+    digest = hashlib.sha256()
+    for file in aiml_files:
+        if os.path.exists(file):
+            digest.update(file.encode("utf-8") + b"\0")
+            with open(file, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def load_brain(aiml_files=AIML_FILES, brain_dir: str = BRAIN_DIR) -> Brain:
+    """
+    Return the shared Brain for the AIML files.
+    The parsed pattern graph is cached on disk as a brain file named after the hash of the AIML files,
+    so it is only re-parsed when one of them changes
+    """
+    key = brain_key(aiml_files)
+    with _brains_lock:
+        if key in _brains:
+            return _brains[key]
+
+        kernel = aiml.Kernel()
+        brain_file = os.path.join(brain_dir, f"brain-{key}.brn")
+        if os.path.exists(brain_file):
+            kernel.loadBrain(brain_file)
+        else:
+            for file in aiml_files:
+                if os.path.exists(file):
+                    kernel.learn(file)
+            os.makedirs(brain_dir, exist_ok=True)
+            tmp_file = f"{brain_file}.{os.getpid()}.tmp"
+            kernel.saveBrain(tmp_file)
+            os.replace(tmp_file, brain_file)
+
+        brain = Brain(kernel, key)
+        _brains[key] = brain
+        return brain
+
+
+def check_brain(brain: Brain):
+    """
+    Raise ValueError when a fixed dialogue prompt has no category of its own, the planning dialogue could not continue
+    """
+    missing = [pattern for pattern, template in brain.templates.items() if not template or brain.is_miss(pattern)]
+    if missing:
+        raise ValueError(f"AIML brain {brain.key} has no template for {', '.join(missing)}")
+
+
+def publish_brain(brain: Brain):
+    """
+    Make `brain` the one new Bots use and existing Bots switch to, and drop the other cached brains
+    """
+    global _published_brain
+    with _brains_lock:
+        _brains.clear()
+        _brains[brain.key] = brain
+        _published_brain = brain
 
 
 class Bot:
-    def __init__(self):
-        self.kernel = aiml.Kernel()
-        aiml_files = ["career_query.aiml", "career_dialogue.aiml"]
-        for file in aiml_files:
-            if os.path.exists(file):
-                self.kernel.learn(file)
+    _session_ids = itertools.count()
+
+    def __init__(self, brain: Brain = None, fallback: Callable[[str], Optional[str]] = None):
+        """
+        fallback: optional semantic router, returns the pattern to answer an AIML miss with (or None)
+        """
+        self.brain = brain or _published_brain or load_brain()
+        self.fallback = fallback
+        self.kernel = self.brain.kernel
+        self.session_id = f"bot-{next(Bot._session_ids)}"
+        # Drop this bot's AIML predicates from the shared kernel once the bot is gone
+        self._finalizer = weakref.finalize(self, self.kernel._deleteSession, self.session_id)
 
         self.CHALLENGE_MAP = {
             '1': 'dislikes group projects', '2': 'dislikes public speaking or presentations',
@@ -38,21 +149,40 @@ class Bot:
     def reset(self):
         self.conversation_state = 0
         self.user_data = {}
-        print("INFO: Chatbot state has been reset.")
+        logger.debug("Chatbot state has been reset.")
 
     def _generate_analysis_report(self, profile: UserProfile) -> str:
+        return render_report(inference_engine(profile))
 
-        f = io.StringIO()
+    def _follow_published_brain(self):
+        """
+        Move to the brain published by a hot reload, taking this bot's AIML predicates along
+        """
+        brain = _published_brain
+        if brain is None or brain is self.brain:
+            return
+        predicates = self.kernel.getSessionData(self.session_id)
+        self._finalizer()
+        if predicates:
+            brain.kernel._sessions[self.session_id] = predicates
+        self.brain = brain
+        self.kernel = brain.kernel
+        self._finalizer = weakref.finalize(self, self.kernel._deleteSession, self.session_id)
+        logger.debug("%s moved to AIML brain %s", self.session_id, brain.key)
 
-        with redirect_stdout(f):
-            inference_engine(profile, RULE_BASE)
-            final_abilities = profile.abilities.sort_values(ascending=False)
-            print("\n--- Final Ability Weights Analysis ---")
-            for ability, score in final_abilities.items():
-                print(f"{ability:<25} {score:+.2f}")
-            print("=" * 35)
+    def respond(self, pattern: str) -> str:
+        template = self.brain.templates.get(pattern)
+        if template is not None:
+            return template
+        return self.kernel.respond(pattern, self.session_id)
 
-        return f.getvalue()
+    def respond_general(self, user_input: str) -> str:
+        if self.fallback is not None and self.brain.is_miss(user_input):
+            pattern = self.fallback(user_input)
+            if pattern and not self.brain.is_miss(pattern):
+                logger.debug("AIML miss routed to pattern %s", pattern)
+                return self.respond(pattern)
+        return self.respond(user_input.upper())
 
     def process_aiml_formatting(self, text: str) -> str:
             text = text.replace('_br_', '\n\n')
@@ -61,6 +191,7 @@ class Bot:
             return text or "I'm not sure how to answer that. Try asking about careers, majors, or career preparation tips."
     
     def get_response(self, user_input: str) -> str:
+        self._follow_published_brain()
         user_input = user_input.strip().lower()
 
         # Initial Mode
@@ -68,34 +199,34 @@ class Bot:
             aiml_input = user_input.strip().lower()
             if aiml_input == "start planning":
                 self.conversation_state = 1
-                return self.process_aiml_formatting(self.kernel.respond("STARTPLANNING"))
+                return self.process_aiml_formatting(self.respond("STARTPLANNING"))
             elif aiml_input == "ask general":
-                return self.process_aiml_formatting(self.kernel.respond("ASK GENERAL"))
+                return self.process_aiml_formatting(self.respond("ASK GENERAL"))
             else:
-                return self.process_aiml_formatting(self.kernel.respond(user_input.upper()))
+                return self.process_aiml_formatting(self.respond_general(user_input))
 
         # Handle mid-process interruptions
         if user_input == "start over":
             self.reset()
-            return self.process_aiml_formatting(self.kernel.respond("STARTPLANNING"))        
+            return self.process_aiml_formatting(self.respond("STARTPLANNING"))        
         if user_input == "cancel planning":
             self.reset()
             return "Career planning cancelled. You can now ask general questions or start a new plan."
         if user_input == "ask general":
-            return self.process_aiml_formatting(self.kernel.respond("ASK GENERAL"))
+            return self.process_aiml_formatting(self.respond("ASK GENERAL"))
 
         # Career Planning Step
         if self.conversation_state == 1:
             self.user_data['major'] = user_input
             self.conversation_state = 2
-            template = self.kernel.respond("ASKINTERESTS")
+            template = self.respond("ASKINTERESTS")
             formatted = template.format(major=self.user_data['major'])
             return self.process_aiml_formatting(formatted)
 
         if self.conversation_state == 2:
             self.user_data['interests'] = user_input
             self.conversation_state = 3
-            template = self.kernel.respond("ASKMBTI")
+            template = self.respond("ASKMBTI")
             formatted = template.format(interests=self.user_data['interests'])
             return self.process_aiml_formatting(formatted)
 
@@ -103,18 +234,18 @@ class Bot:
             if user_input in ["i don't know", "i dont know", "not sure", "不知道"]:
                 self.user_data['mbti'] = "Unknown"
                 self.conversation_state = 4
-                return self.process_aiml_formatting(self.kernel.respond("ASKCHALLENGESSKIPMBTI"))
+                return self.process_aiml_formatting(self.respond("ASKCHALLENGESSKIPMBTI"))
             else:
                 self.user_data['mbti'] = user_input.upper()
                 self.conversation_state = 4
-                template = self.kernel.respond("ASKCHALLENGES")
+                template = self.respond("ASKCHALLENGES")
                 formatted = template.format(mbti=self.user_data['mbti'])
                 return self.process_aiml_formatting(formatted)
 
         if self.conversation_state == 4:
             self.user_data['challenges_input'] = user_input
             self.conversation_state = 5
-            template = self.kernel.respond("CONFIRMINFO")
+            template = self.respond("CONFIRMINFO")
             formatted = template.format(**self.user_data)
             return self.process_aiml_formatting(formatted)
 
@@ -122,21 +253,21 @@ class Bot:
             if user_input in ["confirm", "确认"]:
                 profile = self._build_user_profile()
                 analysis_result = self._generate_analysis_report(profile)
-                final_message = self.kernel.respond("FINALRESPONSE")
+                final_message = self.respond("FINALRESPONSE")
                 self.reset()
                 self.conversation_state = 6  # technically reset already,保留6状态用于明确结束
                 return f"{final_message}\n\n```text\n{analysis_result}\n```\n\n[System] Analysis complete. You can say 'start over' to begin."
             elif user_input == "start over":
                 self.reset()
                 self.conversation_state = 1
-                return self.process_aiml_formatting(self.kernel.respond("STARTPLANNING"))
+                return self.process_aiml_formatting(self.respond("STARTPLANNING"))
             else:
                 return "Please say 'confirm' to complete or 'start over' to restart."
 
         if self.conversation_state == 6:
             return "The analysis is complete. If you want to start a new one, please say 'start over'."
 
-        return "Unexpected error. Restarting...\n" + self.kernel.respond("STARTPLANNING")
+        return "Unexpected error. Restarting...\n" + self.respond("STARTPLANNING")
 
     def _build_user_profile(self) -> UserProfile:
         major = self.user_data.get('major', '')
@@ -148,3 +279,9 @@ class Bot:
         challenge_numbers = [num.strip() for num in challenges_str.split(',')]
         challenges = [self.CHALLENGE_MAP[num] for num in challenge_numbers if num in self.CHALLENGE_MAP]
         return UserProfile(major=major, interests=interests, mbti=mbti, challenges=challenges)
+
+
+if __name__ == "__main__":
+    # Build step: compile the AIML files into the cached brain file
+    brain = load_brain()
+    print(f"INFO: AIML brain {brain.key} ready with {brain.kernel.numCategories()} categories.")
@@ -0,0 +1,127 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from career_predictor import CareerPredictor, split_sentences
+
+logger = logging.getLogger(__name__)
+
+
+def sentence_key(sentence: str) -> bytes:
+    return hashlib.blake2b(sentence.encode("utf-8"), digest_size=16).digest()
+
+
+class EmbeddingCache:
+    """
+    Content-hashed LRU cache of the per-sentence work done by CareerPredictor:
+    the aspect similarity row and the VADER compound score.
+    Shared by all sessions, bounded to `max_entries` sentences.
+    """
+
+    def __init__(self, max_entries: int = 20000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Tuple[np.ndarray, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def lookup(self, predictor: CareerPredictor, sents: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Similarity rows (len(sents), n_dim) and sentiment scores (len(sents),) for the sentences,
+        encoding only the ones that are not cached yet, in a single batch
+        """
+        keys = [sentence_key(sent) for sent in sents]
+        found: List[Optional[Tuple[np.ndarray, float]]] = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                found.append(entry)
+            missing = [i for i, entry in enumerate(found) if entry is None]
+            self.hits += len(sents) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            # A sentence can repeat inside one transcript, encode it once
+            unique = list(dict.fromkeys(sents[i] for i in missing))
+            sims = predictor.encode(unique)
+            senti = predictor.sentiment(unique)
+            fresh = {sent: (sims[j], senti[j]) for j, sent in enumerate(unique)}
+            with self._lock:
+                for sent, entry in fresh.items():
+                    self._entries[sentence_key(sent)] = entry
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            for i in missing:
+                found[i] = fresh[sents[i]]
+
+        sims = np.stack([entry[0] for entry in found])
+        senti = np.array([entry[1] for entry in found])
+        return sims, senti
+
+
+class IncrementalPredictor:
+    """
+    Per-session wrapper around CareerPredictor.predict for a transcript that only grows.
+    Sentences already seen are served from the shared EmbeddingCache,
+    and the previous result is returned as-is when the transcript or the tendency did not change.
+    `version` increases every time a new result is produced, so callers can cache what they render from it.
+    """
+
+    def __init__(self, predictor: CareerPredictor, cache: EmbeddingCache):
+        self.predictor = predictor
+        self.cache = cache
+        self.text_key: Optional[bytes] = None
+        self.tendency: Optional[np.ndarray] = None
+        self.result: Optional[dict] = None
+        self.index = predictor.index
+        self.version = 0
+
+    def predict(self, text: str) -> dict:
+        key = sentence_key(text)
+        # A hot reload of weights.csv replaces the predictor's index, earlier results are stale then
+        if self.index is not self.predictor.index:
+            self.index = self.predictor.index
+            self.text_key = self.tendency = self.result = None
+        if key == self.text_key and self.result is not None:
+            return self.result
+
+        sents = split_sentences(text)
+        if not sents:
+            return self._update(key, None, self.predictor.default_result(0.0))
+
+        try:
+            sims, senti = self.cache.lookup(self.predictor, sents)
+            tendency = self.predictor.tendency(sims, senti)
+            if self.tendency is not None and np.array_equal(tendency, self.tendency):
+                self.text_key = key
+                return self.result
+
+            posterior = self.predictor.posterior(list(enumerate(tendency.tolist())))
+            result = self.predictor.score(posterior)
+            logger.debug("Predicted professions: %s", result)
+            return self._update(key, tendency, result)
+
+        except Exception as e:
+            logger.error("Error in prediction: %s", e)
+            return self._update(None, None, self.predictor.default_result(0.1))
+
+    def _update(self, key, tendency, result) -> dict:
+        self.text_key = key
+        self.tendency = tendency
+        self.result = result
+        self.version += 1
+        return result
@@ -0,0 +1,174 @@
+"""
+Sentence encoder backends for CareerPredictor.
+
+    fp32  SentenceTransformer in full precision PyTorch (default)
+    int8  the same model with dynamic int8 quantization of its Linear layers
+    onnx  an exported ONNX Runtime graph, loaded from local files only (needs optimum[onnxruntime])
+
+    python encoders.py --export-onnx models/all-MiniLM-L6-v2
+    python encoders.py --backend int8 --threads 4
+    python encoders.py --backend onnx --model models/all-MiniLM-L6-v2 --onnx-file onnx/model_qint8_avx2.onnx
+
+The command line compares a backend against fp32: encode throughput of both and the largest difference
+of the sentence-aspect cosine similarities. It exits with status 1 when that difference exceeds --tolerance.
+"""
+import argparse
+import logging
+import sys
+from time import perf_counter
+from typing import List, Optional
+
+import numpy as np
+
+from metrics import ENCODE_SENTENCES_PER_SECOND
+
+logger = logging.getLogger(__name__)
+
+ENCODER_BACKENDS = ("fp32", "int8", "onnx")
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+
+# Short answers of the kind the chat collects, used for the parity check and the throughput measurement
+PARITY_SENTENCES = [
+    "I love solving math problems and writing code",
+    "Public speaking makes me nervous",
+    "I enjoy leading my team in group projects",
+    "Drawing and design are my favourite hobbies",
+    "I want to start my own company one day",
+    "Analyzing data to find patterns is fun",
+    "I get bored with repetitive tasks",
+    "I like helping people and volunteering on weekends",
+    "Debugging a hard problem is satisfying",
+    "I am good at adapting to new situations",
+    "Negotiating with clients is not for me",
+    "I prefer working on my own rather than in a team",
+]
+
+
+class Encoder:
+    """
+    A SentenceTransformer behind one of ENCODER_BACKENDS, with the same encode() signature.
+    threads: intra-op threads of PyTorch or ONNX Runtime, 0 keeps the library default.
+    max_seq_length: token limit per sentence, None keeps the model's.
+    `name` identifies model and backend, for the keys of cached embeddings.
+    """
+
+    def __init__(self, backend: str = "fp32", model_name: str = DEFAULT_MODEL, threads: int = 0,
+                 max_seq_length: Optional[int] = None, onnx_file: str = "onnx/model.onnx"):
+        if backend not in ENCODER_BACKENDS:
+            raise ValueError(f"Unknown encoder backend '{backend}', expected one of {ENCODER_BACKENDS}")
+        from sentence_transformers import SentenceTransformer
+
+        self.backend = backend
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+
+        if backend == "onnx":
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            if threads:
+                options.intra_op_num_threads = threads
+            self.model = SentenceTransformer(
+                model_name, device="cpu", backend="onnx", local_files_only=True,
+                model_kwargs={"file_name": onnx_file, "provider": "CPUExecutionProvider", "session_options": options})
+            self.name = f"{model_name}+onnx:{onnx_file}"
+        else:
+            self.model = SentenceTransformer(model_name, device="cpu")
+            self.name = model_name
+            if backend == "int8":
+                import torch
+                # Weights of every Linear layer become int8, activations are quantized on the fly
+                torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8,
+                                                       inplace=True)
+                self.name = f"{model_name}+int8"
+
+        if max_seq_length:
+            self.model.max_seq_length = max_seq_length
+        logger.info("Sentence encoder %s ready (max_seq_length=%s)", self.name, self.model.max_seq_length)
+
+    def encode(self, sentences, batch_size: int = 32, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        start = perf_counter()
+        embeddings = self.model.encode(sentences, batch_size=batch_size, convert_to_numpy=True, **kwargs)
+        elapsed = perf_counter() - start
+        if elapsed > 0:
+            ENCODE_SENTENCES_PER_SECOND.observe(len(embeddings) / elapsed if embeddings.ndim > 1 else 1 / elapsed,
+                                                self.backend)
+        return embeddings
+
+
+def similarities(encoder: Encoder, sentences: List[str], aspects: List[str]) -> np.ndarray:
+    from career_predictor import cos_sim
+    return cos_sim(encoder.encode(sentences), encoder.encode(aspects))
+
+
+def parity(candidate: Encoder, reference: Encoder, aspects: List[str],
+           sentences: List[str] = PARITY_SENTENCES) -> float:
+    """
+    Largest absolute difference between the sentence-aspect cosine similarities of the two encoders
+    """
+    diff = similarities(candidate, sentences, aspects) - similarities(reference, sentences, aspects)
+    return float(np.max(np.abs(diff)))
+
+
+def throughput(encoder: Encoder, sentences: List[str] = PARITY_SENTENCES, repeat: int = 20,
+               batch_size: int = 32) -> float:
+    """
+    Sentences encoded per second, after one warm-up call
+    """
+    batch = sentences * repeat
+    encoder.encode(sentences, batch_size=batch_size)
+    start = perf_counter()
+    encoder.encode(batch, batch_size=batch_size)
+    return len(batch) / (perf_counter() - start)
+
+
+def export_onnx(model_name: str, output_dir: str, quantization: Optional[str] = "avx2"):
+    """
+    Save the model with an ONNX graph (onnx/model.onnx) and, unless `quantization` is None,
+    a dynamically quantized int8 graph (onnx/model_qint8_<quantization>.onnx), for the "onnx" backend.
+    The PyTorch weights are saved too, they are the fp32 reference of the parity check
+    """
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    SentenceTransformer(model_name, device="cpu").save(output_dir)
+    model = SentenceTransformer(model_name, device="cpu", backend="onnx")
+    model.save_pretrained(output_dir)
+    if quantization:
+        export_dynamic_quantized_onnx_model(model, quantization, output_dir)
+    logger.info("ONNX model saved to %s", output_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare a sentence encoder backend against fp32")
+    parser.add_argument("--backend", choices=ENCODER_BACKENDS, default="int8")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="model name or local directory")
+    parser.add_argument("--onnx-file", default="onnx/model.onnx", help="graph inside the model directory")
+    parser.add_argument("--threads", type=int, default=0, help="intra-op threads, 0 is the library default")
+    parser.add_argument("--max-seq-length", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--tolerance", type=float, default=0.02, help="largest allowed cosine similarity difference")
+    parser.add_argument("--export-onnx", default=None, metavar="DIR",
+                        help="export --model to DIR for the onnx backend and exit")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    if args.export_onnx:
+        export_onnx(args.model, args.export_onnx)
+        return
+
+    from career_predictor import ASPECTS
+
+    # export_onnx() saves the PyTorch weights next to the graphs, so an exported directory is its own fp32 reference
+    reference = Encoder("fp32", args.model, args.threads, args.max_seq_length)
+    candidate = Encoder(args.backend, args.model, args.threads, args.max_seq_length, args.onnx_file)
+    diff = parity(candidate, reference, ASPECTS)
+    for encoder in (reference, candidate):
+        print(f"{encoder.name:<50} {throughput(encoder, batch_size=args.batch_size):>10.1f} sentences/s")
+    print(f"max cosine similarity difference: {diff:.4f} (tolerance {args.tolerance})")
+    if diff > args.tolerance:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
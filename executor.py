@@ -0,0 +1,102 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+
+
+class Overloaded(Exception):
+    """
+    Raised instead of queueing when a pool already has its maximum number of pending jobs
+    """
+
+
+class BoundedPool:
+    """
+    An executor with a cap on queued + running jobs and a per-job timeout
+    """
+
+    def __init__(self, name: str, executor, max_pending: int, timeout: float):
+        self.name = name
+        self.executor = executor
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def depth(self) -> int:
+        return self._pending
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise Overloaded(f"{self.name} pool is busy ({self.max_pending} jobs pending)")
+        with self._lock:
+            self._pending += 1
+
+        try:
+            future = self.executor.submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            # A job that already started keeps running, but its slot is only freed when it ends
+            future.cancel()
+            self.timed_out += 1
+            raise
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+
+class WorkerPools:
+    """
+    Keeps CPU-bound work off the asyncio event loop:
+    a thread pool for AIML matching and I/O, and a process pool for embedding, posterior and plotting,
+    whose workers load the models once in `process_initializer`.
+    With `process_workers=0` the heavy jobs run in the thread pool instead.
+    """
+
+    def __init__(self, thread_workers: int = 8, process_workers: int = 2,
+                 max_thread_pending: int = 64, max_process_pending: int = 16,
+                 thread_timeout: float = 10.0, process_timeout: float = 30.0,
+                 process_initializer: Callable = None, process_initargs: tuple = ()):
+        self.threads = BoundedPool("thread", ThreadPoolExecutor(thread_workers, thread_name_prefix="xplore"),
+                                   max_thread_pending, thread_timeout)
+        self.process_workers = process_workers
+        self.processes = None
+        if process_workers > 0:
+            # spawn, because forking a process that already runs server threads is not safe
+            executor = ProcessPoolExecutor(process_workers, mp_context=multiprocessing.get_context("spawn"),
+                                           initializer=process_initializer, initargs=process_initargs)
+            self.processes = BoundedPool("process", executor, max_process_pending, process_timeout)
+
+    async def run_thread(self, fn: Callable, *args, timeout: Optional[float] = None):
+        return await self.threads.run(fn, *args, timeout=timeout)
+
+    async def run_process(self, fn: Callable, *args, timeout: Optional[float] = None):
+        pool = self.processes or self.threads
+        return await pool.run(fn, *args, timeout=timeout)
+
+    def prewarm_processes(self, fn: Callable):
+        """
+        Start the worker processes (and their model loading) ahead of the first job
+        """
+        if self.processes is None:
+            return []
+        return [self.processes.executor.submit(fn) for _ in range(self.process_workers)]
+
+    def shutdown(self):
+        self.threads.executor.shutdown(wait=False, cancel_futures=True)
+        if self.processes is not None:
+            self.processes.executor.shutdown(wait=False, cancel_futures=True)
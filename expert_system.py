@@ -1,6 +1,10 @@
-import pandas as pd
+import ast
+import json
+import math
 import numpy as np
-from typing import List, Dict, Any
+from collections import deque
+from time import perf_counter
+from typing import List, Dict, Any, Optional, Tuple
 
 # --- Step 1: Knowledge Base Ultimate Edition ---
 
@@ -9,6 +13,8 @@ ABILITY_COLUMNS = [
     'Mathematical Skills', 'Programming Ability', 'Creativity', 'Analytical Skills', 'Communication Skills',
     'Leadership Skills', 'Business Acumen', 'Problem-Solving', 'Teamwork', 'Adaptability'
 ]
+ABILITY_INDEX = {ability: i for i, ability in enumerate(ABILITY_COLUMNS)}
+RULE_TYPES = ("Major", "Interest", "MBTI", "Challenge")
 
 # ============== Category A: Professional Rules ==============
 RULE_BASE = [
@@ -195,57 +201,304 @@ class UserProfile:
         self.interests = interests
         self.mbti = mbti.upper().strip() if mbti else ""
         self.challenges = challenges
-        self.abilities = pd.Series(0.0, index=ABILITY_COLUMNS)
+        # Scores in ABILITY_COLUMNS order
+        self.abilities = np.zeros(len(ABILITY_COLUMNS))
 
     def apply_effects(self, effects: Dict[str, float]):
         for ability, effect in effects.items():
-            if ability in self.abilities.index:
-                current_score = self.abilities[ability]
+            if ability in ABILITY_INDEX:
+                i = ABILITY_INDEX[ability]
+                current_score = self.abilities[i]
 
                 remaining_space = 1 - abs(current_score)
 
                 adjusted_effect = effect * remaining_space
 
-                self.abilities[ability] += adjusted_effect
+                self.abilities[i] += adjusted_effect
 
     def apply_suppression(self, factors: Dict[str, float]):
         for ability, factor in factors.items():
-            if ability in self.abilities.index and self.abilities[ability] > 0:
-                self.abilities[ability] *= factor
+            if ability in ABILITY_INDEX and self.abilities[ABILITY_INDEX[ability]] > 0:
+                self.abilities[ABILITY_INDEX[ability]] *= factor
 
     def normalize_scores(self):
         self.abilities = np.clip(self.abilities, -1.0, 1.0)
 
 
-# --- Step 3: Reasoning machine and main function (remains unchanged) ---
-def inference_engine(user_profile: UserProfile, rules: List[Dict[str, Any]]):
-    for rule in rules:
-        if rule['type'] == 'Major' and any(
-                keyword.lower() in user_profile.major.lower() for keyword in rule['conditions']):
-            user_profile.apply_effects(rule['effects'])
-            break
+# --- Step 3: Rule compiler and reasoning machine ---
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over lower-cased keywords: one pass over the text finds every keyword it contains
+    """
 
-    for interest in user_profile.interests:
-        for rule in rules:
-            if rule['type'] == 'Interest' and any(
-                    keyword.lower() in interest.lower() for keyword in rule['conditions']):
-                user_profile.apply_effects(rule['effects'])
+    def __init__(self, keywords: Dict[str, List[int]]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[set] = [set()]
+
+        for keyword, values in keywords.items():
+            state = 0
+            for char in keyword:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(set())
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.out[state].update(values)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.out[child] |= self.out[self.fail[child]]
+
+    def find(self, text: str) -> set:
+        found = set()
+        state = 0
+        for char in text.lower():
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            found |= self.out[state]
+        return found
+
+
+class CompiledRules:
+    """
+    The rule base compiled into NumPy matrices: one effect row and one suppression row per rule,
+    plus keyword indexes to find the rules a profile fires.
+    Applying a rule is then two array operations over all abilities:
+    suppress positive scores, then add the effect with diminishing returns.
+    """
+
+    def __init__(self, rules: List[Dict[str, Any]], columns: List[str] = ABILITY_COLUMNS):
+        self.rules = rules
+        self.columns = columns
+        column_index = {ability: i for i, ability in enumerate(columns)}
+
+        # The extra last row is a no-op rule used to pad batches
+        self.noop = len(rules)
+        self.effects = np.zeros((len(rules) + 1, len(columns)))
+        self.suppression = np.ones((len(rules) + 1, len(columns)))
+
+        major_keywords: Dict[str, List[int]] = {}
+        interest_keywords: Dict[str, List[int]] = {}
+        self.mbti_rules: Dict[str, List[int]] = {}
+        self.challenge_rules: Dict[str, List[int]] = {}
+
+        for i, rule in enumerate(rules):
+            for ability, effect in rule.get('effects', rule.get('direct_effects', {})).items():
+                if ability in column_index:
+                    self.effects[i, column_index[ability]] = effect
+            for ability, factor in rule.get('suppression_factors', {}).items():
+                if ability in column_index:
+                    self.suppression[i, column_index[ability]] = factor
+
+            if rule['type'] == 'Major':
+                for keyword in rule['conditions']:
+                    major_keywords.setdefault(keyword.lower(), []).append(i)
+            elif rule['type'] == 'Interest':
+                for keyword in rule['conditions']:
+                    interest_keywords.setdefault(keyword.lower(), []).append(i)
+            elif rule['type'] == 'MBTI':
+                self.mbti_rules.setdefault(rule['condition'], []).append(i)
+            elif rule['type'] == 'Challenge':
+                self.challenge_rules.setdefault(rule['condition'], []).append(i)
+
+        self.major_matcher = KeywordMatcher(major_keywords)
+        self.interest_matcher = KeywordMatcher(interest_keywords)
+
+    def fired_rules(self, user_profile: UserProfile) -> List[int]:
+        """
+        Indices of the rules the profile fires, in the order they are applied
+        """
+        fired = []
+        majors = self.major_matcher.find(user_profile.major)
+        if majors:
+            fired.append(min(majors))
+
+        for interest in user_profile.interests:
+            fired.extend(sorted(self.interest_matcher.find(interest)))
 
-    if user_profile.mbti:
         for letter in user_profile.mbti:
-            for rule in rules:
-                if rule['type'] == 'MBTI' and letter == rule['condition']:
-                    user_profile.apply_effects(rule['effects'])
+            fired.extend(self.mbti_rules.get(letter, []))
+
+        for challenge in user_profile.challenges:
+            fired.extend(self.challenge_rules.get(challenge, []))
+        return fired
+
+    def _apply(self, scores: np.ndarray, rule_index) -> np.ndarray:
+        scores = np.where(scores > 0, scores * self.suppression[rule_index], scores)
+        return scores + self.effects[rule_index] * (1 - np.abs(scores))
+
+    def apply(self, fired: List[int]) -> np.ndarray:
+        """
+        Final ability scores after applying the fired rules in order
+        """
+        scores = np.zeros(len(self.columns))
+        for rule_index in fired:
+            scores = self._apply(scores, rule_index)
+        return np.clip(scores, -1.0, 1.0)
+
+    def infer(self, user_profile: UserProfile) -> np.ndarray:
+        return self.apply(self.fired_rules(user_profile))
+
+    def infer_batch(self, profiles: List[UserProfile]) -> np.ndarray:
+        """
+        Evaluate many profiles together: step t applies the t-th fired rule of every profile at once
+        """
+        fired = [self.fired_rules(profile) for profile in profiles]
+        steps = max((len(rules) for rules in fired), default=0)
+        schedule = np.full((len(profiles), steps), self.noop)
+        for row, rules in enumerate(fired):
+            schedule[row, :len(rules)] = rules
+
+        scores = np.zeros((len(profiles), len(self.columns)))
+        for step in range(steps):
+            scores = self._apply(scores, schedule[:, step])
+        return np.clip(scores, -1.0, 1.0)
+
+
+COMPILED_RULES = CompiledRules(RULE_BASE)
+# The rules used when no rule list is passed, replaced by publish_rules() on a hot reload
+_published_rules = COMPILED_RULES
+
+
+def publish_rules(compiled: CompiledRules):
+    global _published_rules
+    _published_rules = compiled
+
+
+def compile_rules(rules: Optional[List[Dict[str, Any]]] = None) -> CompiledRules:
+    if rules is None:
+        return _published_rules
+    return COMPILED_RULES if rules is RULE_BASE else CompiledRules(rules)
+
+
+def load_rule_base(path: str = __file__) -> List[Dict[str, Any]]:
+    """
+    The RULE_BASE literal as currently written in `path`, read with ast.literal_eval so the file is not executed
+    """
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(target, "id", None) == "RULE_BASE" for target in node.targets):
+            return ast.literal_eval(node.value)
+    raise ValueError(f"No RULE_BASE literal in {path}")
+
+
+def validate_rules(rules: List[Dict[str, Any]], columns: List[str] = ABILITY_COLUMNS):
+    """
+    Raise ValueError for a rule base the engine cannot apply as intended
+    """
+    if not isinstance(rules, list) or not rules:
+        raise ValueError("RULE_BASE must be a non-empty list")
+    for i, rule in enumerate(rules):
+        kind = rule.get('type') if isinstance(rule, dict) else None
+        if kind not in RULE_TYPES:
+            raise ValueError(f"Rule {i}: unknown type {kind!r}, expected one of {RULE_TYPES}")
+        if kind in ('Major', 'Interest'):
+            conditions = rule.get('conditions')
+            if not isinstance(conditions, list) or not conditions or \
+                    not all(isinstance(c, str) and c for c in conditions):
+                raise ValueError(f"Rule {i}: 'conditions' must be a non-empty list of strings")
+        elif not isinstance(rule.get('condition'), str) or not rule['condition']:
+            raise ValueError(f"Rule {i}: 'condition' must be a non-empty string")
+        for field in ('effects', 'direct_effects', 'suppression_factors'):
+            for ability, value in rule.get(field, {}).items():
+                if ability not in columns:
+                    raise ValueError(f"Rule {i}: unknown ability {ability!r} in '{field}'")
+                if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                    raise ValueError(f"Rule {i}: {field}[{ability!r}] must be a finite number")
+
+
+class InferenceResult:
+    """
+    Outcome of one inference_engine run: ability scores in `columns` order,
+    the indices of the fired rules in application order and the time spent per stage in seconds.
+    It holds no shared state, so results can be produced and rendered on any thread.
+    """
+
+    def __init__(self, abilities: np.ndarray, fired_rules: List[int], timings: Dict[str, float],
+                 rules: List[Dict[str, Any]], columns: List[str] = ABILITY_COLUMNS):
+        self.abilities = abilities
+        self.fired_rules = fired_rules
+        self.timings = timings
+        self.rules = rules
+        self.columns = columns
+
+    def ranked(self) -> List[Tuple[str, float]]:
+        """
+        (ability, score) pairs, highest score first
+        """
+        order = np.argsort(-self.abilities, kind="stable")
+        return [(self.columns[i], float(self.abilities[i])) for i in order]
+
+    def fired_rule_names(self) -> List[str]:
+        return [describe_rule(self.rules[i]) for i in self.fired_rules]
+
+    def to_dict(self) -> dict:
+        return {
+            "abilities": dict(self.ranked()),
+            "fired_rules": self.fired_rule_names(),
+            "timings_ms": {stage: seconds * 1000 for stage, seconds in self.timings.items()},
+        }
+
+
+def describe_rule(rule: Dict[str, Any]) -> str:
+    condition = rule['conditions'][0] if 'conditions' in rule else rule['condition']
+    return f"{rule['type']}: {condition}"
+
+
+def inference_engine(user_profile: UserProfile, rules: Optional[List[Dict[str, Any]]] = None) -> InferenceResult:
+    """
+    Evaluate the rules (the published rule base by default) for a profile.
+    The scores are also stored on user_profile.abilities
+    """
+    compiled = compile_rules(rules)
+    start = perf_counter()
+    fired = compiled.fired_rules(user_profile)
+    matched = perf_counter()
+    scores = compiled.apply(fired)
+    applied = perf_counter()
+
+    user_profile.abilities = scores
+    return InferenceResult(scores, fired, {"match": matched - start, "apply": applied - matched}, compiled.rules,
+                           compiled.columns)
+
+
+REPORT_FORMATS = ("text", "markdown", "json")
+
+
+def render_report(result: InferenceResult, report_format: str = "text") -> str:
+    """
+    The final ability weights as the chat's plain text block, a Markdown table or JSON
+    """
+    if report_format == "text":
+        lines = ["", "--- Final Ability Weights Analysis ---"]
+        lines += [f"{ability:<25} {score:+.2f}" for ability, score in result.ranked()]
+        lines.append("=" * 35)
+        return "\n".join(lines) + "\n"
+    if report_format == "markdown":
+        lines = ["| Ability | Weight |", "| --- | ---: |"]
+        lines += [f"| {ability} | {score:+.2f} |" for ability, score in result.ranked()]
+        return "\n".join(lines) + "\n"
+    if report_format == "json":
+        return json.dumps(result.to_dict())
+    raise ValueError(f"Unknown report format '{report_format}', expected one of {REPORT_FORMATS}")
 
-    for challenge in user_profile.challenges:
-        for rule in rules:
-            if rule['type'] == 'Challenge' and challenge == rule['condition']:
-                if 'suppression_factors' in rule:
-                    user_profile.apply_suppression(rule['suppression_factors'])
-                if 'direct_effects' in rule:
-                    user_profile.apply_effects(rule['direct_effects'])
 
-    user_profile.normalize_scores()
+def infer_batch(profiles: List[UserProfile], rules: Optional[List[Dict[str, Any]]] = None) -> np.ndarray:
+    """
+    Final ability scores of many profiles, shape (len(profiles), len(ABILITY_COLUMNS))
+    """
+    return compile_rules(rules).infer_batch(profiles)
 
 
 def main():
@@ -263,11 +516,10 @@ def main():
         challenges=user_challenges
     )
 
-    inference_engine(user_profile, RULE_BASE)
+    result = inference_engine(user_profile, RULE_BASE)
 
     print("\n--- Final Ability Weights ---")
-    final_abilities = user_profile.abilities.sort_values(ascending=False)
-    for ability, score in final_abilities.items():
+    for ability, score in result.ranked():
         print(f"{ability:<25} {score:+.2f}")
     print("=" * 50)
 
@@ -0,0 +1,233 @@
+"""
+Hot reload of the files the models are built from, without restarting the server or dropping sessions.
+
+    weights.csv                              -> the predictor's ProfessionIndex
+    expert_system.py (RULE_BASE)             -> the compiled rules used by inference_engine
+    career_query.aiml, career_dialogue.aiml  -> the shared AIML Brain
+    career_query.aiml, full_system.aiml      -> the PatternIndex of the semantic fallback
+
+A daemon thread polls the files. Once a file changed and then stayed the same for one more poll,
+the artifacts built from it are rebuilt and validated on that thread and published as a new Snapshot.
+Publishing only swaps references, so a request that already holds an artifact finishes with the old version.
+A failed build or validation keeps the current version; it is logged and counted in xplore_reload_failures_total.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from time import perf_counter
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+from metrics import RELOAD_FAILURES, RELOAD_SECONDS, register_callback
+
+logger = logging.getLogger(__name__)
+
+
+class Artifact:
+    """
+    Something built from source files.
+    build() returns a new value, validate(value) raises when it must not be used, publish(value) swaps it in
+    """
+
+    def __init__(self, name: str, sources: List[str], build: Callable[[], Any], publish: Callable[[Any], None],
+                 validate: Optional[Callable[[Any], None]] = None):
+        self.name = name
+        self.sources = sources
+        self.build = build
+        self.publish = publish
+        self.validate = validate
+
+
+class Snapshot(NamedTuple):
+    """
+    One published version: the content key of every artifact's sources, the snapshot version each artifact
+    was last built in and the built values (None for the ones still as loaded at start-up)
+    """
+    version: int
+    keys: Mapping[str, str]
+    versions: Mapping[str, int]
+    values: Mapping[str, Any]
+    created: float
+
+
+def source_key(sources: List[str]) -> str:
+    digest = hashlib.sha256()
+    for file in sources:
+        digest.update(file.encode("utf-8") + b"\0")
+        if os.path.exists(file):
+            with open(file, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def _signature(sources: List[str]) -> Tuple:
+    # Cheap change detection, the content key decides whether anything really changed
+    signature = []
+    for file in sources:
+        try:
+            stat = os.stat(file)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+class Reloader:
+    """
+    Watches the sources of `artifacts` every `interval` seconds and publishes rebuilt artifacts.
+    The artifacts in use when the Reloader is created are version 1.
+    """
+
+    def __init__(self, artifacts: List[Artifact], interval: float = 2.0):
+        self.artifacts = {artifact.name: artifact for artifact in artifacts}
+        self.interval = interval
+        self.snapshot = Snapshot(
+            version=1,
+            keys=MappingProxyType({name: source_key(a.sources) for name, a in self.artifacts.items()}),
+            versions=MappingProxyType({name: 1 for name in self.artifacts}),
+            values=MappingProxyType({name: None for name in self.artifacts}),
+            created=time.time())
+        self._signatures = {name: _signature(a.sources) for name, a in self.artifacts.items()}
+        self._changed = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        register_callback("xplore_snapshot_version", "Version of the published model snapshot",
+                          lambda: self.snapshot.version)
+        register_callback("xplore_artifact_version", "Snapshot version each artifact was last rebuilt in",
+                          lambda: dict(self.snapshot.versions), labelname="artifact")
+        register_callback("xplore_snapshot_age_seconds", "Seconds since the snapshot was published",
+                          lambda: time.time() - self.snapshot.created)
+
+    def start(self) -> threading.Thread:
+        self._thread = threading.Thread(target=self._run, name="hot-reload", daemon=True)
+        self._thread.start()
+        logger.info("Watching %s for changes every %.1f s",
+                    ", ".join(sorted({file for a in self.artifacts.values() for file in a.sources})), self.interval)
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                ready = self.poll()
+                if ready:
+                    self.reload(ready)
+            except Exception as e:
+                logger.error("Hot reload failed. %s", e)
+
+    def poll(self) -> List[str]:
+        """
+        Names of the artifacts whose sources changed and then stayed unchanged for one poll
+        """
+        ready = []
+        for name, artifact in self.artifacts.items():
+            signature = _signature(artifact.sources)
+            if signature != self._signatures[name]:
+                # Still being written, wait until the file settles
+                self._signatures[name] = signature
+                self._changed.add(name)
+            elif name in self._changed:
+                self._changed.discard(name)
+                ready.append(name)
+        return ready
+
+    def reload(self, names: Optional[List[str]] = None) -> Snapshot:
+        """
+        Rebuild, validate and publish the named artifacts (all by default) whose sources' content changed.
+        Returns the snapshot in use afterwards
+        """
+        with self._lock:
+            current = self.snapshot
+            built: Dict[str, Any] = {}
+            keys: Dict[str, str] = {}
+            for name in names or list(self.artifacts):
+                artifact = self.artifacts[name]
+                key = source_key(artifact.sources)
+                if key == current.keys[name]:
+                    continue
+                start = perf_counter()
+                try:
+                    value = artifact.build()
+                    if artifact.validate is not None:
+                        artifact.validate(value)
+                except Exception as e:
+                    RELOAD_FAILURES.inc(name)
+                    logger.error("Reload of %s rejected, keeping version %d. %s",
+                                 name, current.versions[name], e)
+                    continue
+                RELOAD_SECONDS.observe(perf_counter() - start, name)
+                built[name] = value
+                keys[name] = key
+
+            if not built:
+                return current
+
+            version = current.version + 1
+            snapshot = Snapshot(
+                version=version,
+                keys=MappingProxyType({**current.keys, **keys}),
+                versions=MappingProxyType({**current.versions, **{name: version for name in built}}),
+                values=MappingProxyType({**current.values, **built}),
+                created=time.time())
+            for name, value in built.items():
+                self.artifacts[name].publish(value)
+            self.snapshot = snapshot
+            logger.info("Published snapshot version %d with new %s", version, ", ".join(built))
+            return snapshot
+
+
+def weights_artifact(get_predictor: Callable[[], Any], weights_path: str = "weights.csv") -> Artifact:
+    """
+    weights.csv -> CareerPredictor.index; get_predictor returns the predictor to update
+    """
+    def publish(index):
+        get_predictor().index = index
+
+    return Artifact("weights", [weights_path], lambda: get_predictor().load_index(), publish,
+                    lambda index: get_predictor().check_index(index))
+
+
+def rules_artifact(path: Optional[str] = None) -> Artifact:
+    """
+    RULE_BASE in expert_system.py -> the rules inference_engine uses by default
+    """
+    import expert_system
+
+    path = path or expert_system.__file__
+
+    def build():
+        rules = expert_system.load_rule_base(path)
+        expert_system.validate_rules(rules)
+        return expert_system.CompiledRules(rules)
+
+    return Artifact("rules", [path], build, expert_system.publish_rules)
+
+
+def brain_artifact(aiml_files: Optional[List[str]] = None) -> Artifact:
+    """
+    The AIML files -> the Brain new Bots use and existing Bots switch to before their next message
+    """
+    import chatbot
+
+    aiml_files = aiml_files or chatbot.AIML_FILES
+    return Artifact("aiml", list(aiml_files), lambda: chatbot.load_brain(aiml_files), chatbot.publish_brain,
+                    chatbot.check_brain)
+
+
+def pattern_index_artifact(holder, build: Callable[[], Any], aiml_files: Optional[List[str]] = None) -> Artifact:
+    """
+    The AIML files -> the PatternIndex held by the `holder` LazyObject, rebuilt with `build`
+    """
+    from pattern_index import INDEX_FILES
+
+    def validate(index):
+        if not index.patterns:
+            raise ValueError("The AIML files have no patterns for the semantic fallback")
+
+    return Artifact("patterns", list(aiml_files or INDEX_FILES), build, holder.replace, validate)
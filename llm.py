@@ -1,40 +1,262 @@
 import asyncio
+import json
+import logging
+import time
 import httpx
 
+from metrics import LLM_TOKENS_PER_SECOND, LLM_TTFT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the source in coalesce()
+_END = object()
+
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+SUMMARY_PROMPT = "Summarize the following conversation between a student and a career recommendation bot in at most 5 sentences. Keep the student's major, interests, personality and any careers that were discussed."
+
 
 class LLMClient:
-    def __init__(self, system_prompt: str, base_url: str = "http://127.0.0.1:11434"):
+    def __init__(self, system_prompt: str, base_url: str = "http://127.0.0.1:11434", model: str = "phi4-mini",
+                 timeout: float = 60.0, max_retries: int = 2, backoff: float = 0.5,
+                 max_connections: int = 20, max_keepalive_connections: int = 10, keepalive_expiry: float = 30.0,
+                 max_history_turns: int = 8, max_history_chars: int = 12000, summarize_history: bool = False):
         self.base_url = base_url
-        self.messages = [{"role": "system", "content": system_prompt}]
+        self.system_prompt = system_prompt
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive_connections,
+                                   keepalive_expiry=keepalive_expiry)
+        self.max_history_turns = max_history_turns
+        self.max_history_chars = max_history_chars
+        self.summarize_history = summarize_history
+        self._client = None
+        self.messages = self.new_history()
+
+    def new_history(self) -> list:
+        """
+        Fresh message list holding only the system prompt, one per conversation
+        """
+        return [{"role": "system", "content": self.system_prompt}]
 
-    async def call_stream(self, user_input: str):
-        self.messages.append({"role": "user", "content": user_input})
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        Long-lived pooled client, connections are kept alive between turns
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=self.limits)
+        return self._client
 
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _trim_history(self, messages: list):
+        """
+        Keep the system prompt (plus an optional summary) and the most recent turns that fit in the budget.
+        Older turns are removed from `messages` in place, and folded into the summary if enabled
+        """
+        head = 2 if len(messages) > 1 and messages[1]["role"] == "system" else 1
+        turns = messages[head:]
+
+        keep = 0
+        chars = 0
+        user_turns = 0
+        for message in reversed(turns):
+            chars += len(message["content"])
+            if message["role"] == "user":
+                user_turns += 1
+            if keep > 0 and (chars > self.max_history_chars or user_turns > self.max_history_turns):
+                break
+            keep += 1
+
+        # Never start the window with an assistant reply
+        while keep < len(turns) and turns[len(turns) - keep]["role"] != "user":
+            keep -= 1
+        dropped = turns[:len(turns) - keep]
+        if not dropped:
+            return
+
+        summary = messages[1]["content"][len(SUMMARY_PREFIX):] if head == 2 else ""
+        del messages[head:head + len(dropped)]
+        if self.summarize_history:
+            try:
+                summary = await self._summarize(summary, dropped)
+            except (httpx.HTTPError, KeyError, IndexError, ValueError) as e:
+                logger.error("unable to summarize history. %s", e)
+        if summary:
+            summary_message = {"role": "system", "content": SUMMARY_PREFIX + summary}
+            if head == 2:
+                messages[1] = summary_message
+            else:
+                messages.insert(1, summary_message)
+
+    async def _summarize(self, previous_summary: str, dropped: list) -> str:
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in dropped)
+        if previous_summary:
+            transcript = f"Earlier summary: {previous_summary}\n{transcript}"
         payload = {
-            "model": "phi4-mini",
-            "messages": self.messages,
+            "model": self.model,
+            "messages": [{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": transcript}],
+            "stream": False,
+        }
+        response = await self.client.post("/v1/chat/completions", json=payload)
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"].strip()
+
+    async def record(self, user_input: str, response: str, messages: list = None):
+        """
+        Add a turn that was answered without calling the backend (e.g. from a cache) to the history
+        """
+        if messages is None:
+            messages = self.messages
+        messages.append({"role": "user", "content": user_input})
+        await self._trim_history(messages)
+        messages.append({"role": "assistant", "content": response})
+
+    async def call_stream(self, user_input: str, messages: list = None):
+        """
+        Stream the reply to `user_input`, yielding only the newly generated text of every chunk
+        """
+        if messages is None:
+            messages = self.messages
+        turn = {"role": "user", "content": user_input}
+        messages.append(turn)
+        await self._trim_history(messages)
+
+        payload = {
+            "model": self.model,
+            "messages": messages,
             "stream": True,
         }
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            async with client.stream('POST', f"{self.base_url}/v1/chat/completions", json=payload) as response:
-                response.raise_for_status()
-                full_response = ""
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data_str = line[6:]
-                        if data_str.strip() == "[DONE]":
-                            break
-                        try:
-                            import json
-                            data = json.loads(data_str)
-                            if "choices" in data and len(data["choices"]) > 0:
-                                delta = data["choices"][0].get("delta", {})
-                                if "content" in delta:
-                                    content = delta["content"]
-                                    full_response += content
-                                    yield full_response
-                        except json.JSONDecodeError:
-                            continue
-
-                self.messages.append({"role": "assistant", "content": full_response})
+        full_response = ""
+        start = time.perf_counter()
+        first_token_at = None
+        n_chunks = 0
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    async with self.client.stream('POST', "/v1/chat/completions", json=payload) as response:
+                        response.raise_for_status()
+                        done = False
+                        async for line in response.aiter_lines():
+                            # Keep reading to the end of the body after [DONE], otherwise the connection
+                            # is closed instead of going back to the keep-alive pool
+                            if done:
+                                continue
+                            if line.startswith("data: "):
+                                data_str = line[6:]
+                                if data_str.strip() == "[DONE]":
+                                    done = True
+                                    continue
+                                try:
+                                    data = json.loads(data_str)
+                                    if "choices" in data and len(data["choices"]) > 0:
+                                        delta = data["choices"][0].get("delta", {})
+                                        if "content" in delta:
+                                            content = delta["content"]
+                                            if first_token_at is None:
+                                                first_token_at = time.perf_counter()
+                                                LLM_TTFT_SECONDS.observe(first_token_at - start)
+                                            n_chunks += 1
+                                            full_response += content
+                                            yield content
+                                except json.JSONDecodeError:
+                                    continue
+                    break
+                except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                    # Only retry if nothing was streamed yet, otherwise the user would see the reply twice
+                    retryable = not isinstance(e, httpx.HTTPStatusError) or e.response.status_code in (429, 500, 502, 503, 504)
+                    if full_response or not retryable or attempt == self.max_retries:
+                        raise
+                    logger.warning("LLM request failed, retrying (%d/%d). %s", attempt + 1, self.max_retries, e)
+                    await asyncio.sleep(self.backoff * (2 ** attempt))
+        except BaseException:
+            # No reply to record: drop the turn, so the next request does not send two user messages in a row
+            _discard(messages, turn)
+            raise
+
+        if first_token_at is not None:
+            elapsed = time.perf_counter() - first_token_at
+            if n_chunks > 1 and elapsed > 0:
+                LLM_TOKENS_PER_SECOND.observe((n_chunks - 1) / elapsed)
+        messages.append({"role": "assistant", "content": full_response})
+
+
+def _discard(messages: list, message: dict):
+    # By identity, an earlier turn may have the same content
+    for index in range(len(messages) - 1, -1, -1):
+        if messages[index] is message:
+            del messages[index]
+            return
+
+
+async def coalesce(deltas, interval: float = 0.05, max_chars: int = 200):
+    """
+    Group streamed text deltas into larger flushes:
+    a flush happens every `interval` seconds or once `max_chars` characters are buffered.
+    Buffered text is also flushed when the source pauses, it does not wait for the next delta.
+    Items that are not text (e.g. queue positions) flush the buffer and are passed through as they are
+    """
+    # The source is read on its own task, so waiting for the next delta can time out without cancelling it
+    queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for delta in deltas:
+                queue.put_nowait((delta, None))
+        except Exception as e:
+            queue.put_nowait((None, e))
+        else:
+            queue.put_nowait((_END, None))
+
+    reader = asyncio.ensure_future(pump())
+    buffer = []
+    buffered = 0
+    last_flush = time.monotonic()
+    try:
+        while True:
+            try:
+                if not queue.empty():
+                    delta, error = queue.get_nowait()
+                elif not buffer:
+                    delta, error = await queue.get()
+                else:
+                    timeout = max(0.0, last_flush + interval - time.monotonic())
+                    delta, error = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield "".join(buffer)
+                buffer = []
+                buffered = 0
+                last_flush = time.monotonic()
+                continue
+            if error is not None:
+                raise error
+            if delta is _END:
+                break
+            if not isinstance(delta, str):
+                if buffer:
+                    yield "".join(buffer)
+                    buffer = []
+                    buffered = 0
+                yield delta
+                continue
+            buffer.append(delta)
+            buffered += len(delta)
+            now = time.monotonic()
+            if buffered >= max_chars or now - last_flush >= interval:
+                yield "".join(buffer)
+                buffer = []
+                buffered = 0
+                last_flush = now
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        # The consumer stopped early (e.g. the client disconnected), stop reading the source too
+        reader.cancel()
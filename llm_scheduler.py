@@ -0,0 +1,220 @@
+import asyncio
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Callable, Dict, Optional
+
+
+class Saturated(Exception):
+    """
+    Raised when the LLM queue is full or a request waited longer than allowed
+    """
+
+
+class QueuePosition(int):
+    """
+    Yielded by LLMScheduler.generate while a request is waiting: the number of generations that start before it
+    """
+
+
+class _Ticket:
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.granted = asyncio.get_running_loop().create_future()
+
+
+class _Broadcast:
+    """
+    The items of one upstream generation, replayed to every request that was coalesced into it
+    """
+
+    def __init__(self):
+        self.items = []
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self.followers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def publish(self, item):
+        self.items.append(item)
+        self._changed.set()
+
+    def close(self, error: Optional[BaseException] = None):
+        self.error = error
+        self.done = True
+        self._changed.set()
+
+    async def follow(self) -> AsyncIterator:
+        index = 0
+        while True:
+            while index < len(self.items):
+                yield self.items[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            self._changed.clear()
+            await self._changed.wait()
+
+
+class LLMScheduler:
+    """
+    Admission control in front of the LLM backend.
+    At most `max_in_flight` generations run at once; waiting requests are served round-robin per session,
+    so one busy session cannot starve the others. A request raises Saturated instead of waiting when
+    `max_queue` requests are already queued, or after `max_wait` seconds in the queue.
+    Concurrent requests with the same `key` share one upstream generation.
+    """
+
+    def __init__(self, max_in_flight: int = 2, max_queue: int = 32, max_wait: float = 20.0,
+                 position_interval: float = 0.5):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.position_interval = position_interval
+        self.in_flight = 0
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._shared: Dict[str, _Broadcast] = {}
+        self.coalesced = 0
+        self.rejected = 0
+        self.expired = 0
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def position(self, ticket: _Ticket) -> int:
+        """
+        Generations that will start before `ticket` under round-robin dispatch
+        """
+        own = self._queues[ticket.session_id].index(ticket)
+        ahead = own
+        seen_own = False
+        for session_id, queue in self._queues.items():
+            if session_id == ticket.session_id:
+                seen_own = True
+                continue
+            # Sessions before ours in the rotation get one more turn than those after it
+            ahead += min(len(queue), own if seen_own else own + 1)
+        return ahead
+
+    def _dispatch(self):
+        while self.in_flight < self.max_in_flight and self._queues:
+            session_id, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+            # Rotate: the session goes to the back of the line with its remaining requests
+            del self._queues[session_id]
+            if queue:
+                self._queues[session_id] = queue
+            if not ticket.granted.done():
+                self.in_flight += 1
+                ticket.granted.set_result(None)
+
+    def _remove(self, ticket: _Ticket):
+        queue = self._queues.get(ticket.session_id)
+        if queue is not None and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[ticket.session_id]
+
+    def _release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    async def _admit(self, session_id: str) -> AsyncIterator[QueuePosition]:
+        """
+        Wait for a generation slot, yielding the queue position whenever it changes
+        """
+        if self.in_flight < self.max_in_flight and not self._queues:
+            self.in_flight += 1
+            return
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise Saturated(f"LLM queue is full ({self.max_queue} requests waiting)")
+
+        ticket = _Ticket(session_id)
+        self._queues.setdefault(session_id, deque()).append(ticket)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        last_position = None
+        try:
+            while not ticket.granted.done():
+                position = self.position(ticket)
+                if position != last_position:
+                    last_position = position
+                    yield QueuePosition(position)
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self.expired += 1
+                    raise Saturated(f"LLM request waited longer than {self.max_wait:.0f} s")
+                try:
+                    await asyncio.wait_for(asyncio.shield(ticket.granted), min(self.position_interval, remaining))
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            if ticket.granted.done() and not ticket.granted.cancelled():
+                # Granted in the same instant as the failure, hand the slot on
+                self._release()
+            else:
+                ticket.granted.cancel()
+                self._remove(ticket)
+            raise
+
+    async def generate(self, session_id: str, key: Optional[str],
+                       stream_factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator:
+        """
+        Run `stream_factory()` once a slot is free and yield its text deltas, preceded by QueuePosition items
+        while waiting. If a generation with the same `key` is already queued or running, its output is
+        shared instead and `stream_factory` is never called.
+        The generation runs in its own task, so it outlives the caller that started it as long as
+        another caller still reads it; it is cancelled once every caller went away.
+        """
+        broadcast = self._shared.get(key) if key is not None else None
+        if broadcast is not None:
+            self.coalesced += 1
+        else:
+            broadcast = _Broadcast()
+            if key is not None:
+                self._shared[key] = broadcast
+            broadcast.task = asyncio.get_running_loop().create_task(
+                self._run(broadcast, session_id, key, stream_factory))
+
+        broadcast.followers += 1
+        try:
+            async for item in broadcast.follow():
+                yield item
+        finally:
+            broadcast.followers -= 1
+            if broadcast.followers == 0 and not broadcast.task.done():
+                # Nobody reads the output any more, stop the upstream and let new requests start afresh
+                if key is not None and self._shared.get(key) is broadcast:
+                    del self._shared[key]
+                broadcast.task.cancel()
+
+    async def _run(self, broadcast: _Broadcast, session_id: str, key: Optional[str],
+                   stream_factory: Callable[[], AsyncIterator[str]]):
+        """
+        Wait for a slot and publish the generation to the broadcast; owns the slot until the stream ends
+        """
+        admitted = False
+        admission = self._admit(session_id)
+        try:
+            async for position in admission:
+                broadcast.publish(position)
+            admitted = True
+            async for delta in stream_factory():
+                broadcast.publish(delta)
+            broadcast.close()
+        except asyncio.CancelledError:
+            broadcast.close(Saturated("LLM request was cancelled"))
+            raise
+        except Exception as e:
+            # Reported to the followers, not to the event loop
+            broadcast.close(e)
+        finally:
+            # Closes the admission early if the task was cancelled while queued, which frees the ticket
+            await admission.aclose()
+            if key is not None and self._shared.get(key) is broadcast:
+                del self._shared[key]
+            if admitted:
+                self._release()
@@ -1,15 +1,85 @@
-import gradio as gr
-import io
+import argparse
+import asyncio
+import logging
+import os
 from typing import Iterable
-from chatbot import Bot
-from career_predictor import CareerPredictor
-from gradio.themes.base import Base
-from gradio.themes.utils import colors, fonts, sizes
-from llm import LLMClient
-import matplotlib
-import matplotlib.pyplot as plt
 
-matplotlib.use('Agg')
+# Configured before anything else is imported, so the import stages are logged too
+LOG_FORMAT = "%(levelname)s: %(message)s"
+logging.basicConfig(level=os.environ.get("XPLORE_LOG_LEVEL", "INFO").upper(), format=LOG_FORMAT)
+
+from startup import LazyObject, prewarm, startup_timer
+
+with startup_timer.stage("import gradio"):
+    import gradio as gr
+    from gradio.themes.base import Base
+    from gradio.themes.utils import colors, fonts, sizes
+
+with startup_timer.stage("import chatbot"):
+    import uvicorn
+    import hot_reload
+    import prefork
+    import workers
+    from api import create_api
+    from charts import CHART_BACKENDS, matplotlib_module
+    from encoders import DEFAULT_MODEL, ENCODER_BACKENDS
+    from chatbot import Bot, load_brain
+    from embedding_cache import EmbeddingCache
+    from executor import Overloaded, WorkerPools
+    from llm import LLMClient
+    from llm_scheduler import LLMScheduler, QueuePosition
+    from rewrite_cache import RewriteCache
+    from service import BUSY_MESSAGE, WarmingUp, XploreService
+    from session_manager import SessionManager
+
+
+def predictor_options() -> dict:
+    """
+    CareerPredictor settings from the command line, shared with the prediction worker processes
+    """
+    return {
+        "model_name": args.encoder_model,
+        "encoder_backend": args.encoder,
+        # Pre-forked workers resize the PyTorch pool after the fork, the preloading parent stays single-threaded
+        "encoder_options": {"threads": 1 if args.workers > 1 else args.encoder_threads,
+                            "max_seq_length": args.max_seq_length, "onnx_file": args.onnx_file},
+        "parity_tolerance": args.encoder_tolerance,
+    }
+
+
+def load_predictor():
+    from career_predictor import CareerPredictor
+    return CareerPredictor(**predictor_options())
+
+
+def load_pattern_index():
+    from pattern_index import PatternIndex
+    model = predictor.get()
+    return PatternIndex.load_or_build(lambda texts: model.st_model.encode(texts, convert_to_numpy=True),
+                                      model.st_model.name, mode=args.fallback_mode)
+
+
+def route_aiml_miss(user_input: str):
+    # The index is built in the background with the predictor, misses are not routed until then
+    if not pattern_index.wait(0) or pattern_index.failed:
+        return None
+    return pattern_index.get().route(user_input)
+
+
+class PrewarmingServer(uvicorn.Server):
+    """
+    Starts building `lazy_objects` on the prewarm thread once the server is listening,
+    so importing and loading the models does not compete with binding the port
+    """
+
+    def __init__(self, config: uvicorn.Config, lazy_objects: Iterable[LazyObject] = ()):
+        super().__init__(config)
+        self.lazy_objects = list(lazy_objects)
+
+    async def startup(self, sockets=None):
+        await super().startup(sockets)
+        if self.started and self.lazy_objects:
+            prewarm(self.lazy_objects, startup_timer)
 
 
 class Seafoam(Base):
@@ -64,72 +134,144 @@ class Seafoam(Base):
         )
 
 
-async def respond(message: str, chat_history: list):
+BUSY_HTML = f"<div style='text-align: center; padding: 20px;'>{BUSY_MESSAGE}</div>"
+
+
+def queue_message(position: int) -> str:
+    if position == 0:
+        return "_The model is busy, you are next in line..._"
+    return f"_The model is busy, {position} request{'s' if position > 1 else ''} ahead of you..._"
+
+
+async def respond(message: str, chat_history: list, request: gr.Request):
     """
     Streaming response: 
     Get original Chatbot response 
     Call llm, get improved response
     """
-    global user_response
-    user_response = user_response + ' ' + message
-    bot_response_original = combined_chatbot.get_response(message)
+    session = sessions.get(request.session_hash)
     chat_history.append({"role": "user", "content": message})
-    ollama_input = f"User Input: {message}\nTemplate Response: {bot_response_original}\n"
-    print(f"INFO: Chatbot Input: {bot_response_original}")
 
-    improved_response = ""
-    async for partial_response in llm_client.call_stream(ollama_input):
-        improved_response = partial_response
-        current_history = chat_history.copy()
-        current_history.append({"role": "assistant", "content": improved_response})
-        yield current_history, "", gr.update(visible=False), ""
+    # Only the last assistant message changes while streaming, it is updated in place
+    reply = {"role": "assistant", "content": ""}
+    chat_history.append(reply)
+    waiting = False
+    async for chunk in service.chat(session, message):
+        if isinstance(chunk, QueuePosition):
+            waiting = True
+            reply["content"] = queue_message(chunk)
+        else:
+            if waiting:
+                waiting = False
+                reply["content"] = ""
+            reply["content"] += chunk
+        yield chat_history, "", gr.update(visible=False), ""
 
-    chat_history.append({"role": "assistant", "content": improved_response})
     yield chat_history, "", gr.update(visible=False), ""
 
 
-def plot_svg(probs: dict) -> str:
-    """
-    Plot the prediction results as a bar chart and return a string in SVG format
-    dict: {career : probability}
-    """
-    labels = list(probs.keys())
-    values = list(probs.values())
-
-    fig, ax = plt.subplots(figsize=(10, 6), facecolor='none')
-    ax.set_facecolor('none')
-
-    colors = plt.cm.Set3.colors
-    bar_colors = [colors[i % len(colors)] for i in range(len(values))]
-
-    ax.barh(labels[::-1], values[::-1], color=bar_colors, alpha=0.8)
-
-    max_val = max(values) if values else 1
-    ax.set_xlim(0, max_val + 0.1)
-    ax.set_xlabel("Probability", fontsize=12)
-    ax.set_title("Career Recommendation Probabilities", fontsize=14, fontweight='bold')
-
-    ax.grid(axis='x', linestyle='--', linewidth=0.5, alpha=0.7)
-    ax.spines['top'].set_visible(False)
-    ax.spines['right'].set_visible(False)
-
-    fig.tight_layout()
-
-    buf = io.StringIO()
-    fig.savefig(buf, format='svg', transparent=True, bbox_inches='tight')
-    svg_data = buf.getvalue()
-    buf.close()
-    plt.close(fig)
-    return svg_data
+WARMING_UP_HTML = "<div style='text-align: center; padding: 20px;'>The prediction model is warming up, please try again in a few seconds.</div>"
 
 
 if __name__ == "__main__":
-    user_response = ""
-    predictor = CareerPredictor()
-    combined_chatbot = Bot()
+    parser = argparse.ArgumentParser(description="Xplore Career Chatbot")
+    parser.add_argument("--eager", action="store_true",
+                        help="load every model before the server starts instead of prewarming in the background")
+    parser.add_argument("--llm-url", default="http://127.0.0.1:11434", help="OpenAI-compatible LLM backend")
+    parser.add_argument("--llm-model", default="phi4-mini")
+    parser.add_argument("--llm-timeout", type=float, default=60.0)
+    parser.add_argument("--llm-retries", type=int, default=2)
+    parser.add_argument("--llm-concurrency", type=int, default=2, help="LLM generations running at once")
+    parser.add_argument("--llm-queue", type=int, default=32,
+                        help="LLM requests waiting for a slot before replies fall back to the plain template")
+    parser.add_argument("--llm-queue-timeout", type=float, default=20.0,
+                        help="seconds a request waits for the LLM before the plain template is sent")
+    parser.add_argument("--history-turns", type=int, default=8, help="recent turns sent to the LLM")
+    parser.add_argument("--history-chars", type=int, default=12000, help="character budget of the LLM history")
+    parser.add_argument("--summarize-history", action="store_true",
+                        help="summarize turns that fall out of the history window instead of dropping them")
+    parser.add_argument("--rewrite-cache", default=None, metavar="PATH",
+                        help="SQLite file that persists the LLM rewrite cache across restarts")
+    parser.add_argument("--rewrite-cache-ttl", type=float, default=7 * 24 * 3600, help="seconds")
+    parser.add_argument("--fallback-mode", choices=["exact", "ivf"], default="exact",
+                        help="search mode of the semantic fallback for AIML misses")
+    parser.add_argument("--thread-workers", type=int, default=8, help="threads for AIML matching and I/O")
+    parser.add_argument("--predict-workers", type=int, default=2,
+                        help="processes for prediction and plotting, 0 runs them in the thread pool")
+    parser.add_argument("--max-queue", type=int, default=16, help="pending prediction jobs before rejecting")
+    parser.add_argument("--job-timeout", type=float, default=30.0, help="seconds")
+    parser.add_argument("--chart-backend", choices=CHART_BACKENDS, default="svg",
+                        help="'matplotlib' renders the prediction chart with matplotlib instead of plain SVG")
+    parser.add_argument("--encoder", choices=ENCODER_BACKENDS, default="fp32",
+                        help="sentence encoder backend: fp32 PyTorch, int8 dynamic-quantized PyTorch or ONNX Runtime")
+    parser.add_argument("--encoder-model", default=DEFAULT_MODEL,
+                        help="model name, or the local directory written by 'python encoders.py --export-onnx'")
+    parser.add_argument("--onnx-file", default="onnx/model.onnx", help="ONNX graph inside --encoder-model")
+    parser.add_argument("--encoder-threads", type=int, default=0, help="intra-op threads, 0 is the library default")
+    parser.add_argument("--max-seq-length", type=int, default=None, help="token limit per encoded sentence")
+    parser.add_argument("--encoder-tolerance", type=float, default=0.02,
+                        help="fall back to fp32 when int8/onnx cosine similarities differ more, 0 skips the check")
+    parser.add_argument("--reload-interval", type=float, default=0.0,
+                        help="seconds between checks of weights.csv, the rules and the AIML files for a hot reload, "
+                             "0 disables it")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="pre-forked server processes sharing the loaded models, sessions stick to one worker")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7860)
+    parser.add_argument("--headless", action="store_true",
+                        help="serve only the HTTP/JSON API (/chat, /predict, /predict/batch, /analyze) without the UI")
+    parser.add_argument("--log-level", default=os.environ.get("XPLORE_LOG_LEVEL", "INFO").upper(),
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="DEBUG also logs every message and prediction")
+    parser.add_argument("--keep-alive", type=float, default=30.0, help="seconds an idle HTTP connection is kept open")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(args.log_level)
+
+    predictor = LazyObject(load_predictor, "load CareerPredictor", startup_timer)
+    pattern_index = LazyObject(load_pattern_index, "load pattern index", startup_timer)
+    worker_id, worker_socket = 0, None
+    if args.workers > 1:
+        # Only worker processes return; each one builds its own sessions, pools and server below
+        worker_id, worker_socket = prefork.serve(
+            args.workers, args.host, args.port,
+            preload=[predictor.get, load_brain],
+            threads_per_worker=args.encoder_threads or max(1, (os.cpu_count() or 1) // args.workers),
+            # Without them misses are not routed and charts fail, as in a single process
+            optional_preload=[pattern_index.get]
+                             + ([matplotlib_module.get] if args.chart_backend == "matplotlib" else []))
+    elif args.eager:
+        predictor.get()
+        pattern_index.get()
+        if args.chart_backend == "matplotlib":
+            matplotlib_module.get()
+    reloader = None
+    if args.reload_interval > 0:
+        # Every pre-forked worker watches the files itself
+        reloader = hot_reload.Reloader([
+            hot_reload.weights_artifact(predictor.get),
+            hot_reload.rules_artifact(),
+            hot_reload.brain_artifact(),
+            hot_reload.pattern_index_artifact(pattern_index, load_pattern_index),
+        ], interval=args.reload_interval)
+    embedding_cache = EmbeddingCache()
+    # Pre-forked workers already run in parallel on the shared models, a process pool would load more copies
+    pools = WorkerPools(thread_workers=args.thread_workers,
+                        process_workers=0 if worker_socket else args.predict_workers,
+                        max_process_pending=args.max_queue, process_timeout=args.job_timeout,
+                        process_initializer=workers.init_worker,
+                        process_initargs=(logging.getLevelName(args.log_level), predictor_options(),
+                                          args.reload_interval))
 
     system_prompt = "You are a professional Career Recommendation Bot by the name of Xplore Career Chatbot, dedicated to the career recommendation of Xiamen University Malaysia(XMUM) students. The following inputs are all user inputs with corresponding template responses, you need to give a lively, human-friendly and concise response based on the template responses. Your response better be framed by the template unless the template indicates that it does not know how to answer, then it will be you to answer the user. If a template response present a table or list, you need to present them fully in your response. Do not insert links in your response, try to keep your response clear. ATTENTION YOU ONLY NEED TO REPLY YOUR RESPONSE, DO NOT MENTION THE EXISTANCE OF THE TEMPLATE, YOU ARE DIRECTLY COMMUNICATING WITH THE USER."
-    llm_client = LLMClient(system_prompt)
+    llm_client = LLMClient(system_prompt, base_url=args.llm_url, model=args.llm_model, timeout=args.llm_timeout,
+                           max_retries=args.llm_retries, max_history_turns=args.history_turns,
+                           max_history_chars=args.history_chars, summarize_history=args.summarize_history)
+    rewrite_cache = RewriteCache(ttl=args.rewrite_cache_ttl, db_path=args.rewrite_cache)
+    sessions = SessionManager(llm_client.new_history, lambda: Bot(fallback=route_aiml_miss))
+    scheduler = LLMScheduler(max_in_flight=args.llm_concurrency, max_queue=args.llm_queue,
+                             max_wait=args.llm_queue_timeout)
+    service = XploreService(sessions, pools, llm_client, rewrite_cache, predictor, embedding_cache,
+                            chart_backend=args.chart_backend, scheduler=scheduler, reloader=reloader)
 
     with gr.Blocks(theme=Seafoam()) as app:
         gr.Markdown("## Xplore Career Chatbot")
@@ -173,31 +315,17 @@ if __name__ == "__main__":
                           outputs=[chatbot, user_input, prediction_panel, prediction_chart])
 
 
-        def show_prediction_panel():
-            global user_response
-
-            if not user_response.strip():
-                return gr.update(visible=False), ""
-
+        async def show_prediction_panel(request: gr.Request):
+            session = sessions.get(request.session_hash)
             try:
-                user_response = user_response.strip()
-                print(f"INFO: Predicting user response: {user_response}")
-                probs = predictor.predict(user_response)
-                svg = plot_svg(probs)
-                styled_chart = f"""
-                <div style="
-                    background: linear-gradient(135deg, rgba(255,255,255,0.9), rgba(240,248,255,0.9));
-                    border-radius: 15px;
-                    padding: 25px;
-                    margin: 10px 0;
-                    box-shadow: 0 8px 32px rgba(0,0,0,0.1);
-                    border: 1px solid rgba(255,255,255,0.2);
-                    backdrop-filter: blur(10px);
-                ">
-                    {svg}
-                </div>
-                """
-                return gr.update(visible=True), styled_chart
+                result = await service.predict_session(session)
+                if result is None:
+                    return gr.update(visible=False), ""
+                return gr.update(visible=True), result[1]
+            except WarmingUp:
+                return gr.update(visible=True), WARMING_UP_HTML
+            except (Overloaded, asyncio.TimeoutError):
+                return gr.update(visible=True), BUSY_HTML
             except Exception as e:
                 return gr.update(
                     visible=False), f"<div style='color: red; text-align: center; padding: 20px;'>Error: {str(e)}</div>"
@@ -217,15 +345,42 @@ if __name__ == "__main__":
         clear.click(lambda: [], None, chatbot)
 
 
-        def initial_load():
-            global user_response
-            user_response = ""
-            combined_chatbot.reset()
-            welcome = combined_chatbot.get_response("hello")
+        def initial_load(request: gr.Request):
+            session = sessions.reset(request.session_hash)
+            with session.lock:
+                welcome = session.bot.get_response("hello")
             return [{"role": "assistant", "content": welcome}]
 
 
         app.load(initial_load, None, chatbot)
 
-    app.launch()
-    print("INFO: Xplore Career Chatbot Launched.")
+
+        def close_session(request: gr.Request):
+            sessions.discard(request.session_hash)
+
+
+        app.unload(close_session)
+
+    with startup_timer.stage("build server"):
+        # The JSON API routes are registered first, so they take precedence over the mounted UI
+        session_prefix = prefork.SESSION_PREFIX.format(worker=worker_id) if worker_socket else "api-"
+        server_app = create_api(service, session_prefix)
+        if not args.headless:
+            server_app = gr.mount_gradio_app(server_app, app, path="/")
+        lazy_objects = [predictor, pattern_index] + ([matplotlib_module] if args.chart_backend == "matplotlib" else [])
+        if worker_socket:
+            # Pre-forked workers got the models already loaded by the supervisor
+            lazy_objects = []
+        server = PrewarmingServer(uvicorn.Config(server_app, host=args.host, port=args.port,
+                                                 timeout_keep_alive=args.keep_alive, log_level=args.log_level.lower(),
+                                                 access_log=args.log_level == "DEBUG"), lazy_objects)
+    service.start()
+    if reloader is not None:
+        reloader.start()
+    if worker_socket:
+        logging.info("Worker ready on port %d", worker_socket.getsockname()[1])
+        server.run(sockets=[worker_socket])
+    else:
+        logging.info("Xplore Career Chatbot starting on http://%s:%d\n%s", args.host, args.port,
+                     startup_timer.report())
+        server.run()
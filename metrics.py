@@ -0,0 +1,200 @@
+"""
+In-process metrics with a Prometheus text exposition.
+
+Stage latencies go to one labelled histogram, `timed("encode")` records a block into it.
+Values that already live elsewhere (cache hit counters, session count, queue depths)
+are registered as callbacks and only read when the metrics are scraped.
+Observations made in worker processes are collected with `capture()` and sent back with the job result,
+the parent process adds them with `replay()`.
+"""
+import bisect
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+ENCODE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+RELOAD_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_local = threading.local()
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+        records = getattr(_local, "records", None)
+        if records is not None:
+            records.append((self.name, labels, value))
+
+    @contextmanager
+    def time(self, *labels: str):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, *labels)
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, (list(counts), total, n)) for labels, (counts, total, n) in self._series.items())
+        for labels, (counts, total, n) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                bucket_labels = _format_labels(self.labelnames, labels, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {n}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines += [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                  for labels, value in values]
+        return lines
+
+
+class Callback:
+    """
+    A gauge or counter whose value is computed at scrape time.
+    `fn` returns a number, or a {label value: number} dict for a metric with one label
+    """
+
+    def __init__(self, name: str, help: str, fn: Callable[[], Union[float, Dict[str, float]]],
+                 kind: str = "gauge", labelname: str = ""):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.kind = kind
+        self.labelname = labelname
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            value = self.fn()
+        except Exception:
+            return lines
+        if isinstance(value, dict):
+            lines += [f'{self.name}{{{self.labelname}="{label}"}} {_format_value(v)}' for label, v in value.items()]
+        else:
+            lines.append(f"{self.name} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        # Registering a name again replaces the old metric, e.g. when a service is rebuilt
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "xplore_stage_seconds", "Latency of every processing stage", ("stage",)))
+LLM_TTFT_SECONDS = REGISTRY.register(Histogram(
+    "xplore_llm_time_to_first_token_seconds", "Time from the LLM request to the first streamed token"))
+LLM_TOKENS_PER_SECOND = REGISTRY.register(Histogram(
+    "xplore_llm_tokens_per_second", "Streamed chunks per second after the first token", buckets=RATE_BUCKETS))
+ENCODE_SENTENCES_PER_SECOND = REGISTRY.register(Histogram(
+    "xplore_encode_sentences_per_second", "Sentence encoder throughput per encode call", ("backend",),
+    buckets=ENCODE_BUCKETS))
+ERRORS = REGISTRY.register(Counter("xplore_errors_total", "Failed jobs per stage", ("stage",)))
+RELOAD_SECONDS = REGISTRY.register(Histogram(
+    "xplore_reload_seconds", "Time to rebuild and validate a hot-reloaded artifact", ("artifact",),
+    buckets=RELOAD_BUCKETS))
+RELOAD_FAILURES = REGISTRY.register(Counter(
+    "xplore_reload_failures_total", "Hot reloads rejected because the build or validation failed", ("artifact",)))
+
+
+def timed(stage: str):
+    """
+    with timed("encode"): ...  records the block into xplore_stage_seconds{stage="encode"}
+    """
+    return STAGE_SECONDS.time(stage)
+
+
+def register_callback(name: str, help: str, fn: Callable, kind: str = "gauge", labelname: str = "") -> Callback:
+    return REGISTRY.register(Callback(name, help, fn, kind, labelname))
+
+
+@contextmanager
+def capture():
+    """
+    Collect the histogram observations made by the current thread, as (name, labels, value) records
+    """
+    records = []
+    _local.records = records
+    try:
+        yield records
+    finally:
+        _local.records = None
+
+
+def replay(records: List[Tuple[str, Tuple[str, ...], float]]):
+    for name, labels, value in records:
+        metric = REGISTRY.get(name)
+        if isinstance(metric, Histogram):
+            metric.observe(value, *labels)
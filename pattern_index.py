@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import os
+import re
+import xml.etree.ElementTree as ET
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = os.path.join(".cache", "pattern_index")
+INDEX_FILES = ["career_query.aiml", "full_system.aiml"]
+
+# Internal dialogue-state patterns that must never be reached from free text
+EXCLUDED_PATTERNS = {"GREETING", "STARTPLANNING", "ASKINTERESTS", "ASKMBTI", "ASKCHALLENGES",
+                     "ASKCHALLENGESSKIPMBTI", "CONFIRMINFO", "FINALRESPONSE"}
+
+
+def _template_text(template: ET.Element) -> str:
+    """
+    Plain text of a template, without markup, <think> blocks or formatting codes
+    """
+    for think in template.iter("think"):
+        think.clear()
+    text = " ".join(template.itertext())
+    text = re.sub(r"_br_|_b_|_i_|\*\*", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _read_categories(file: str) -> List[ET.Element]:
+    # full_system.aiml is several <aiml> documents concatenated, so merge them under a single root
+    with open(file, encoding="utf-8") as f:
+        text = f.read()
+    text = re.sub(r"<\?xml[^>]*\?>|<aiml[^>]*>|</aiml>", "", text)
+    return list(ET.fromstring(f"<aiml>{text}</aiml>").iter("category"))
+
+
+def collect_patterns(aiml_files: List[str]) -> List[Tuple[str, List[str]]]:
+    """
+    Every wildcard-free <pattern> of the AIML files with the texts that represent it:
+    the pattern itself as a query and the first sentence of its template
+    """
+    categories = {}
+    for file in aiml_files:
+        if not os.path.exists(file):
+            continue
+        for category in _read_categories(file):
+            pattern = " ".join((category.findtext("pattern") or "").upper().split())
+            if not pattern or "*" in pattern or "_" in pattern or pattern in EXCLUDED_PATTERNS:
+                continue
+            texts = categories.setdefault(pattern, [pattern.lower()])
+            template = category.find("template")
+            if template is not None and template.find("srai") is None:
+                first_sentence = re.split(r"(?<=[.!?:])\s", _template_text(template))[0]
+                if first_sentence and first_sentence not in texts:
+                    texts.append(first_sentence)
+    return list(categories.items())
+
+
+def index_key(aiml_files: List[str], model_name: str) -> str:
+    digest = hashlib.sha256(model_name.encode("utf-8"))
+    for file in aiml_files:
+        if os.path.exists(file):
+            with open(file, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def _kmeans(vectors: np.ndarray, n_lists: int, n_iter: int = 20, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Spherical k-means for the IVF coarse quantizer, returns (centroids, assignment of every vector)
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)]
+    assignment = np.zeros(len(vectors), dtype=np.int64)
+    for _ in range(n_iter):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for i in range(n_lists):
+            members = vectors[assignment == i]
+            if len(members):
+                centroids[i] = members.mean(axis=0)
+        centroids = _normalize(centroids)
+    return centroids, assignment
+
+
+class PatternIndex:
+    """
+    Vector index over the AIML patterns, used to route inputs the AIML matcher could not answer
+    to the semantically closest category.
+    `mode="exact"` scores every row with one matrix-vector product;
+    `mode="ivf"` only scores the rows of the `n_probe` closest k-means lists.
+    """
+
+    def __init__(self, patterns: List[str], vectors: np.ndarray, rows: np.ndarray,
+                 centroids: np.ndarray, assignment: np.ndarray,
+                 encode: Callable[[List[str]], np.ndarray], threshold: float = 0.55,
+                 mode: str = "exact", n_probe: int = 2):
+        self.patterns = patterns
+        self.vectors = vectors
+        self.rows = rows
+        self.centroids = centroids
+        self.assignment = assignment
+        self.encode = encode
+        self.threshold = threshold
+        self.mode = mode
+        self.n_probe = n_probe
+
+    @classmethod
+    def load_or_build(cls, encode: Callable[[List[str]], np.ndarray], model_name: str,
+                      aiml_files: List[str] = INDEX_FILES, index_dir: str = INDEX_DIR, **kwargs) -> "PatternIndex":
+        """
+        Load the persisted index for these AIML files and model, or embed the patterns and persist them
+        """
+        path = os.path.join(index_dir, f"{index_key(aiml_files, model_name)}.npz")
+        if os.path.exists(path):
+            with np.load(path) as data:
+                return cls(data["patterns"].tolist(), data["vectors"], data["rows"],
+                           data["centroids"], data["assignment"], encode, **kwargs)
+
+        categories = collect_patterns(aiml_files)
+        patterns = [pattern for pattern, _ in categories]
+        texts = [text for _, texts in categories for text in texts]
+        rows = np.array([i for i, (_, texts) in enumerate(categories) for _ in texts], dtype=np.int64)
+        vectors = _normalize(encode(texts))
+        centroids, assignment = _kmeans(vectors, max(1, int(np.sqrt(len(vectors)))))
+
+        os.makedirs(index_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, patterns=np.array(patterns), vectors=vectors, rows=rows,
+                 centroids=centroids, assignment=assignment)
+        os.replace(tmp_path, path)
+        logger.info("Built pattern index %s with %d patterns.", path, len(patterns))
+        return cls(patterns, vectors, rows, centroids, assignment, encode, **kwargs)
+
+    def search(self, query: str) -> Tuple[Optional[str], float]:
+        """
+        Closest pattern to the query and its cosine similarity
+        """
+        if not len(self.vectors):
+            return None, 0.0
+        q = _normalize(self.encode([query]))[0]
+
+        candidates = np.arange(len(self.vectors))
+        if self.mode == "ivf":
+            lists = np.argsort(-(self.centroids @ q))[:self.n_probe]
+            probed = np.flatnonzero(np.isin(self.assignment, lists))
+            if len(probed):
+                candidates = probed
+
+        scores = self.vectors[candidates] @ q
+        best = int(np.argmax(scores))
+        return self.patterns[self.rows[candidates[best]]], float(scores[best])
+
+    def route(self, query: str) -> Optional[str]:
+        """
+        Pattern to answer `query` with, or None if nothing is similar enough
+        """
+        pattern, score = self.search(query)
+        return pattern if score >= self.threshold else None
@@ -0,0 +1,102 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+STORE_VERSION = 2
+DEFAULT_STORE_DIR = os.path.join(".cache", "predictor")
+
+logger = logging.getLogger(__name__)
+
+
+def artifact_key(weights_path: str, aspects: List[str], model_name: str) -> str:
+    """
+    Content hash of everything the precomputed artifact depends on
+    """
+    digest = hashlib.sha256()
+    digest.update(f"v{STORE_VERSION}\0{model_name}\0".encode("utf-8"))
+    digest.update(json.dumps(aspects).encode("utf-8"))
+    with open(weights_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+# Optional text columns of weights.csv, every other column after the profession name is an ability
+LABEL_COLUMNS = ("Sector", "Majors")
+
+
+def read_weights(weights_path: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Parse weights.csv into (profession names, float32 feature matrix, sectors, majors) without pandas.
+    Sectors and majors are "" when the file has no such column
+    """
+    professions = []
+    rows = []
+    labels = []
+    with open(weights_path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        label_at = [header.index(column) if column in header else None for column in LABEL_COLUMNS]
+        ability_at = [i for i in range(1, len(header)) if header[i] not in LABEL_COLUMNS]
+        for row in reader:
+            if not row or not row[0].strip():
+                continue
+            professions.append(row[0])
+            rows.append([float(row[i]) for i in ability_at])
+            labels.append([row[i] if i is not None and i < len(row) else "" for i in label_at])
+    sectors, majors = np.array(labels, dtype=str).reshape(-1, len(LABEL_COLUMNS)).T
+    return np.array(professions), np.ascontiguousarray(rows, dtype=np.float32), sectors, majors
+
+
+def load_or_build(weights_path: str, aspects: List[str], model_name: str,
+                  encode_aspects: Callable[[List[str]], np.ndarray],
+                  store_dir: str = DEFAULT_STORE_DIR) -> Tuple[np.ndarray, ...]:
+    """
+    Return (aspect embeddings, feature matrix, professions, sectors, majors),
+    the arrays memory-mapped read-only from the store.
+    The artifact is rebuilt when weights.csv, the aspect list or the model name change;
+    `encode_aspects` is only called in that case.
+    Because the arrays are read-only file mappings, forked workers share the same physical pages.
+    """
+    key = artifact_key(weights_path, aspects, model_name)
+    path = os.path.join(store_dir, key)
+
+    if not os.path.isdir(path):
+        professions, feature_matrix, sectors, majors = read_weights(weights_path)
+        aspect_embs = np.asarray(encode_aspects(aspects), dtype=np.float32)
+        _write_artifact(path, aspect_embs, feature_matrix, professions, sectors, majors)
+        logger.info("Built predictor store %s", path)
+
+    return (
+        np.load(os.path.join(path, "aspect_embs.npy"), mmap_mode="r"),
+        np.load(os.path.join(path, "feature_matrix.npy"), mmap_mode="r"),
+        np.load(os.path.join(path, "professions.npy")).astype(object),
+        np.load(os.path.join(path, "sectors.npy")),
+        np.load(os.path.join(path, "majors.npy")),
+    )
+
+
+def _write_artifact(path: str, aspect_embs: np.ndarray, feature_matrix: np.ndarray, professions: np.ndarray,
+                    sectors: np.ndarray, majors: np.ndarray):
+    # Write into a temporary sibling directory and rename it, so readers never see a partial artifact
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+    try:
+        np.save(os.path.join(tmp, "aspect_embs.npy"), aspect_embs)
+        np.save(os.path.join(tmp, "feature_matrix.npy"), feature_matrix)
+        np.save(os.path.join(tmp, "professions.npy"), professions)
+        np.save(os.path.join(tmp, "sectors.npy"), sectors)
+        np.save(os.path.join(tmp, "majors.npy"), majors)
+        os.rename(tmp, path)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.isdir(path):
+            raise
@@ -0,0 +1,471 @@
+"""
+Pre-fork serving: the models and read-only data are loaded once in a supervisor process, which then forks
+the HTTP workers, so every worker shares those pages copy-on-write instead of loading its own copy.
+
+    supervisor   preloads, gc.freeze(), forks the router and the workers, restarts any that exit
+    router       listens on the public port and forwards every request to a worker, sticky per session
+    worker i     a complete app (sessions, thread pool, LLM client, uvicorn) on a private loopback socket
+
+GET /workers on the router returns the pid, port, routed requests and memory (RSS, PSS, shared, private)
+of every worker; GET /metrics returns the metrics of all workers with a `worker` label plus those figures.
+"""
+import asyncio
+import gc
+import json
+import logging
+import os
+import re
+import signal
+import socket
+import sys
+import time
+import zlib
+from multiprocessing.sharedctypes import RawArray
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+WORKER_COOKIE = "xplore_worker"
+# Session ids minted by worker i start with this prefix, so the router can send them back to it
+SESSION_PREFIX = "api-w{worker}-"
+SESSION_WORKER = re.compile(r"^api-w(\d+)-")
+MEMORY_FIELDS = ("rss", "pss", "shared", "private")
+
+
+def memory_usage(pid: int) -> Dict[str, int]:
+    """
+    Resident, proportional, shared and private memory of a process in bytes, from /proc/<pid>/smaps_rollup.
+    Empty where that file is not available (not Linux, or the process is gone)
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                parts = rest.split()
+                if len(parts) == 2 and parts[1] == "kB":
+                    fields[name] = int(parts[0]) * 1024
+    except OSError:
+        return {}
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def _with_label(line: str, name: str, value: str) -> str:
+    """
+    Add a label to a sample line of the Prometheus text format
+    """
+    metric, brace, rest = line.partition("{")
+    if brace and " " not in metric:
+        separator = "" if rest.startswith("}") else ","
+        return f'{metric}{{{name}="{value}"{separator}{rest}'
+    metric, _, sample = line.partition(" ")
+    return f'{metric}{{{name}="{value}"}} {sample}'
+
+
+def merge_metrics(texts: Dict[int, str]) -> List[str]:
+    """
+    The expositions of all workers as one, every sample labelled with its worker and every family kept together
+    """
+    families: Dict[str, List[str]] = {}
+    for worker, text in texts.items():
+        family = None
+        for line in text.splitlines():
+            if line.startswith(("# HELP ", "# TYPE ")):
+                family = line.split()[2]
+                lines = families.setdefault(family, [])
+                if line not in lines:
+                    lines.append(line)
+            elif line and not line.startswith("#"):
+                families.setdefault(family or line.split("{")[0].split()[0], []).append(
+                    _with_label(line, "worker", str(worker)))
+    return [line for lines in families.values() for line in lines]
+
+
+class _Buffer(bytearray):
+    """
+    In-memory sink with the write/drain interface of a StreamWriter
+    """
+
+    def write(self, data: bytes):
+        self.extend(data)
+
+    async def drain(self):
+        pass
+
+
+async def _read_head(reader: asyncio.StreamReader) -> Optional[Tuple[bytes, str, Dict[str, str]]]:
+    """
+    (raw head, first line, lower-cased headers) of the next HTTP message, None at the end of the connection
+    """
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    lines = head.decode("latin-1").split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        name, colon, value = line.partition(":")
+        if colon:
+            headers[name.strip().lower()] = value.strip()
+    return head, lines[0], headers
+
+
+async def _copy_body(reader: asyncio.StreamReader, out, headers: Dict[str, str]):
+    """
+    Copy a message body as it arrives, chunked or with a Content-Length
+    """
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        while True:
+            size_line = await reader.readuntil(b"\r\n")
+            out.write(size_line)
+            size = int(size_line.split(b";")[0], 16)
+            if size == 0:
+                while True:
+                    trailer = await reader.readuntil(b"\r\n")
+                    out.write(trailer)
+                    if trailer == b"\r\n":
+                        return
+            out.write(await reader.readexactly(size + 2))
+            # Streamed responses (server-sent events) are passed on chunk by chunk
+            await out.drain()
+    else:
+        remaining = int(headers.get("content-length", 0))
+        while remaining > 0:
+            data = await reader.read(min(remaining, 1 << 16))
+            if not data:
+                raise asyncio.IncompleteReadError(b"", remaining)
+            out.write(data)
+            remaining -= len(data)
+            await out.drain()
+
+
+def _without_header(head: bytes, name: str) -> bytes:
+    lines = head.split(b"\r\n")
+    prefix = name.lower().encode("latin-1") + b":"
+    return b"\r\n".join(line for line in lines if not line.lower().startswith(prefix))
+
+
+async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while data := await reader.read(1 << 16):
+            writer.write(data)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+class StickyRouter:
+    """
+    HTTP/1.1 reverse proxy that keeps every session on one worker. The worker is taken from the session id
+    (X-Session-Id header, /sessions/{id}, session_id in the query string or JSON body), else from the
+    xplore_worker cookie, else chosen round-robin and remembered in that cookie, so the browser running
+    the Gradio UI stays on the worker holding its session state.
+    """
+
+    def __init__(self, ports: List[int], pids):
+        self.ports = ports
+        self.pids = pids
+        self.requests = [0] * len(ports)
+        self._next = 0
+
+    @staticmethod
+    def session_key(target: str, headers: Dict[str, str], body: bytes) -> Optional[str]:
+        if headers.get("x-session-id"):
+            return headers["x-session-id"]
+        url = urlsplit(target)
+        if url.path.startswith("/sessions/"):
+            return url.path[len("/sessions/"):]
+        query = parse_qs(url.query).get("session_id")
+        if query:
+            return query[0]
+        if body and b'"session_id"' in body:
+            try:
+                value = json.loads(body).get("session_id")
+            except (ValueError, AttributeError):
+                value = None
+            if isinstance(value, str) and value:
+                return value
+        return None
+
+    def pick(self, target: str, headers: Dict[str, str], body: bytes) -> Tuple[int, bool]:
+        """
+        (worker index, whether the affinity cookie has to be set)
+        """
+        key = self.session_key(target, headers, body)
+        if key is not None:
+            match = SESSION_WORKER.match(key)
+            if match and int(match.group(1)) < len(self.ports):
+                return int(match.group(1)), False
+            return zlib.crc32(key.encode("utf-8")) % len(self.ports), False
+
+        for cookie in headers.get("cookie", "").split(";"):
+            name, _, value = cookie.strip().partition("=")
+            if name == WORKER_COOKIE and value.isdigit() and int(value) < len(self.ports):
+                return int(value), False
+
+        worker = self._next % len(self.ports)
+        self._next += 1
+        return worker, True
+
+    async def serve(self, sock: socket.socket):
+        server = await asyncio.start_server(self._handle_client, sock=sock, limit=1 << 16)
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        upstreams: Dict[int, Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = {}
+        try:
+            while True:
+                request = await _read_head(reader)
+                if request is None:
+                    break
+                head, request_line, headers = request
+                method, target, _ = request_line.split(" ", 2)
+                if headers.get("expect", "").lower() == "100-continue":
+                    # Answered here, the body is read before the request is forwarded
+                    writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                    head = _without_header(head, "expect")
+                body = _Buffer()
+                await _copy_body(reader, body, headers)
+
+                if method == "GET" and target in ("/workers", "/metrics"):
+                    await self._respond_local(writer, target)
+                    continue
+
+                worker, set_cookie = self.pick(target, headers, bytes(body))
+                self.requests[worker] += 1
+                if "upgrade" in headers.get("connection", "").lower():
+                    await self._tunnel(worker, head + body, reader, writer)
+                    break
+                keep_alive = await self._forward(worker, upstreams, method, head + body, writer, set_cookie)
+                if not keep_alive or headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as e:
+            logger.debug("Proxied connection closed. %s", e)
+        finally:
+            for _, upstream_writer in upstreams.values():
+                upstream_writer.close()
+            writer.close()
+
+    async def _forward(self, worker: int, upstreams: dict, method: str, request: bytes,
+                       writer: asyncio.StreamWriter, set_cookie: bool) -> bool:
+        response = None
+        for _ in range(2):
+            reused = worker in upstreams
+            try:
+                if not reused:
+                    upstreams[worker] = await asyncio.open_connection("127.0.0.1", self.ports[worker])
+                upstream_reader, upstream_writer = upstreams[worker]
+                upstream_writer.write(request)
+                await upstream_writer.drain()
+                response = await _read_head(upstream_reader)
+                # Skip interim responses
+                while response is not None and response[1].split(" ", 2)[1].startswith("1"):
+                    response = await _read_head(upstream_reader)
+            except OSError as e:
+                # Refused while the worker restarts
+                logger.warning("Worker %d unreachable. %s", worker, e)
+            if response is not None:
+                break
+            if worker in upstreams:
+                upstreams.pop(worker)[1].close()
+            # Only a kept-alive connection that the worker closed while idle is retried, on a fresh one
+            if not reused:
+                break
+        if response is None:
+            writer.write(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            return False
+
+        head, status_line, headers = response
+        if set_cookie:
+            head = head[:-2] + f"Set-Cookie: {WORKER_COOKIE}={worker}; Path=/; HttpOnly; SameSite=Lax\r\n\r\n".encode()
+        writer.write(head)
+        status = int(status_line.split(" ", 2)[1])
+        if method == "HEAD" or status in (204, 304):
+            pass
+        elif "chunked" in headers.get("transfer-encoding", "").lower() or "content-length" in headers:
+            await _copy_body(upstream_reader, writer, headers)
+        else:
+            # Delimited by the end of the connection
+            await _pipe(upstream_reader, writer)
+            return False
+        await writer.drain()
+        if headers.get("connection", "").lower() == "close":
+            upstream_writer.close()
+            del upstreams[worker]
+        return True
+
+    async def _tunnel(self, worker: int, request: bytes, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", self.ports[worker])
+        upstream_writer.write(request)
+        await asyncio.gather(_pipe(upstream_reader, writer), _pipe(reader, upstream_writer))
+
+    def workers(self) -> dict:
+        report = []
+        for worker, port in enumerate(self.ports):
+            entry = {"worker": worker, "pid": self.pids[worker], "port": port, "requests": self.requests[worker]}
+            entry.update({f"{field}_mb": value / 2 ** 20 for field, value in memory_usage(self.pids[worker]).items()})
+            report.append(entry)
+        supervisor = {f"{field}_mb": value / 2 ** 20 for field, value in memory_usage(os.getppid()).items()}
+        return {"supervisor": dict(pid=os.getppid(), **supervisor), "workers": report}
+
+    async def _fetch(self, port: int, path: str) -> str:
+        # HTTP/1.0: the response is never chunked and ends with the connection
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            writer.write(f"GET {path} HTTP/1.0\r\nHost: 127.0.0.1\r\n\r\n".encode("latin-1"))
+            _, _, body = (await reader.read()).partition(b"\r\n\r\n")
+            return body.decode("utf-8")
+        finally:
+            writer.close()
+
+    async def _respond_local(self, writer: asyncio.StreamWriter, path: str):
+        if path == "/workers":
+            content, media_type = json.dumps(self.workers()).encode("utf-8"), "application/json"
+        else:
+            texts = await asyncio.gather(*[self._fetch(port, "/metrics") for port in self.ports],
+                                         return_exceptions=True)
+            lines = merge_metrics({i: text for i, text in enumerate(texts) if isinstance(text, str)})
+            lines += self._memory_metrics()
+            content, media_type = ("\n".join(lines) + "\n").encode("utf-8"), "text/plain; version=0.0.4"
+        writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: {media_type}\r\n"
+                     f"Content-Length: {len(content)}\r\n\r\n".encode("latin-1") + content)
+        await writer.drain()
+
+    def _memory_metrics(self) -> List[str]:
+        usage = [memory_usage(self.pids[worker]) for worker in range(len(self.ports))]
+        lines = []
+        for field in MEMORY_FIELDS:
+            name = f"xplore_worker_{field}_bytes"
+            lines += [f"# HELP {name} {field.upper()} memory of the worker process from smaps_rollup",
+                      f"# TYPE {name} gauge"]
+            lines += [f'{name}{{worker="{worker}"}} {values[field]}' for worker, values in enumerate(usage) if values]
+        lines += ["# HELP xplore_worker_requests_total Requests routed to the worker",
+                  "# TYPE xplore_worker_requests_total counter"]
+        lines += [f'xplore_worker_requests_total{{worker="{worker}"}} {count}'
+                  for worker, count in enumerate(self.requests)]
+        return lines
+
+
+def _set_threads(threads: int):
+    # Only PyTorch's pool is resized here, it is already imported by the preloaded encoder
+    torch = sys.modules.get("torch")
+    if torch is not None and threads > 0:
+        torch.set_num_threads(threads)
+
+
+def serve(workers: int, host: str, port: int, preload: Iterable[Callable[[], object]],
+          threads_per_worker: int = 1, backlog: int = 2048,
+          optional_preload: Iterable[Callable[[], object]] = ()) -> Tuple[int, socket.socket]:
+    """
+    Run `preload` and `optional_preload`, then fork the router and `workers` worker processes.
+    Returns (worker index, listening socket) in every worker process, which then serves the app on that socket;
+    the supervisor itself never returns. Workers and the router are restarted when they exit.
+    Exits with status 1, before listening on any port, when a `preload` fails. A failed `optional_preload`
+    is only logged, the workers run without it
+    """
+    for load in preload:
+        try:
+            load()
+        except Exception as e:
+            # A LazyObject that failed keeps raising its error, every forked worker would inherit a broken app
+            logger.error("Preloading failed, not starting the workers. %s", e)
+            sys.exit(1)
+    for load in optional_preload:
+        try:
+            load()
+        except Exception as e:
+            logger.error("Optional preloading failed, the workers start without it. %s", e)
+    # Objects created so far are moved out of the collector's reach, so collections in the workers
+    # do not write to (and un-share) the pages holding them
+    gc.collect()
+    gc.freeze()
+
+    public = socket.create_server((host, port), backlog=backlog)
+    sockets = [socket.create_server(("127.0.0.1", 0), backlog=backlog) for _ in range(workers)]
+    ports = [sock.getsockname()[1] for sock in sockets]
+    # Shared with the router, which reports memory per pid
+    pids = RawArray("i", workers)
+    started = [0.0] * workers
+    stopping = False
+
+    def fork_worker(worker: int) -> bool:
+        pid = os.fork()
+        if pid == 0:
+            return True
+        pids[worker] = pid
+        started[worker] = time.monotonic()
+        logger.info("Worker %d started (pid %d, port %d)", worker, pid, ports[worker])
+        return False
+
+    def worker_process(worker: int) -> Tuple[int, socket.socket]:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        public.close()
+        for other, sock in enumerate(sockets):
+            if other != worker:
+                sock.close()
+        for handler in logging.getLogger().handlers:
+            handler.setFormatter(logging.Formatter(f"%(levelname)s: [worker {worker}] %(message)s"))
+        _set_threads(threads_per_worker)
+        return worker, sockets[worker]
+
+    def fork_router() -> int:
+        pid = os.fork()
+        if pid == 0:
+            for sock in sockets:
+                sock.close()
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            try:
+                asyncio.run(StickyRouter(ports, pids).serve(public))
+            except KeyboardInterrupt:
+                pass
+            os._exit(0)
+        logger.info("Router listening on http://%s:%d (pid %d)", host, port, pid)
+        return pid
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(pids) + [router]:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for worker in range(workers):
+        if fork_worker(worker):
+            return worker_process(worker)
+    router = fork_router()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while True:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        if stopping:
+            continue
+        if pid == router:
+            logger.error("Router exited (status %d), restarting", status)
+            router = fork_router()
+        elif pid in pids:
+            worker = list(pids).index(pid)
+            logger.error("Worker %d (pid %d) exited (status %d), restarting", worker, pid, status)
+            # Do not spin when a worker dies right after starting
+            if time.monotonic() - started[worker] < 5:
+                time.sleep(1)
+            if fork_worker(worker):
+                return worker_process(worker)
+    logger.info("All workers stopped")
+    sys.exit(0)
@@ -0,0 +1,156 @@
+"""
+Profession ability matrix with top-k ranking, sector/major filters and a similar-careers query,
+sized for occupation catalogs of tens of thousands of rows.
+
+    index = ProfessionIndex(professions, feature_matrix, sectors, majors)
+    rows, scores, low, high = index.search(posteriors, k=10, mask=index.mask(sector="Technology"))
+    rows, similarities = index.similar("Data Scientist", k=5)
+"""
+import logging
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Separator of several majors in the "Majors" column of weights.csv
+MAJOR_SEPARATOR = ";"
+
+
+def _label(value) -> str:
+    return " ".join(str(value).lower().split())
+
+
+def _top_k(rows: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The k highest scores of every row of `scores` and their `rows` entries, unordered.
+    Of the scores tied with the k-th highest, the ones with the lowest rows are kept
+    """
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    kth = np.take_along_axis(scores, top, axis=1).min(axis=1, keepdims=True)
+    # argpartition keeps an arbitrary subset of the ties at the boundary, pick them again by row
+    for query in np.flatnonzero(np.count_nonzero(scores >= kth, axis=1) > k):
+        above = np.flatnonzero(scores[query] > kth[query])
+        tied = np.flatnonzero(scores[query] == kth[query])
+        tied = tied[np.argsort(rows[query, tied], kind="stable")]
+        top[query] = np.concatenate([above, tied[:k - len(above)]])
+    return np.take_along_axis(rows, top, axis=1), np.take_along_axis(scores, top, axis=1)
+
+
+class ProfessionIndex:
+    """
+    The feature matrix as one contiguous float32 array plus row-normalized copies for cosine similarity.
+    Queries score the rows in blocks of `chunk_size` (0 scores every row at once) and keep only the k best rows
+    of every block with argpartition, so nothing is sorted beyond the k results.
+    sectors: one label per profession, majors: MAJOR_SEPARATOR-separated labels per profession ("" for none).
+    """
+
+    def __init__(self, professions: Sequence[str], feature_matrix: np.ndarray,
+                 sectors: Optional[Sequence[str]] = None, majors: Optional[Sequence[str]] = None,
+                 chunk_size: int = 0):
+        self.professions = np.asarray(professions, dtype=object)
+        # No copy when the matrix already is float32, e.g. the read-only mapping of the predictor store
+        self.matrix = np.ascontiguousarray(feature_matrix, dtype=np.float32)
+        norms = np.linalg.norm(self.matrix, axis=1, keepdims=True)
+        self.unit = self.matrix / np.maximum(norms, 1e-12)
+        self.chunk_size = chunk_size
+
+        self.positions = {}
+        for row, name in enumerate(self.professions):
+            self.positions.setdefault(_label(name), row)
+
+        self.sectors = {}
+        self.majors = {}
+        if sectors is not None:
+            labels, codes = np.unique([_label(sector) for sector in sectors], return_inverse=True)
+            self.sectors = {label: codes == code for code, label in enumerate(labels) if label}
+        if majors is not None:
+            rows = {}
+            for row, value in enumerate(majors):
+                for major in str(value).split(MAJOR_SEPARATOR):
+                    if _label(major):
+                        rows.setdefault(_label(major), []).append(row)
+            self.majors = {label: self._rows_mask(rows) for label, rows in rows.items()}
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def _rows_mask(self, rows) -> np.ndarray:
+        mask = np.zeros(len(self.matrix), dtype=bool)
+        mask[rows] = True
+        return mask
+
+    def mask(self, sector: Optional[str] = None, major: Optional[str] = None) -> Optional[np.ndarray]:
+        """
+        Boolean row mask of the professions in `sector` that accept `major`, None when there is no filter.
+        Labels are matched case-insensitively; an unknown label selects no rows
+        """
+        empty = np.zeros(len(self.matrix), dtype=bool)
+        mask = None
+        if sector:
+            mask = self.sectors.get(_label(sector), empty)
+        if major:
+            major_mask = self.majors.get(_label(major), empty)
+            mask = major_mask if mask is None else mask & major_mask
+        return mask
+
+    def row(self, profession: str) -> int:
+        position = self.positions.get(_label(profession))
+        if position is None:
+            raise ValueError(f"Unknown profession '{profession}'")
+        return position
+
+    def search(self, queries: np.ndarray, k: int = 10, mask: Optional[np.ndarray] = None,
+               matrix: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Rows with the k highest dot products for every query (n_queries, n_dim), best first,
+        ties broken by row order. Returns (rows, scores) of shape (n_queries, k) and the lowest and highest score
+        of every query over all candidate rows, shape (n_queries,), for normalizing the scores.
+        matrix: the rows to score, the feature matrix by default
+        """
+        matrix = self.matrix if matrix is None else matrix
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        n_queries = len(queries)
+        candidates = np.flatnonzero(mask) if mask is not None else None
+        n_rows = len(matrix) if candidates is None else len(candidates)
+        k = min(k, n_rows)
+        low = np.full(n_queries, np.inf, dtype=np.float32)
+        high = np.full(n_queries, -np.inf, dtype=np.float32)
+        if k <= 0:
+            return np.empty((n_queries, 0), dtype=int), np.empty((n_queries, 0), dtype=np.float32), low, high
+
+        chunk_size = max(self.chunk_size, k) if self.chunk_size > 0 else n_rows
+        best_rows = []
+        best_scores = []
+        for start in range(0, n_rows, chunk_size):
+            if candidates is None:
+                rows = np.arange(start, min(start + chunk_size, n_rows))
+                scores = queries @ matrix[start:start + chunk_size].T
+            else:
+                rows = candidates[start:start + chunk_size]
+                scores = queries @ matrix[rows].T
+            np.minimum(low, scores.min(axis=1), out=low)
+            np.maximum(high, scores.max(axis=1), out=high)
+            rows = np.broadcast_to(rows, scores.shape)
+            if scores.shape[1] > k:
+                rows, scores = _top_k(rows, scores, k)
+            best_rows.append(rows)
+            best_scores.append(scores)
+
+        rows = np.concatenate(best_rows, axis=1)
+        scores = np.concatenate(best_scores, axis=1)
+        if rows.shape[1] > k:
+            rows, scores = _top_k(rows, scores, k)
+        order = np.lexsort((rows, -scores), axis=1)
+        return np.take_along_axis(rows, order, axis=1), np.take_along_axis(scores, order, axis=1), low, high
+
+    def similar(self, profession: str, k: int = 10,
+                mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The k professions whose ability rows have the highest cosine similarity to `profession`'s,
+        excluding itself. Returns (rows, similarities)
+        """
+        position = self.row(profession)
+        rows, scores, _, _ = self.search(self.unit[position], k + 1, mask, matrix=self.unit)
+        keep = rows[0] != position
+        return rows[0][keep][:k], scores[0][keep][:k]
@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Optional
+
+
+def normalize_input(text: str) -> str:
+    """
+    Lower-case, collapse whitespace and drop surrounding punctuation, so 'Hello!' and 'hello' share an entry
+    """
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    return text.strip(" .!?,;:")
+
+
+def rewrite_key(template: str, user_input: str) -> str:
+    return hashlib.sha256(f"{template}\0{normalize_input(user_input)}".encode("utf-8")).hexdigest()
+
+
+class RewriteCache:
+    """
+    Cache of LLM rewrites keyed on (Bot template response, normalized user input).
+    Entries are evicted least-recently-used beyond `max_entries` and expire after `ttl` seconds.
+    With `db_path` the entries are also persisted to a local SQLite file and survive restarts.
+    """
+
+    def __init__(self, max_entries: int = 2000, ttl: float = 7 * 24 * 3600, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS rewrites (key TEXT PRIMARY KEY, response TEXT, created REAL)")
+            self._db.execute("DELETE FROM rewrites WHERE created < ?", (time.time() - ttl,))
+            self._db.commit()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, template: str, user_input: str) -> Optional[str]:
+        key = rewrite_key(template, user_input)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._db is not None:
+                row = self._db.execute("SELECT response, created FROM rewrites WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    entry = row
+                    self._store(key, entry)
+
+            if entry is not None and now - entry[1] > self.ttl:
+                self._entries.pop(key, None)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, template: str, user_input: str, response: str):
+        if not response.strip():
+            return
+        key = rewrite_key(template, user_input)
+        entry = (response, time.time())
+        with self._lock:
+            self._store(key, entry)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO rewrites VALUES (?, ?, ?)", (key, *entry))
+                self._db.commit()
+
+    def _store(self, key: str, entry: tuple):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def recording(self, template: str, user_input: str, deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+        """
+        Pass a live LLM stream through and cache the full reply once it completed
+        """
+        parts = []
+        async for delta in deltas:
+            parts.append(delta)
+            yield delta
+        self.put(template, user_input, "".join(parts))
+
+    @staticmethod
+    async def replay(response: str, chunk_words: int = 4, delay: float = 0.01) -> AsyncIterator[str]:
+        """
+        Replay a cached reply as a simulated stream, so the UI behaves the same as for a live generation
+        """
+        words = re.split(r"(?<=\s)", response)
+        for i in range(0, len(words), chunk_words):
+            yield "".join(words[i:i + chunk_words])
+            await asyncio.sleep(delay)
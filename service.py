@@ -0,0 +1,269 @@
+"""
+Chat, prediction and analysis logic shared by the Gradio UI and the HTTP API.
+Both front-ends drive the same in-process models, sessions, worker pools and caches through `XploreService`.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+from typing import AsyncIterator, List, Optional, Tuple
+
+import workers
+from charts import chart_html, matplotlib_module, plot_svg, render_svg
+from embedding_cache import EmbeddingCache, IncrementalPredictor, sentence_key
+from executor import Overloaded, WorkerPools
+from expert_system import UserProfile, inference_engine
+from llm import LLMClient, coalesce
+from llm_scheduler import LLMScheduler, QueuePosition, Saturated
+from metrics import ERRORS, register_callback, replay, timed
+from rewrite_cache import RewriteCache
+from session_manager import SessionManager, SessionState
+from startup import LazyObject
+
+logger = logging.getLogger(__name__)
+
+STREAM_FLUSH_INTERVAL = 0.05
+
+BUSY_MESSAGE = "Sorry, the server is very busy right now. Please try again in a moment."
+
+
+class WarmingUp(Exception):
+    """
+    Raised when a prediction is requested before the models finished loading
+    """
+
+
+def bot_reply(session: SessionState, message: str) -> str:
+    with session.lock, timed("aiml_match"):
+        return session.bot.get_response(message)
+
+
+class XploreService:
+    """
+    Front-end independent entry points; every blocking step runs in the bounded worker pools
+    """
+
+    def __init__(self, sessions: SessionManager, pools: WorkerPools, llm_client: LLMClient,
+                 rewrite_cache: RewriteCache, predictor: LazyObject, embedding_cache: EmbeddingCache,
+                 chart_backend: str = "svg", scheduler: Optional[LLMScheduler] = None, reloader=None):
+        """
+        reloader: the hot_reload.Reloader publishing new model versions, if any
+        """
+        self.sessions = sessions
+        self.pools = pools
+        self.llm_client = llm_client
+        self.rewrite_cache = rewrite_cache
+        self.predictor = predictor
+        self.embedding_cache = embedding_cache
+        self.chart_backend = chart_backend
+        self.scheduler = scheduler or LLMScheduler()
+        self.reloader = reloader
+        self.degraded = 0
+        self.worker_warmup = []
+        self._register_metrics()
+
+    def _register_metrics(self):
+        # Read at scrape time only. In process mode the embedding cache counters live in the workers
+        pools = lambda: {pool.name: pool for pool in (self.pools.threads, self.pools.processes) if pool is not None}
+        register_callback("xplore_active_sessions", "Sessions currently held in memory", lambda: len(self.sessions))
+        register_callback("xplore_session_bytes", "Estimated size of all sessions", self.sessions.total_bytes)
+        register_callback("xplore_session_evictions_total", "Sessions evicted by the LRU/TTL/size limits",
+                          lambda: self.sessions.evictions, kind="counter")
+        register_callback("xplore_queue_depth", "Queued plus running jobs per pool",
+                          lambda: {name: pool.depth for name, pool in pools().items()}, labelname="pool")
+        register_callback("xplore_queue_rejected_total", "Jobs rejected because a pool was full",
+                          lambda: {name: pool.rejected for name, pool in pools().items()},
+                          kind="counter", labelname="pool")
+        register_callback("xplore_queue_timeouts_total", "Jobs that exceeded their timeout",
+                          lambda: {name: pool.timed_out for name, pool in pools().items()},
+                          kind="counter", labelname="pool")
+        caches = {
+            "rewrite": lambda: (self.rewrite_cache.hits, self.rewrite_cache.misses),
+            "embedding": lambda: (self.embedding_cache.hits, self.embedding_cache.misses),
+            "svg": lambda: (render_svg.cache_info().hits, render_svg.cache_info().misses),
+        }
+        register_callback("xplore_cache_hits_total", "Cache hits per cache",
+                          lambda: {name: fn()[0] for name, fn in caches.items()}, kind="counter", labelname="cache")
+        register_callback("xplore_cache_misses_total", "Cache misses per cache",
+                          lambda: {name: fn()[1] for name, fn in caches.items()}, kind="counter", labelname="cache")
+        register_callback("xplore_llm_in_flight", "LLM generations running", lambda: self.scheduler.in_flight)
+        register_callback("xplore_llm_queued", "LLM requests waiting for a slot", lambda: self.scheduler.queued)
+        register_callback("xplore_llm_coalesced_total", "LLM requests served by another identical generation",
+                          lambda: self.scheduler.coalesced, kind="counter")
+        register_callback("xplore_llm_degraded_total", "Replies sent as the raw template because the LLM was saturated",
+                          lambda: self.degraded, kind="counter")
+
+    def start(self):
+        """
+        Start loading the models of the prediction workers
+        """
+        self.worker_warmup = self.pools.prewarm_processes(workers.ping)
+
+    async def chat(self, session: SessionState, message: str) -> AsyncIterator:
+        """
+        Stream the reply to `message`: the Bot template response rewritten by the LLM (or replayed from the cache).
+        While the request waits for the LLM, QueuePosition items are yielded before any text
+        """
+        session.append_transcript(message)
+        try:
+            try:
+                bot_response_original = await self.pools.run_thread(bot_reply, session, message)
+            except (Overloaded, asyncio.TimeoutError):
+                ERRORS.inc("aiml_match")
+                yield BUSY_MESSAGE
+                return
+            ollama_input = f"User Input: {message}\nTemplate Response: {bot_response_original}\n"
+            logger.debug("Chatbot Input: %s", bot_response_original)
+
+            cached = self.rewrite_cache.get(bot_response_original, message)
+            if cached is not None:
+                await self.llm_client.record(ollama_input, cached, session.llm_history)
+                logger.debug("Rewrite cache hit, hit rate %.1f%%", self.rewrite_cache.hit_rate * 100)
+                deltas = self.rewrite_cache.replay(cached)
+            else:
+                deltas = self._generate(session, message, bot_response_original, ollama_input)
+
+            async for chunk in coalesce(deltas, interval=STREAM_FLUSH_INTERVAL):
+                yield chunk
+        finally:
+            # The turn grew the transcript, the histories and the bot's answers
+            self.sessions.update(session)
+
+    async def _generate(self, session: SessionState, message: str, template: str, ollama_input: str) -> AsyncIterator:
+        """
+        LLM rewrite through the scheduler. Requests with the same prompt and history (e.g. the first message of
+        many new sessions) share one generation; when the LLM is saturated the raw template is returned
+        """
+        prompt = session.llm_history + [{"role": "user", "content": ollama_input}]
+        key = hashlib.sha256(json.dumps(prompt).encode("utf-8")).hexdigest()
+        leader = False
+
+        def start_stream():
+            nonlocal leader
+            leader = True
+            return self.rewrite_cache.recording(template, message,
+                                                self.llm_client.call_stream(ollama_input, session.llm_history))
+
+        parts = []
+        try:
+            async for item in self.scheduler.generate(session.session_id, key, start_stream):
+                if not isinstance(item, QueuePosition):
+                    parts.append(item)
+                yield item
+        except Saturated as e:
+            if parts:
+                raise
+            logger.warning("LLM saturated, replying with the template. %s", e)
+            self.degraded += 1
+            await self.llm_client.record(ollama_input, template, session.llm_history)
+            yield template
+            return
+
+        if not leader:
+            # Coalesced: the generation was recorded in another session's history
+            await self.llm_client.record(ollama_input, "".join(parts), session.llm_history)
+
+    def versions(self) -> dict:
+        """
+        Snapshot version each hot-reloaded artifact was last built in, empty without hot reload
+        """
+        return dict(self.reloader.snapshot.versions) if self.reloader is not None else {}
+
+    def weights_key(self) -> Optional[str]:
+        """
+        Content key of the weights.csv behind the published predictor index, None without hot reload
+        """
+        return self.reloader.snapshot.keys["weights"] if self.reloader is not None else None
+
+    def _check_ready(self):
+        # wait(0) is true once loading finished, failures are reported by get()
+        if self.pools.processes is not None:
+            ready = all(future.done() for future in self.worker_warmup)
+        else:
+            ready = self.predictor.wait(0) and (self.chart_backend == "svg" or matplotlib_module.wait(0))
+        if not ready:
+            raise WarmingUp("The prediction model is warming up, please try again in a few seconds.")
+
+    def _predict_in_thread(self, session: SessionState, text: str) -> Tuple[dict, str]:
+        """
+        Prediction for the in-process mode (no prediction workers), using the session's incremental predictor
+        """
+        with session.lock:
+            if session.predictor is None:
+                session.predictor = IncrementalPredictor(self.predictor.get(), self.embedding_cache)
+            probs = session.predictor.predict(text)
+        return probs, chart_html(plot_svg(probs, self.chart_backend))
+
+    async def predict_session(self, session: SessionState) -> Optional[Tuple[dict, str]]:
+        """
+        Predict the careers for everything the session said so far, returns (probabilities, chart HTML),
+        or None for an empty transcript. The result is cached until the transcript changes
+        """
+        user_response = session.transcript.strip()
+        if not user_response:
+            return None
+
+        # A hot reload of weights.csv makes the cached chart stale. Results are cached under the weights they
+        # were predicted with, a process worker reports its own since it may not have reloaded yet
+        text_key = sentence_key(user_response)
+        cached_key, cached_result = session.chart
+        if cached_key == (text_key, self.weights_key()):
+            return cached_result
+
+        self._check_ready()
+        logger.debug("Predicting user response: %s", user_response)
+        with timed("predict"):
+            if self.pools.processes is not None:
+                probs, html, records, weights = await self.pools.run_process(workers.predict_chart, user_response,
+                                                                             self.chart_backend)
+                replay(records)
+                result = (probs, html)
+            else:
+                weights = self.weights_key()
+                result = await self.pools.run_thread(self._predict_in_thread, session, user_response)
+        session.chart = ((text_key, weights), result)
+        return result
+
+    def _predict_texts(self, texts: List[str], sector: Optional[str], major: Optional[str]) -> List[dict]:
+        model = self.predictor.get()
+        if len(texts) == 1 and not sector and not major:
+            return [IncrementalPredictor(model, self.embedding_cache).predict(texts[0])]
+        return model.predict_batch(texts, sector=sector, major=major)
+
+    async def predict(self, texts: List[str], sector: Optional[str] = None,
+                      major: Optional[str] = None) -> List[dict]:
+        """
+        Career probabilities of independent texts, without touching any session.
+        sector, major: only rank the professions of this sector / accepting this major
+        """
+        self._check_ready()
+        with timed("predict"):
+            if self.pools.processes is not None:
+                results, records = await self.pools.run_process(workers.predict_texts, texts, sector, major)
+                replay(records)
+                return results
+            return await self.pools.run_thread(self._predict_texts, texts, sector, major)
+
+    async def similar_careers(self, profession: str, k: int = 10, sector: Optional[str] = None,
+                              major: Optional[str] = None) -> dict:
+        """
+        The k professions with the most similar ability profile, raises ValueError for an unknown profession
+        """
+        self._check_ready()
+        if self.pools.processes is not None:
+            result, records = await self.pools.run_process(workers.similar_careers, profession, k, sector, major)
+            replay(records)
+            return result
+        return await self.pools.run_thread(self.predictor.get().similar_careers, profession, k, sector, major)
+
+    @staticmethod
+    def _analyze(profile: UserProfile) -> dict:
+        with timed("analyze"):
+            return inference_engine(profile).to_dict()
+
+    async def analyze(self, major: str, interests: List[str], mbti: str, challenges: List[str]) -> dict:
+        """
+        Expert system result for a profile: {"abilities" (highest first), "fired_rules", "timings_ms"}
+        """
+        profile = UserProfile(major=major, interests=interests, mbti=mbti, challenges=challenges)
+        return await self.pools.run_thread(self._analyze, profile)
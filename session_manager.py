@@ -0,0 +1,165 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+from chatbot import Bot
+
+
+class SessionState:
+    """
+    Everything that belongs to one browser session:
+    planning state machine, LLM message history and the prediction transcript
+    """
+
+    def __init__(self, session_id: str, bot: Bot, llm_history: List[dict]):
+        self.session_id = session_id
+        self.bot = bot
+        self.llm_history = llm_history
+        self.transcript = ""
+        self.predictor = None
+        self.chart = (None, None)
+        # approx_bytes() when the SessionManager last measured it, part of its running total
+        self.size = 0
+        self.created_at = time.monotonic()
+        self.last_active = self.created_at
+        self.lock = threading.RLock()
+
+    def append_transcript(self, message: str):
+        self.transcript = self.transcript + ' ' + message
+
+    def reset(self, llm_history: List[dict]):
+        self.bot.reset()
+        self.llm_history = llm_history
+        self.transcript = ""
+        self.predictor = None
+        self.chart = (None, None)
+
+    def approx_bytes(self) -> int:
+        """
+        Rough memory footprint of the growing parts of the session (history and transcript)
+        """
+        size = sys.getsizeof(self.transcript)
+        for message in self.llm_history:
+            size += sys.getsizeof(message.get("content", ""))
+        for value in self.bot.user_data.values():
+            size += sys.getsizeof(value)
+        return size
+
+
+class SessionManager:
+    """
+    Per-session state store keyed on the Gradio session hash or the API session id.
+    Sessions are evicted least-recently-used first when there are more than `max_sessions`,
+    when they have been idle for longer than `idle_ttl` seconds,
+    or when the total estimated size of all sessions exceeds `max_bytes`.
+    A session is measured when it is requested or update()d, the total is kept as a running sum of those sizes.
+    """
+
+    def __init__(self, history_factory: Callable[[], List[dict]], bot_factory: Callable[[], Bot] = Bot,
+                 max_sessions: int = 500, idle_ttl: float = 1800.0, max_bytes: int = 64 * 1024 * 1024):
+        self.history_factory = history_factory
+        self.bot_factory = bot_factory
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, SessionState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str):
+        return session_id in self._sessions
+
+    def get(self, session_id: Optional[str]) -> SessionState:
+        """
+        Return the session for `session_id`, creating it if needed, and mark it as most recently used
+        """
+        session_id = session_id or "default"
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and now - session.last_active > self.idle_ttl:
+                self._remove(session_id)
+                self.evictions += 1
+                session = None
+
+            if session is None:
+                session = SessionState(session_id, self.bot_factory(), self.history_factory())
+                self._sessions[session_id] = session
+            else:
+                self._sessions.move_to_end(session_id)
+            # Picks up whatever changed since the session was last measured
+            self._resize(session)
+            session.last_active = now
+
+            self._evict(now, keep=session_id)
+            return session
+
+    def reset(self, session_id: Optional[str]) -> SessionState:
+        session = self.get(session_id)
+        with session.lock:
+            session.reset(self.history_factory())
+        self.update(session)
+        return session
+
+    def update(self, session: SessionState):
+        """
+        Re-measure a session after it changed, e.g. at the end of a chat turn
+        """
+        with self._lock:
+            if self._sessions.get(session.session_id) is session:
+                self._resize(session)
+
+    def discard(self, session_id: str):
+        with self._lock:
+            if session_id in self._sessions:
+                self._remove(session_id)
+
+    def sweep(self):
+        """
+        Drop idle sessions and enforce the size limits without touching any session
+        """
+        with self._lock:
+            self._evict(time.monotonic())
+
+    def total_bytes(self) -> int:
+        return self._bytes
+
+    def _resize(self, session: SessionState):
+        size = session.approx_bytes()
+        self._bytes += size - session.size
+        session.size = size
+
+    def _remove(self, session_id: str) -> SessionState:
+        session = self._sessions.pop(session_id)
+        self._bytes -= session.size
+        return session
+
+    def _evict(self, now: float, keep: Optional[str] = None):
+        # Idle sessions first; the OrderedDict is in LRU order so we can stop at the first active one
+        while self._sessions:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            if oldest_id == keep or now - oldest.last_active <= self.idle_ttl:
+                break
+            self._remove(oldest_id)
+            self.evictions += 1
+
+        while len(self._sessions) > self.max_sessions:
+            if self._pop_lru(keep) is None:
+                break
+
+        while self._bytes > self.max_bytes and len(self._sessions) > 1:
+            if self._pop_lru(keep) is None:
+                break
+
+    def _pop_lru(self, keep: Optional[str]) -> Optional[SessionState]:
+        for session_id in self._sessions:
+            if session_id != keep:
+                self.evictions += 1
+                return self._remove(session_id)
+        return None
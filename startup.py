@@ -0,0 +1,122 @@
+import logging
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Callable, Dict, Generic, Iterable, Optional, TypeVar
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """
+    Records how long every import / initialization stage took
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - start
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0.0) + elapsed
+            logger.info("startup stage '%s' took %.1f ms", name, elapsed * 1000)
+
+    def report(self) -> str:
+        with self._lock:
+            stages = list(self.stages.items())
+        lines = [f"{name:<35} {seconds * 1000:>9.1f} ms" for name, seconds in stages]
+        lines.append(f"{'total':<35} {sum(s for _, s in stages) * 1000:>9.1f} ms")
+        return "\n".join(lines)
+
+
+class LazyObject(Generic[T]):
+    """
+    Builds an expensive object on first use (or on prewarm) exactly once.
+    Attribute access is forwarded to the built object, so it can stand in for it.
+    """
+
+    def __init__(self, factory: Callable[[], T], name: str, timer: Optional[StartupTimer] = None):
+        self._factory = factory
+        self._name = name
+        self._timer = timer
+        self._value: Optional[T] = None
+        self._error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set() and self._error is None
+
+    @property
+    def failed(self) -> bool:
+        return self._error is not None
+
+    def get(self) -> T:
+        if self._ready.is_set():
+            if self._error is not None:
+                raise self._error
+            return self._value
+
+        with self._lock:
+            if not self._ready.is_set():
+                try:
+                    if self._timer is not None:
+                        with self._timer.stage(self._name):
+                            self._value = self._factory()
+                    else:
+                        self._value = self._factory()
+                except BaseException as e:
+                    self._error = e
+                finally:
+                    self._ready.set()
+
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def replace(self, value: T):
+        """
+        Swap in a new object, e.g. one rebuilt by a hot reload. Callers holding the old one keep it
+        """
+        with self._lock:
+            self._value = value
+            self._error = None
+            self._ready.set()
+
+    def __getattr__(self, item):
+        return getattr(self.get(), item)
+
+
+# Process-wide timer shared by every module that defers work to start-up
+startup_timer = StartupTimer()
+
+
+def prewarm(objects: Iterable[LazyObject], timer: Optional[StartupTimer] = None) -> threading.Thread:
+    """
+    Build the lazy objects one after another on a daemon thread
+    """
+
+    def run():
+        for obj in objects:
+            try:
+                obj.get()
+            except Exception as e:
+                logger.error("prewarm of %s failed. %s", obj._name, e)
+        if timer is not None:
+            logger.info("Prewarm finished.\n%s", timer.report())
+
+    thread = threading.Thread(target=run, name="prewarm", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,42 @@
+import time
+
+import pytest
+
+import chatbot
+
+
+@pytest.fixture(scope="module")
+def brain(tmp_path_factory):
+    # aiml still calls time.clock(), see "If you have trouble" in the README
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(time, "clock", time.perf_counter, raising=False)
+        yield chatbot.load_brain(brain_dir=str(tmp_path_factory.mktemp("aiml")))
+
+
+@pytest.mark.parametrize("text", ["what's a backend developer", "What is a backend developer?", "careers for ait"])
+def test_matched_input_is_not_a_miss(brain, text):
+    assert not brain.is_miss(text)
+
+
+def test_multi_sentence_input_is_not_a_miss_when_one_sentence_matches(brain):
+    assert not brain.is_miss("hello. careers for ait")
+    assert not brain.is_miss("zzqx blorp! careers for ait")
+
+
+@pytest.mark.parametrize("text", ["zzqx blorp", "zzqx. blorp!", "", "..."])
+def test_unmatched_input_is_a_miss(brain, text):
+    assert brain.is_miss(text)
+
+
+def test_fallback_only_for_misses(brain):
+    routed = []
+
+    def fallback(text):
+        routed.append(text)
+        return "CAREERS FOR AIT"
+
+    bot = chatbot.Bot(brain, fallback=fallback)
+    bot.respond_general("what's a backend developer")
+    assert routed == []
+    assert "AI careers" in bot.respond_general("zzqx blorp")
+    assert routed == ["zzqx blorp"]
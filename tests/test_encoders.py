@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+import career_predictor
+import encoders
+from career_predictor import CareerPredictor
+
+
+class FakeEncoder:
+    """
+    Stands in for encoders.Encoder; loading the fp32 reference of `missing_fp32` models fails
+    like a directory holding only ONNX graphs
+    """
+    missing_fp32 = set()
+
+    def __init__(self, backend="fp32", model_name=encoders.DEFAULT_MODEL, threads=0, max_seq_length=None,
+                 onnx_file="onnx/model.onnx"):
+        if backend == "fp32" and model_name in self.missing_fp32:
+            raise OSError(f"no PyTorch weights in {model_name}")
+        self.backend = backend
+        self.name = f"{model_name}+{backend}"
+
+    def encode(self, sentences, **kwargs):
+        # A slightly different embedding per backend, fixed per sentence
+        offset = 0.0 if self.backend == "fp32" else 0.001
+        return np.array([[len(s) % 7 + 1.0, len(s) % 5 + 1.0 + offset, 1.0] for s in sentences])
+
+
+@pytest.fixture
+def predictor(monkeypatch):
+    monkeypatch.setattr(career_predictor, "Encoder", FakeEncoder)
+    monkeypatch.setattr(FakeEncoder, "missing_fp32", set())
+    predictor = CareerPredictor.__new__(CareerPredictor)
+    predictor.st_model = FakeEncoder("onnx", "models/minilm", onnx_file="onnx/model_qint8_avx2.onnx")
+    return predictor
+
+
+def test_onnx_encoder_within_tolerance_is_kept(predictor):
+    encoder = predictor.st_model
+    assert predictor._checked_encoder("models/minilm", {"onnx_file": "onnx/model_qint8_avx2.onnx"}, 0.02) is encoder
+
+
+def test_onnx_encoder_beyond_tolerance_is_replaced_by_fp32(predictor, monkeypatch):
+    monkeypatch.setattr(encoders, "parity", lambda candidate, reference, aspects: 0.5)
+    encoder = predictor._checked_encoder("models/minilm", {"onnx_file": "onnx/model.onnx"}, 0.02)
+    assert encoder.backend == "fp32"
+    assert encoder.name == "models/minilm+fp32"
+
+
+def test_onnx_encoder_without_fp32_reference_is_used_unchecked(predictor, caplog):
+    FakeEncoder.missing_fp32.add("models/minilm")
+    encoder = predictor.st_model
+    assert predictor._checked_encoder("models/minilm", {"onnx_file": "onnx/model.onnx"}, 0.02) is encoder
+    assert "Unable to load the fp32 model models/minilm" in caplog.text
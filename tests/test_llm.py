@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from llm import LLMClient, coalesce
+
+
+async def timed_chunks(source, interval=0.05):
+    start = time.monotonic()
+    return [(chunk, time.monotonic() - start) async for chunk in coalesce(source, interval=interval)]
+
+
+def test_buffered_text_is_flushed_while_the_source_stalls():
+    async def source():
+        await asyncio.sleep(0.01)
+        yield "Hello"
+        await asyncio.sleep(0.5)
+        yield " world"
+
+    chunks = asyncio.run(timed_chunks(source()))
+    assert [chunk for chunk, _ in chunks] == ["Hello", " world"]
+    assert chunks[0][1] < 0.2
+
+
+def test_fast_deltas_are_grouped():
+    async def source():
+        yield "a"
+        for _ in range(5):
+            await asyncio.sleep(0)
+            yield "b"
+
+    chunks = asyncio.run(timed_chunks(source()))
+    assert "".join(chunk for chunk, _ in chunks) == "abbbbb"
+    assert len(chunks) <= 2
+
+
+def test_other_items_pass_through_in_order():
+    marker = object()
+
+    async def source():
+        yield "queued"
+        yield marker
+        yield "text"
+
+    chunks = asyncio.run(timed_chunks(source(), interval=10))
+    assert [chunk for chunk, _ in chunks] == ["queued", marker, "text"]
+
+
+def test_source_errors_reach_the_consumer():
+    async def source():
+        yield "partial"
+        raise RuntimeError("stream broke")
+
+    with pytest.raises(RuntimeError, match="stream broke"):
+        asyncio.run(timed_chunks(source()))
+
+
+def test_closing_the_consumer_stops_the_source():
+    closed = []
+
+    async def source():
+        try:
+            yield "first"
+            await asyncio.sleep(10)
+            yield "never"
+        finally:
+            closed.append(True)
+
+    async def consume_one():
+        chunks = coalesce(source(), interval=0.01)
+        first = await chunks.__anext__()
+        await chunks.aclose()
+        await asyncio.sleep(0)
+        return first
+
+    assert asyncio.run(consume_one()) == "first"
+    assert closed == [True]
+
+
+def sse(*contents):
+    lines = [f'data: {{"choices": [{{"delta": {{"content": "{content}"}}}}]}}\n\n' for content in contents]
+    return "".join(lines) + "data: [DONE]\n\n"
+
+
+def make_client(handler):
+    client = LLMClient("You are a career advisor", max_retries=2, backoff=0)
+    client._client = httpx.AsyncClient(base_url=client.base_url, transport=httpx.MockTransport(handler))
+    return client
+
+
+async def reply(client, messages, text="I like data"):
+    return "".join([delta async for delta in client.call_stream(text, messages)])
+
+
+def test_successful_turn_is_recorded():
+    client = make_client(lambda request: httpx.Response(200, text=sse("Data ", "science")))
+    messages = client.new_history()
+    assert asyncio.run(reply(client, messages)) == "Data science"
+    assert [m["role"] for m in messages] == ["system", "user", "assistant"]
+
+
+def test_failed_turn_is_rolled_back():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(503)
+
+    client = make_client(handler)
+    messages = client.new_history()
+    asyncio.run(client.record("hi", "Hello!", messages))
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(reply(client, messages))
+    assert len(requests) == 3
+    assert [m["content"] for m in messages[1:]] == ["hi", "Hello!"]
+
+
+class BrokenStream(httpx.AsyncByteStream):
+    async def __aiter__(self):
+        yield b": keep-alive\n\n"
+        raise httpx.ReadError("connection reset")
+
+
+def test_turn_is_rolled_back_when_the_stream_breaks():
+    def handler(request):
+        return httpx.Response(200, stream=BrokenStream())
+
+    client = make_client(handler)
+    messages = client.new_history()
+    asyncio.run(client.record("I like data", "Great!", messages))
+    with pytest.raises(httpx.ReadError):
+        asyncio.run(reply(client, messages))
+    # Only the turn of the failed request is dropped, not the earlier one with the same text
+    assert [m["content"] for m in messages[1:]] == ["I like data", "Great!"]
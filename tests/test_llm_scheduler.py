@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from llm_scheduler import LLMScheduler, QueuePosition, Saturated
+
+
+def deltas(count, delay=0.01, started=None, cancelled=None):
+    async def stream():
+        if started is not None:
+            started.append(True)
+        try:
+            for i in range(count):
+                await asyncio.sleep(delay)
+                yield f"d{i} "
+        except asyncio.CancelledError:
+            if cancelled is not None:
+                cancelled.append(True)
+            raise
+    return stream
+
+
+async def collect(agen, limit=None):
+    items = []
+    async for item in agen:
+        if isinstance(item, QueuePosition):
+            continue
+        items.append(item)
+        if limit is not None and len(items) >= limit:
+            break
+    await agen.aclose()
+    return items
+
+
+def test_follower_reads_to_the_end_when_the_leader_drops():
+    async def scenario():
+        scheduler = LLMScheduler(max_in_flight=1)
+        started = []
+        leader = scheduler.generate("a", "same prompt", deltas(10, started=started))
+        follower = scheduler.generate("b", "same prompt", deltas(10, started=started))
+        leader_items, follower_items = await asyncio.gather(collect(leader, limit=3), collect(follower))
+        await asyncio.sleep(0)
+        return scheduler, started, leader_items, follower_items
+
+    scheduler, started, leader_items, follower_items = asyncio.run(scenario())
+    assert leader_items == ["d0 ", "d1 ", "d2 "]
+    assert follower_items == [f"d{i} " for i in range(10)]
+    assert len(started) == 1
+    assert scheduler.coalesced == 1
+    assert scheduler.in_flight == 0
+
+
+def test_generation_is_cancelled_once_every_caller_left():
+    async def scenario():
+        scheduler = LLMScheduler(max_in_flight=1)
+        cancelled = []
+        first = scheduler.generate("a", "prompt", deltas(100, cancelled=cancelled))
+        second = scheduler.generate("b", "prompt", deltas(100))
+        await asyncio.gather(collect(first, limit=2), collect(second, limit=4))
+        for _ in range(5):
+            await asyncio.sleep(0)
+        # A new request with the same key starts its own generation instead of joining the cancelled one
+        third = await collect(scheduler.generate("c", "prompt", deltas(2)))
+        return scheduler, cancelled, third
+
+    scheduler, cancelled, third = asyncio.run(scenario())
+    assert cancelled == [True]
+    assert third == ["d0 ", "d1 "]
+    assert scheduler.in_flight == 0
+
+
+def test_upstream_error_reaches_every_follower():
+    async def failing():
+        yield "partial "
+        await asyncio.sleep(0.01)
+        raise ConnectionError("backend went away")
+
+    async def scenario():
+        scheduler = LLMScheduler()
+        results = await asyncio.gather(collect(scheduler.generate("a", "k", failing)),
+                                       collect(scheduler.generate("b", "k", failing)), return_exceptions=True)
+        return scheduler, results
+
+    scheduler, results = asyncio.run(scenario())
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert scheduler.in_flight == 0
+
+
+def test_full_queue_raises_saturated():
+    async def scenario():
+        scheduler = LLMScheduler(max_in_flight=1, max_queue=0)
+        running = scheduler.generate("a", None, deltas(5))
+        await running.__anext__()
+        with pytest.raises(Saturated):
+            await collect(scheduler.generate("b", None, deltas(1)))
+        await running.aclose()
+
+    asyncio.run(scenario())
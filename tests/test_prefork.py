@@ -0,0 +1,40 @@
+import logging
+
+import pytest
+
+import prefork
+from startup import LazyObject
+
+
+def test_failed_preload_stops_before_forking():
+    def load():
+        raise OSError("weights.csv not found")
+
+    predictor = LazyObject(load, "predictor")
+    with pytest.raises(SystemExit) as exit_info:
+        prefork.serve(2, "127.0.0.1", 0, preload=[predictor.get])
+    assert exit_info.value.code == 1
+    assert predictor.failed
+
+
+
+def test_failed_optional_preload_is_only_logged(monkeypatch, caplog):
+    forked = []
+
+    def fork():
+        forked.append(True)
+        return 0
+
+    # The first forked worker returns from serve() straight away
+    monkeypatch.setattr(prefork.os, "fork", fork)
+    monkeypatch.setattr(prefork.signal, "signal", lambda signum, handler: None)
+    monkeypatch.setattr(prefork.gc, "freeze", lambda: None)
+    # The worker process sets its own log format
+    for handler in logging.getLogger().handlers:
+        monkeypatch.setattr(handler, "formatter", handler.formatter)
+    pattern_index = LazyObject(lambda: 1 / 0, "pattern index")
+    worker, sock = prefork.serve(2, "127.0.0.1", 0, preload=[lambda: 1], optional_preload=[pattern_index.get])
+    sock.close()
+    assert worker == 0 and forked
+    assert pattern_index.failed
+    assert "Optional preloading failed" in caplog.text
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from profession_index import ProfessionIndex
+
+
+def reference(queries, matrix, k, mask=None):
+    """
+    Full sort: score descending, then row ascending
+    """
+    candidates = np.flatnonzero(mask) if mask is not None else np.arange(len(matrix))
+    results = []
+    for query in np.atleast_2d(queries).astype(np.float32):
+        scores = matrix[candidates] @ query
+        order = np.lexsort((candidates, -scores))[:k]
+        results.append(candidates[order])
+    return np.array(results)
+
+
+@pytest.mark.parametrize("chunk_size", [0, 7, 64])
+def test_ties_at_the_boundary_keep_the_lowest_rows(chunk_size):
+    rng = np.random.default_rng(0)
+    # Few distinct values, so many professions tie at the k-th score
+    matrix = rng.integers(0, 3, size=(500, 10)).astype(np.float32)
+    queries = rng.integers(0, 2, size=(20, 10)).astype(np.float32)
+    index = ProfessionIndex([f"p{row}" for row in range(len(matrix))], matrix, chunk_size=chunk_size)
+    for k in (1, 5, 10):
+        rows, scores, _, _ = index.search(queries, k)
+        np.testing.assert_array_equal(rows, reference(queries, index.matrix, k))
+
+
+def test_ties_with_a_mask():
+    matrix = np.ones((50, 10), dtype=np.float32)
+    index = ProfessionIndex([f"p{row}" for row in range(50)], matrix, sectors=["a", "b"] * 25, chunk_size=8)
+    mask = index.mask(sector="b")
+    rows, _, _, _ = index.search(np.ones(10), 3, mask)
+    np.testing.assert_array_equal(rows, [[1, 3, 5]])
+
+
+def test_similar_excludes_the_profession_itself():
+    matrix = np.eye(4, 10, dtype=np.float32) + 0.1
+    index = ProfessionIndex(["Data Scientist", "Designer", "Manager", "Analyst"], matrix)
+    rows, _ = index.similar("data scientist", k=2)
+    assert 0 not in rows and len(rows) == 2
@@ -0,0 +1,63 @@
+import asyncio
+from types import SimpleNamespace
+
+import workers
+from service import XploreService
+from session_manager import SessionState
+
+
+class ProcessPools:
+    """
+    Process-mode pools whose predict_chart jobs report the weights key of the worker that ran them
+    """
+    processes = object()
+
+    def __init__(self, worker_keys):
+        self.worker_keys = list(worker_keys)
+        self.calls = 0
+
+    async def run_process(self, fn, text, chart_backend):
+        assert fn is workers.predict_chart
+        self.calls += 1
+        return {"Data Scientist": 1.0}, "<svg/>", [], self.worker_keys.pop(0)
+
+
+def make_service(pools, weights_key):
+    service = XploreService.__new__(XploreService)
+    service.pools = pools
+    service.chart_backend = "svg"
+    service.worker_warmup = []
+    service.reloader = SimpleNamespace(snapshot=SimpleNamespace(keys={"weights": weights_key}))
+    return service
+
+
+def make_session():
+    session = SessionState("api-test", bot=None, llm_history=[])
+    session.append_transcript("I like data")
+    return session
+
+
+def test_chart_is_cached_per_weights_version():
+    pools = ProcessPools(["new"])
+    service = make_service(pools, "new")
+    session = make_session()
+    asyncio.run(service.predict_session(session))
+    asyncio.run(service.predict_session(session))
+    assert pools.calls == 1
+
+    service.reloader.snapshot.keys["weights"] = "newer"
+    pools.worker_keys.append("newer")
+    asyncio.run(service.predict_session(session))
+    assert pools.calls == 2
+
+
+def test_stale_worker_result_is_not_cached_as_current():
+    # The parent already reloaded weights.csv, the worker that ran the job had not
+    pools = ProcessPools(["old", "new"])
+    service = make_service(pools, "new")
+    session = make_session()
+    asyncio.run(service.predict_session(session))
+    asyncio.run(service.predict_session(session))
+    assert pools.calls == 2
+    asyncio.run(service.predict_session(session))
+    assert pools.calls == 2
@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+import session_manager
+from session_manager import SessionManager, SessionState
+
+
+def make_manager(**limits):
+    return SessionManager(list, bot_factory=lambda: SimpleNamespace(user_data={}, reset=lambda: None), **limits)
+
+
+def exact_total(sessions: SessionManager) -> int:
+    return sum(session.approx_bytes() for session in sessions._sessions.values())
+
+
+def test_running_total_follows_changes_and_evictions():
+    sessions = make_manager()
+    first = sessions.get("a")
+    sessions.get("b")
+    first.append_transcript("I like data " * 50)
+    first.llm_history.append({"role": "assistant", "content": "Great choice " * 20})
+    sessions.update(first)
+    assert sessions.total_bytes() == exact_total(sessions)
+
+    sessions.reset("a")
+    assert sessions.total_bytes() == exact_total(sessions)
+    sessions.discard("b")
+    assert sessions.total_bytes() == exact_total(sessions)
+
+
+def test_size_limit_evicts_least_recently_used():
+    sessions = make_manager(max_bytes=20_000)
+    for index in range(10):
+        sessions.get(f"s{index}").append_transcript("x" * 4000)
+        sessions.update(sessions.get(f"s{index}"))
+    assert sessions.total_bytes() == exact_total(sessions) <= 20_000
+    assert "s9" in sessions and "s0" not in sessions
+
+
+def test_get_measures_only_the_requested_session(monkeypatch):
+    sessions = make_manager()
+    for index in range(100):
+        sessions.get(f"s{index}")
+    measured = []
+    approx_bytes = SessionState.approx_bytes
+    monkeypatch.setattr(session_manager.SessionState, "approx_bytes",
+                        lambda session: measured.append(session.session_id) or approx_bytes(session))
+    sessions.get("s5")
+    assert measured == ["s5"]
@@ -0,0 +1,86 @@
+"""
+Jobs that run inside the prediction process pool.
+Every worker process loads its own CareerPredictor and EmbeddingCache once, in `init_worker`.
+Jobs also return the stage timings they recorded, the parent process adds them to its metrics.
+"""
+import logging
+import os
+from typing import List, Optional, Tuple
+
+from charts import chart_html, plot_svg
+from metrics import capture
+
+logger = logging.getLogger(__name__)
+
+_predictor = None
+_cache = None
+_reloader = None
+
+
+def init_worker(log_level: int = logging.INFO, predictor_options: dict = None, reload_interval: float = 0.0):
+    """
+    reload_interval: above 0, the worker watches weights.csv and hot-reloads its own predictor's index
+    """
+    global _predictor, _cache, _reloader
+    from career_predictor import CareerPredictor
+    from embedding_cache import EmbeddingCache
+
+    # Spawned processes do not inherit the logging configuration of the parent
+    logging.basicConfig(level=log_level, format="%(levelname)s: %(message)s")
+    _predictor = CareerPredictor(**(predictor_options or {}))
+    _cache = EmbeddingCache()
+    if reload_interval > 0:
+        from hot_reload import Reloader, weights_artifact
+        _reloader = Reloader([weights_artifact(lambda: _predictor, _predictor.weights_path)], reload_interval)
+        _reloader.start()
+    logger.info("Prediction worker %d ready.", os.getpid())
+
+
+def ping() -> int:
+    return os.getpid()
+
+
+def weights_key() -> Optional[str]:
+    """
+    Content key of the weights.csv this worker's index was built from, None without hot reload.
+    Workers reload on their own, so it can differ from the parent's for a moment
+    """
+    return _reloader.snapshot.keys["weights"] if _reloader is not None else None
+
+
+def predict_chart(text: str, chart_backend: str = "svg") -> Tuple[dict, str, list, Optional[str]]:
+    """
+    Predict the careers for a transcript and render the chart,
+    returns (probabilities, chart HTML, timings, weights_key() of the prediction)
+    """
+    from embedding_cache import IncrementalPredictor
+
+    # Read before predicting: the index is published before the key, so a reload in between can only make
+    # the key older than the index, never newer
+    weights = weights_key()
+    with capture() as records:
+        probs = IncrementalPredictor(_predictor, _cache).predict(text)
+        html = chart_html(plot_svg(probs, chart_backend))
+    return probs, html, records, weights
+
+
+def predict_texts(texts: List[str], sector: Optional[str] = None,
+                  major: Optional[str] = None) -> Tuple[List[dict], list]:
+    """
+    Career probabilities of independent texts, a single unfiltered text goes through the embedding cache
+    """
+    from embedding_cache import IncrementalPredictor
+
+    with capture() as records:
+        if len(texts) == 1 and not sector and not major:
+            results = [IncrementalPredictor(_predictor, _cache).predict(texts[0])]
+        else:
+            results = _predictor.predict_batch(texts, sector=sector, major=major)
+    return results, records
+
+
+def similar_careers(profession: str, k: int, sector: Optional[str] = None,
+                    major: Optional[str] = None) -> Tuple[dict, list]:
+    with capture() as records:
+        result = _predictor.similar_careers(profession, k, sector, major)
+    return result, records